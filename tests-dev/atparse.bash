@@ -0,0 +1,40 @@
+#! /usr/bin/env bash
+# Defines the "atparse" function of tests/atparse.bash, rendering the
+# template with ufs_atparse.py instead of scanning it in bash. Falls back
+# to the bash implementation when python3 is not available.
+__atparse_dir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd -P )"
+source "${__atparse_dir}"/../tests/atparse.bash
+eval "$(declare -f atparse | sed '1s/^atparse/atparse_bash/')"
+
+function atparse {
+    # Usage:
+    #     source atparse.bash # defines the "atparse" function; only do this once
+    #     atparse [ var1=value1 [ var2=value2 [...] ] ] < input_file > output_file
+    # If set -u is enabled, it will exit the process when a variable is undefined.
+    if ! command -v python3 > /dev/null 2>&1 ; then
+        atparse_bash "$@"
+        return
+    fi
+
+    local __set_x=":" # will be "set -x" if the calling script had that option enabled
+    local __abort_on_undefined="" # -u if the calling script had set -u enabled
+    local __rc=0
+    if [[ -o xtrace ]] ; then
+        __set_x="set -x"
+    fi
+    if [[ -o nounset ]] ; then
+        __abort_on_undefined="-u"
+    fi
+    set +x
+
+    # Shell variables are exported in a subshell so the template sees the same values as in bash.
+    # SHELLOPTS and BASHOPTS stay unexported, they would pass set -u on to bash scripts run by python3.
+    ( export $(compgen -v | grep -v -x -e SHELLOPTS -e BASHOPTS) 2> /dev/null || true
+      exec python3 "${__atparse_dir}"/ufs_atparse.py ${__abort_on_undefined} "$@" ) || __rc=$?
+
+    eval "$__set_x"
+    if [[ ${__rc} != 0 && -n ${__abort_on_undefined} ]] ; then
+        exit "${__rc}"
+    fi
+    return "${__rc}"
+}
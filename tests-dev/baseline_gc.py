@@ -0,0 +1,246 @@
+import os
+import re
+import sys
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BL_DATE_CONF = 'tests/bl_date.conf'
+BASELINE_DIR = re.compile(r'develop-(\d{8})$')
+BL_DATE      = re.compile(r'BL_DATE=(\d{8})')
+#--- branches, remote branches and pull request heads fetched with
+#--- git fetch origin '+refs/pull/*/head:refs/pull/*/head'
+LIVE_REFS    = ['refs/heads', 'refs/remotes', 'refs/pull']
+MAX_WORKERS  = 8
+
+def get_referenced_dates(PATHTR):
+    """Baseline dates of the working tree and of every live branch and pull request
+
+    The bl_date.conf of all refs is read by one git cat-file process.
+
+    Args:
+        PATHTR (str): Top directory of the ufs-weather-model checkout
+
+    Returns:
+        dict: baseline date mapped to the refs using it
+    """
+    dates = {}
+    with open(PATHTR+'/'+BL_DATE_CONF) as fconf:
+        match = BL_DATE.search(fconf.read())
+    if match:
+        dates.setdefault(match.group(1), []).append('working tree')
+    refs = subprocess.check_output(['git', 'for-each-ref', '--format=%(refname)']+LIVE_REFS,
+                                   cwd=PATHTR, text=True).split()
+    if not refs:
+        return dates
+    batch = ''.join(ref+':'+BL_DATE_CONF+'\n' for ref in refs)
+    output = subprocess.run(['git', 'cat-file', '--batch'], cwd=PATHTR, input=batch.encode(),
+                            stdout=subprocess.PIPE, check=True).stdout
+    position = 0
+    for ref in refs:
+        line_end = output.index(b'\n', position)
+        header = output[position:line_end].split()
+        position = line_end+1
+        if header[-1] == b'missing':
+            continue
+        size = int(header[2])
+        match = BL_DATE.search(output[position:position+size].decode(errors='replace'))
+        position += size+1
+        if match:
+            dates.setdefault(match.group(1), []).append(ref)
+    return dates
+
+def get_baseline_dirs(BASELINE_ROOT):
+    """Baseline trees of a baseline store
+
+    Args:
+        BASELINE_ROOT (str): directory with develop-YYYYMMDD trees e.g. DISKNM/NEMSfv3gfs
+
+    Returns:
+        dict: baseline date mapped to its directory
+    """
+    baseline_dirs = {}
+    with os.scandir(BASELINE_ROOT) as entries:
+        for entry in entries:
+            match = BASELINE_DIR.match(entry.name)
+            if match and entry.is_dir(follow_symlinks=False):
+                baseline_dirs[match.group(1)] = entry.path
+    return baseline_dirs
+
+def scan_tree(path):
+    """Disk usage of a directory tree
+
+    Args:
+        path (str): directory
+
+    Returns:
+        tuple: bytes of files with one link, and (device, inode) mapped to
+               bytes and link count of files with several links
+    """
+    size = 0
+    linked = {}
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_nlink > 1 and not entry.is_symlink():
+                    linked[(stat.st_dev, stat.st_ino)] = (stat.st_blocks*512, stat.st_nlink)
+                else:
+                    size += stat.st_blocks*512
+    return size, linked
+
+def get_reclaimable(baseline_dirs, max_workers=MAX_WORKERS):
+    """Bytes freed by removing each baseline tree
+
+    The test directories of all trees are scanned in parallel. A file
+    hardlinked from outside the removed trees frees nothing, a file
+    linked only from removed trees counts for the first of them.
+
+    Args:
+        baseline_dirs (dict): baseline date mapped to its directory
+        max_workers (int): directories scanned at the same time
+
+    Returns:
+        dict: baseline date mapped to reclaimable bytes
+    """
+    subdirs = []
+    reclaimable = {}
+    for date, path in baseline_dirs.items():
+        reclaimable[date] = 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append((date, entry.path))
+                else:
+                    reclaimable[date] += entry.stat(follow_symlinks=False).st_blocks*512
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scans = list(executor.map(scan_tree, [path for date, path in subdirs]))
+    links_seen = {}
+    first_date = {}
+    for (date, path), (size, linked) in zip(subdirs, scans):
+        reclaimable[date] += size
+        for inode, (nbytes, nlink) in linked.items():
+            links_seen[inode] = links_seen.get(inode, 0)+1
+            first_date.setdefault(inode, (date, nbytes, nlink))
+    for inode, (date, nbytes, nlink) in first_date.items():
+        if links_seen[inode] >= nlink:
+            reclaimable[date] += nbytes
+    return reclaimable
+
+def plan_collection(baseline_dirs, referenced):
+    """Baseline trees that can be removed
+
+    Trees referenced by a live ref are kept, and so are trees newer than
+    the newest referenced date, which are baselines of changes not yet
+    merged.
+
+    Args:
+        baseline_dirs (dict): baseline date mapped to its directory
+        referenced (dict): baseline date mapped to the refs using it
+
+    Returns:
+        dict: baseline date mapped to the reason it is kept, None when it can be removed
+    """
+    newest = max(referenced)
+    plan = {}
+    for date in sorted(baseline_dirs):
+        if date in referenced:
+            refs = referenced[date]
+            plan[date] = 'referenced by '+refs[0]+(f" and {len(refs)-1} more" if len(refs) > 1 else '')
+        elif date > newest:
+            plan[date] = 'newer than '+newest
+        else:
+            plan[date] = None
+    return plan
+
+def remove_tree(path, ARCHIVE_DIR='', max_workers=MAX_WORKERS):
+    """Delete a baseline tree, or move it into an archive directory
+
+    The test directories are removed in parallel.
+
+    Args:
+        path (str): baseline tree
+        ARCHIVE_DIR (str): archive directory, empty to delete
+        max_workers (int): test directories removed at the same time
+    """
+    if ARCHIVE_DIR:
+        shutil.move(path, ARCHIVE_DIR+'/'+os.path.basename(path))
+        return
+    with os.scandir(path) as entries:
+        subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(shutil.rmtree, subdirs))
+    shutil.rmtree(path)
+
+def format_bytes(nbytes):
+    """Format a byte count
+
+    Args:
+        nbytes (int): bytes
+
+    Returns:
+        str: e.g. 1.25 TB
+    """
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if nbytes < 1024 or unit == 'TB':
+            return f"{nbytes:.2f} {unit}"
+        nbytes /= 1024
+
+def main():
+    """Report, delete or archive the baseline trees no live ref uses
+
+    Usage: baseline_gc.py [delete | archive ARCHIVE_DIR] [BASELINE_ROOT...]
+
+    Without delete or archive only the report is printed. BASELINE_ROOT
+    defaults to DISKNM/NEMSfv3gfs of MACHINE_ID in baseline_setup.yaml.
+    Fetch pull request heads first to keep the baselines they use.
+    """
+    args = sys.argv[1:]
+    action = args.pop(0) if args and args[0] in ['delete', 'archive'] else 'report'
+    ARCHIVE_DIR = args.pop(0) if action == 'archive' else ''
+    PATHRT = os.path.dirname(os.path.abspath(__file__))
+    PATHTR = os.path.dirname(PATHRT)
+    if args:
+        BASELINE_ROOTS = args
+    else:
+        import yaml
+        MACHINE_ID = str(os.getenv('MACHINE_ID'))
+        with open(PATHRT+'/baseline_setup.yaml') as f:
+            exp_config = yaml.load(f, Loader=yaml.FullLoader)
+        BASELINE_ROOTS = [str(exp_config[MACHINE_ID]['DISKNM'])+'/NEMSfv3gfs']
+    referenced = get_referenced_dates(PATHTR)
+    if not referenced:
+        sys.exit("*** No baseline date found in the working tree or any ref, nothing is removed ***")
+    if ARCHIVE_DIR:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    for BASELINE_ROOT in BASELINE_ROOTS:
+        if not os.path.isdir(BASELINE_ROOT):
+            print(f"{BASELINE_ROOT} does not exist")
+            continue
+        baseline_dirs = get_baseline_dirs(BASELINE_ROOT)
+        plan = plan_collection(baseline_dirs, referenced)
+        removable = {date: baseline_dirs[date] for date, reason in plan.items() if reason is None}
+        reclaimable = get_reclaimable(removable)
+        print(f"{BASELINE_ROOT}:")
+        for date, reason in plan.items():
+            if reason is None:
+                print(f"  develop-{date}  {format_bytes(reclaimable[date]):>12}  unreferenced")
+            else:
+                print(f"  develop-{date}  {'':>12}  kept, {reason}")
+        print(f"  {len(removable)} of {len(plan)} baselines unreferenced, "
+              f"{format_bytes(sum(reclaimable.values()))} reclaimable")
+        if action == 'report':
+            continue
+        #--- one tree at a time, each removed with bounded parallelism ---
+        for date, path in sorted(removable.items()):
+            print(f"  {'archiving' if ARCHIVE_DIR else 'deleting'} {path}")
+            remove_tree(path, ARCHIVE_DIR)
+    if action == 'report':
+        print("Dry run, use delete or archive ARCHIVE_DIR to remove the unreferenced baselines")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import shutil
+import hashlib
+import subprocess
+from datetime import datetime
+import yaml
+from ufs_test_utils import normalize_make_opt
+
+BUILD_STATUS = 'build_status.yaml'
+#--- builds of a failed run kept in its RUNDIR_ROOT for ufs_test.sh -u ---
+RERUN_BUILDS_DIR = 'rerun_builds'
+#--- scripts of the compile job, part of the source hash ---
+BUILD_SCRIPTS = ['tests/compile.sh', 'tests/run_compile.sh', 'tests/compile_launcher.sh', 'tests-dev/compile.sh']
+
+def get_source_hash(PATHTR):
+    """Hash the model source tree used for compiling
+
+    Args:
+        PATHTR (str): Top directory of the ufs-weather-model checkout
+
+    Returns:
+        str: hash of top-level trees, submodule hashes, uncommitted changes,
+             untracked source files and the compile scripts
+    """
+    #--- test configurations and the test harness do not change the executable ---
+    nonsource = ['tests', 'tests-dev', 'doc', '.github']
+    excludes  = [':(exclude)'+name for name in nonsource]
+    source_hash = hashlib.sha256()
+    top_trees = subprocess.check_output(['git', 'ls-tree', 'HEAD'], cwd=PATHTR).decode()
+    for line in top_trees.splitlines():
+        if not line.split('\t')[-1] in nonsource:
+            source_hash.update(line.encode())
+    for git_cmd in [['git', 'submodule', 'status', '--recursive'],
+                    ['git', 'diff', 'HEAD', '--submodule=diff', '--', '.']+excludes]:
+        source_hash.update(subprocess.check_output(git_cmd, cwd=PATHTR))
+    #--- new files are compiled before they are committed ---
+    untracked = subprocess.check_output(['git', 'ls-files', '--others', '--exclude-standard', '--', '.']+excludes,
+                                        cwd=PATHTR).decode().splitlines()
+    submodule_untracked = subprocess.check_output(
+        ['git', 'submodule', 'foreach', '--quiet', '--recursive',
+         'git ls-files --others --exclude-standard | sed "s|^|$displaypath/|"'], cwd=PATHTR)
+    untracked += submodule_untracked.decode().splitlines()
+    #--- the scripts of the compile job set the CMake flags, tests-dev compiles with its own copy of compile.sh ---
+    for filename in sorted(untracked)+BUILD_SCRIPTS:
+        if os.path.isfile(PATHTR+'/'+filename):
+            source_hash.update(filename.encode())
+            with open(PATHTR+'/'+filename, 'rb') as fsource:
+                source_hash.update(fsource.read())
+    return source_hash.hexdigest()
+
+def get_build_key(source_hash, MACHINE_ID, RT_COMPILER, MAKE_OPT, PATHTR):
+    """Generate build cache key for a compile
+
+    Args:
+        source_hash (str): hash from get_source_hash
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        RT_COMPILER (str): compiler e.g. intel, gnu
+        MAKE_OPT (str): Make build options
+        PATHTR (str): Top directory of the ufs-weather-model checkout
+
+    Returns:
+        str: build cache key
+    """
+    build_key = hashlib.sha256()
+    build_key.update(source_hash.encode())
+    build_key.update(f"{MACHINE_ID} {RT_COMPILER} {normalize_make_opt(MAKE_OPT)}".encode())
+    for modulefile in ['ufs_'+MACHINE_ID+'.'+RT_COMPILER+'.lua',
+                       'ufs_'+MACHINE_ID+'.'+RT_COMPILER, 'ufs_common.lua']:
+        modulefile = PATHTR+'/modulefiles/'+modulefile
+        if os.path.isfile(modulefile):
+            with open(modulefile, 'rb') as fmod:
+                build_key.update(fmod.read())
+    return build_key.hexdigest()
+
+def get_build_files(COMPILE_ID, MACHINE_ID):
+    """Executable and modulefile names of a compile in the test directory
+
+    Args:
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+
+    Returns:
+        list: filenames of the executable and its modulefile
+    """
+    if MACHINE_ID == 'linux':
+        return ['fv3_'+COMPILE_ID+'.exe', 'modules.fv3_'+COMPILE_ID]
+    return ['fv3_'+COMPILE_ID+'.exe', 'modules.fv3_'+COMPILE_ID+'.lua']
+
+def restore_build(BUILD_CACHE_DIR, build_key, COMPILE_ID, MACHINE_ID, PATHRT):
+    """Copy cached executable and modulefile into the test directory
+
+    Args:
+        BUILD_CACHE_DIR (str): build cache directory
+        build_key (str): build cache key
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        PATHRT (str): Test directory
+
+    Returns:
+        bool: True when the build was found in the cache
+    """
+    cache_dir = BUILD_CACHE_DIR+'/'+build_key
+    if not os.path.isfile(cache_dir+'/'+BUILD_STATUS):
+        return False
+    build_files = get_build_files(COMPILE_ID, MACHINE_ID)
+    cache_files = get_build_files('cache', MACHINE_ID)
+    for build_file, cache_file in zip(build_files, cache_files):
+        if not os.path.isfile(cache_dir+'/'+cache_file):
+            return False
+    for build_file, cache_file in zip(build_files, cache_files):
+        shutil.copy2(cache_dir+'/'+cache_file, PATHRT+'/'+build_file)
+    return True
+
+def store_build(BUILD_CACHE_DIR, build_key, COMPILE_ID, MACHINE_ID, PATHRT, MAKE_OPT):
+    """Save executable and modulefile of a successful compile into the cache
+
+    Args:
+        BUILD_CACHE_DIR (str): build cache directory
+        build_key (str): build cache key
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        PATHRT (str): Test directory
+        MAKE_OPT (str): Make build options
+    """
+    cache_dir = BUILD_CACHE_DIR+'/'+build_key
+    if os.path.isdir(cache_dir):
+        return
+    build_files = get_build_files(COMPILE_ID, MACHINE_ID)
+    for build_file in build_files:
+        if not os.path.isfile(PATHRT+'/'+build_file):
+            return
+    #--- populate a temporary directory and rename it, so readers never see a partial build ---
+    tmp_dir = cache_dir+'.tmp'+str(os.getpid())
+    os.makedirs(tmp_dir, exist_ok=True)
+    for build_file, cache_file in zip(build_files, get_build_files('cache', MACHINE_ID)):
+        shutil.copy2(PATHRT+'/'+build_file, tmp_dir+'/'+cache_file)
+    build_info = {'COMPILE_ID': COMPILE_ID, 'MAKE_OPT': MAKE_OPT,
+                  'DATE': datetime.now().strftime("%Y%m%d %H:%M:%S")}
+    with open(tmp_dir+'/'+BUILD_STATUS, 'w') as fstatus:
+        yaml.dump(build_info, fstatus)
+    try:
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def keep_run_builds(RUNDIR_ROOT, COMPILE_IDS, MACHINE_ID, PATHRT):
+    """Move executables and modulefiles of a run into its run directory
+
+    The cleanup of a run deletes them from the test directory, so the
+    builds of the compiles with failed tests are kept for a rerun.
+
+    Args:
+        RUNDIR_ROOT (str): Test run directory
+        COMPILE_IDS (list): Compile identifiers e.g. s2swa_intel
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        PATHRT (str): Test directory
+
+    Returns:
+        list: compile identifiers whose build was kept
+    """
+    kept = []
+    builds_dir = RUNDIR_ROOT+'/'+RERUN_BUILDS_DIR
+    for COMPILE_ID in COMPILE_IDS:
+        build_files = get_build_files(COMPILE_ID, MACHINE_ID)
+        if not all(os.path.isfile(PATHRT+'/'+build_file) for build_file in build_files):
+            continue
+        os.makedirs(builds_dir, exist_ok=True)
+        for build_file in build_files:
+            shutil.move(PATHRT+'/'+build_file, builds_dir+'/'+build_file)
+        kept.append(COMPILE_ID)
+    return kept
+
+def restore_run_build(RERUN_DIR, rerun_status, build_key, COMPILE_ID, MACHINE_ID, PATHRT):
+    """Copy the executable and modulefile kept by an earlier run into the test directory
+
+    The build is used only when the earlier run compiled it from the same
+    sources, options and modulefiles.
+
+    Args:
+        RERUN_DIR (str): RUNDIR_ROOT of the earlier run
+        rerun_status (dict): build status of the earlier run from read_build_status
+        build_key (str): build cache key of the compile in this run
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        PATHRT (str): Test directory
+
+    Returns:
+        bool: True when the build of the earlier run was restored
+    """
+    if rerun_status.get(COMPILE_ID, {}).get('key') != build_key:
+        return False
+    builds_dir = RERUN_DIR+'/'+RERUN_BUILDS_DIR
+    build_files = get_build_files(COMPILE_ID, MACHINE_ID)
+    if not all(os.path.isfile(builds_dir+'/'+build_file) for build_file in build_files):
+        return False
+    for build_file in build_files:
+        shutil.copy2(builds_dir+'/'+build_file, PATHRT+'/'+build_file)
+    return True
+
+def write_build_status(RUNDIR_ROOT, build_status):
+    """Record how each compile of this run is provided
+
+    Args:
+        RUNDIR_ROOT (str): Test run directory
+        build_status (dict): compile identifier mapped to its build key and source
+    """
+    with open(RUNDIR_ROOT+'/'+BUILD_STATUS, 'w') as fstatus:
+        yaml.dump(build_status, fstatus)
+
+def read_build_status(RUNDIR_ROOT):
+    """Read build status written during workflow generation
+
+    Args:
+        RUNDIR_ROOT (str): Test run directory
+
+    Returns:
+        dict: compile identifier mapped to its build key and source
+    """
+    status_file = RUNDIR_ROOT+'/'+BUILD_STATUS
+    if not os.path.isfile(status_file):
+        return {}
+    with open(status_file) as fstatus:
+        return yaml.load(fstatus, Loader=yaml.FullLoader) or {}
@@ -0,0 +1,239 @@
+import os
+import re
+import sys
+import subprocess
+from ufs_test_utils import get_testcase
+
+#--- changes that do not change a test result ---
+NO_IMPACT = ['doc/', '.github/', 'tests/auto/', 'tests/auto-jenkins/', 'tests/ci/', 'tests/logs/',
+             'tests-dev/logs/', 'tests/test_changes.list', 'LICENSE.md']
+#--- source directory of the components enabled by cmake/configure_apps.cmake ---
+COMPONENT_PATHS = {'FV3':           'FV3/',
+                   'STOCH_PHYS':    'stochastic_physics/',
+                   'CMEPS':         'CMEPS-interface/',
+                   'CDEPS':         'CDEPS-interface/',
+                   'MOM6':          'MOM6-interface/',
+                   'CICE6':         'CICE-interface/',
+                   'HYCOM':         'HYCOM-interface/',
+                   'WW3':           'WW3/',
+                   'UFS_GOCART':    'GOCART/',
+                   'AQM':           'AQM/',
+                   'NOAHMP':        'NOAHMP-interface/',
+                   'FIRE_BEHAVIOR': 'fire_behavior/'}
+CCPP_SUITES_DIR = 'FV3/ccpp/suites/'
+#--- test configuration files, referenced by name from the variables of a test ---
+TEST_CONFIG_DIRS = ['tests/parm/', 'tests/fv3_conf/']
+NULL_SHA = '0'*40
+
+def get_changed_paths(repo_dir, base_commit, prefix=''):
+    """Files changed in the working tree since a commit, inside submodules too
+
+    A submodule whose old commit is checked out in it is compared file by
+    file, else the submodule path itself is reported.
+
+    Args:
+        repo_dir (str): git repository
+        base_commit (str): commit to compare against
+        prefix (str): path of repo_dir in the top repository
+
+    Returns:
+        list: changed paths relative to the top repository
+    """
+    changed = []
+    diff = subprocess.check_output(['git', 'diff', '--raw', '--no-abbrev', base_commit],
+                                   cwd=repo_dir, text=True)
+    for line in diff.splitlines():
+        status, path = line.split('\t', 1)
+        old_mode, new_mode, old_sha, new_sha = status.lstrip(':').split()[:4]
+        sub_dir = repo_dir+'/'+path
+        if '160000' in (old_mode, new_mode) and old_sha != NULL_SHA and os.path.isdir(sub_dir):
+            known = subprocess.run(['git', 'cat-file', '-e', old_sha+'^{commit}'], cwd=sub_dir,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+            if known:
+                changed.extend(get_changed_paths(sub_dir, old_sha, prefix+path+'/'))
+                continue
+        changed.append(prefix+path)
+    untracked = subprocess.check_output(['git', 'ls-files', '--others', '--exclude-standard'],
+                                        cwd=repo_dir, text=True)
+    changed.extend(prefix+path for path in untracked.splitlines())
+    return changed
+
+def get_app_components(PATHTR, APP):
+    """Components cmake/configure_apps.cmake enables for an application
+
+    The if blocks on APP MATCHES are evaluated as CMake does, searching
+    the regular expression in the application name. Other conditions are
+    taken as true.
+
+    Args:
+        PATHTR (str): Top directory of the ufs-weather-model checkout
+        APP (str): application e.g. S2SW
+
+    Returns:
+        set: component names e.g. FV3, WW3
+    """
+    components = set()
+    #--- one entry per if block: whether a branch was taken, whether the current branch is active ---
+    blocks = []
+    with open(PATHTR+'/cmake/configure_apps.cmake') as fapps:
+        for line in fapps:
+            line = line.split('#', 1)[0].strip()
+            match = re.match(r'(if|elseif)\s*\((.*)\)\s*$', line)
+            if match:
+                condition = re.match(r'APP\s+MATCHES\s+"([^"]*)"', match.group(2).strip())
+                value = bool(re.search(condition.group(1), APP)) if condition else True
+                if match.group(1) == 'if':
+                    blocks.append([value, value])
+                else:
+                    blocks[-1] = [blocks[-1][0] or value, not blocks[-1][0] and value]
+            elif re.match(r'else\s*\(', line):
+                blocks[-1] = [True, not blocks[-1][0]]
+            elif re.match(r'endif\s*\(', line):
+                blocks.pop()
+            else:
+                match = re.match(r'set\s*\(\s*(\w+)\s+ON\b', line)
+                if match and all(active for taken, active in blocks):
+                    components.add(match.group(1))
+    return components
+
+def get_make_opt(MAKE_OPT, name):
+    """Value of a -D option of a compile
+
+    Args:
+        MAKE_OPT (str): Make build options e.g. -DAPP=ATM -DCCPP_SUITES=FV3_GFS_v16
+        name (str): option name e.g. APP
+
+    Returns:
+        str: option value, empty when not set
+    """
+    match = re.search(r'-D'+name+r'=(\S+)', MAKE_OPT)
+    return match.group(1) if match else ''
+
+def classify_path(path):
+    """Kind of impact of a changed path
+
+    Args:
+        path (str): changed path relative to the top repository
+
+    Returns:
+        tuple: kind and name: ('none', ''), ('test', test name), ('config', path),
+               ('suite', CCPP suite), ('component', component) or ('core', path)
+    """
+    if any(path.startswith(prefix) for prefix in NO_IMPACT) or path.endswith('.md'):
+        return 'none', ''
+    if path.startswith('tests/tests/'):
+        return 'test', path[len('tests/tests/'):]
+    if any(path.startswith(prefix) for prefix in TEST_CONFIG_DIRS):
+        return 'config', path
+    match = re.match(re.escape(CCPP_SUITES_DIR)+r'suite_(\w+)\.xml$', path)
+    if match:
+        return 'suite', match.group(1)
+    for component, prefix in COMPONENT_PATHS.items():
+        if path.startswith(prefix) or path+'/' == prefix:
+            return 'component', component
+    return 'core', path
+
+def impacted_yaml(rt_yaml, PATHTR, changed_paths):
+    """Compiles and tests of the test yaml impacted by changed paths
+
+    Args:
+        rt_yaml (dict): test yaml configuration
+        PATHTR (str): Top directory of the ufs-weather-model checkout
+        changed_paths (list): paths from get_changed_paths
+
+    Returns:
+        dict: test yaml of the impacted compiles and tests, None for the full suite
+    """
+    from opnreq_cases import read_test_vars
+    test_vars = {}
+    def get_test_vars(TEST_NAME):
+        if TEST_NAME not in test_vars:
+            test_vars[TEST_NAME] = read_test_vars(PATHTR+'/tests', TEST_NAME)
+        return test_vars[TEST_NAME]
+
+    all_tests = [(apps, *get_testcase(test)) for apps, jobs in rt_yaml.items() for test in jobs.get('tests', [])]
+    app_components = {}
+    selected_compiles = set()
+    selected_tests = set()
+    for path in changed_paths:
+        kind, name = classify_path(path)
+        if kind == 'none':
+            continue
+        if kind == 'core':
+            print(f"{path} changed, running the full suite")
+            return None
+        if kind == 'test':
+            found = [(apps, TEST_NAME) for apps, TEST_NAME, config in all_tests if TEST_NAME == name]
+        elif kind == 'config':
+            #--- a file no test names may be read by every test, FV3_RUN lists several files ---
+            filename = os.path.basename(path)
+            found = [(apps, TEST_NAME) for apps, TEST_NAME, config in all_tests
+                     if any(filename in value.split() for value in get_test_vars(TEST_NAME).values())]
+            if not found:
+                print(f"{path} changed and is not named by a test, running the full suite")
+                return None
+        elif kind == 'suite':
+            compiles = [apps for apps, jobs in rt_yaml.items()
+                        if name in get_make_opt(jobs['build']['option'], 'CCPP_SUITES').split(',')]
+            selected_compiles.update(compiles)
+            found = [(apps, TEST_NAME) for apps, TEST_NAME, config in all_tests
+                     if apps in compiles and get_test_vars(TEST_NAME).get('CCPP_SUITE', '').strip("'") == name]
+        else:
+            for apps, jobs in rt_yaml.items():
+                APP = get_make_opt(jobs['build']['option'], 'APP')
+                if APP not in app_components:
+                    app_components[APP] = get_app_components(PATHTR, APP)
+                if name in app_components[APP]:
+                    selected_compiles.add(apps)
+            found = [(apps, TEST_NAME) for apps, TEST_NAME, config in all_tests if apps in selected_compiles]
+        selected_tests.update(found)
+    #--- tests using the output of an impacted test are impacted, then the tests providing their input run too ---
+    for provider_side in [False, True]:
+        added = True
+        while added:
+            linked = set()
+            for apps, TEST_NAME, config in all_tests:
+                if 'dependency' not in config:
+                    continue
+                if not provider_side and (apps, str(config['dependency'])) in selected_tests:
+                    linked.add((apps, TEST_NAME))
+                if provider_side and (apps, TEST_NAME) in selected_tests:
+                    linked.add((apps, str(config['dependency'])))
+            added = not linked <= selected_tests
+            selected_tests |= linked
+    new_yaml = {}
+    for apps, jobs in rt_yaml.items():
+        tests = [test for test in jobs.get('tests', []) if (apps, get_testcase(test)[0]) in selected_tests]
+        if tests or apps in selected_compiles:
+            new_yaml[apps] = {'build': jobs['build'], 'tests': tests}
+    return new_yaml
+
+def update_testyaml_j():
+    """Update test yaml file for the tests impacted by the changes since -j <git ref>
+
+    The selection narrows UFS_TEST_YAML, so -j combines with -l, -n and -q.
+    Without impacted tests no test yaml file is left.
+    """
+    import yaml
+    IMPACT_REF = str(os.getenv('IMPACT_REF'))
+    UFS_TEST_YAML = str(os.getenv('UFS_TEST_YAML'))
+    PATHTR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        base_commit = subprocess.check_output(['git', 'rev-parse', '--verify', IMPACT_REF+'^{commit}'],
+                                              cwd=PATHTR, text=True, stderr=subprocess.DEVNULL).strip()
+    except subprocess.CalledProcessError:
+        sys.exit(f"*** {IMPACT_REF} is not a git commit ***")
+    with open(UFS_TEST_YAML, 'r') as file_yaml:
+        rt_yaml = yaml.load(file_yaml, Loader=yaml.FullLoader)
+    new_yaml = impacted_yaml(rt_yaml, PATHTR, get_changed_paths(PATHTR, base_commit))
+    if new_yaml is None:
+        new_yaml = rt_yaml
+    if len(new_yaml) == 0:
+        print(f"No tests impacted by the changes since {IMPACT_REF}")
+        if os.path.isfile('ufs_test_temp.yaml'):
+            os.remove('ufs_test_temp.yaml')
+        return
+    print(f"{sum(len(jobs.get('tests', [])) for jobs in new_yaml.values())} tests of {len(new_yaml)} compiles "
+          f"impacted by the changes since {IMPACT_REF}")
+    with open('ufs_test_temp.yaml', 'w') as yaml_file:
+        yaml.dump(new_yaml, yaml_file)
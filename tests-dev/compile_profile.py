@@ -0,0 +1,334 @@
+import os
+import re
+import sys
+from datetime import datetime
+
+#--- runs kept in the profile history of a compile ---
+HISTORY_RUNS  = 10
+SLOWEST_UNITS = 15
+#--- seconds between the end of a command and the start of the next one on the critical path ---
+PATH_SLACK    = 0.1
+#--- a build uses the fewest cores within this fraction of its time on a full node ---
+CORES_TOLERANCE = 0.1
+MIN_BUILD_CORES = 4
+
+def get_target(obj):
+    """CMake target of a compiled object
+
+    Args:
+        obj (str): object file of the command e.g. CMakeFiles/fv3.dir/fv3/atmos_model.F90.o
+
+    Returns:
+        str: target e.g. fv3, 'link <executable>' for a link command
+    """
+    match = re.search(r'CMakeFiles/([^/]+)\.dir/', obj)
+    if match:
+        return match.group(1)
+    return 'link '+os.path.basename(obj)
+
+def read_profile(filename):
+    """Read the commands compile_launcher.sh recorded for a build
+
+    Args:
+        filename (str): profile written during the build
+
+    Returns:
+        dict: BUILD_JOBS of the build, whether the link commands were profiled,
+              and its commands, each with start and end in seconds since the
+              first start, exit status, source, object and target
+    """
+    build_jobs = None
+    link_profiled = None
+    jobs = []
+    with open(filename) as fprofile:
+        for line in fprofile:
+            fields = line.split()
+            if line.startswith('# BUILD_JOBS') and len(fields) == 3:
+                build_jobs = int(fields[2])
+                continue
+            if line.startswith('# LINK_PROFILED') and len(fields) == 3:
+                link_profiled = fields[2] == 'yes'
+                continue
+            if len(fields) != 5 or line.startswith('#'):
+                continue
+            start, end, rc, source, obj = fields
+            jobs.append({'start': float(start), 'end': float(end), 'rc': int(rc),
+                         'source': source if source != '-' else '', 'object': obj,
+                         'target': get_target(obj)})
+    if jobs:
+        first = min(job['start'] for job in jobs)
+        for job in jobs:
+            job['start'] -= first
+            job['end']   -= first
+    #--- source paths are shown relative to the directory holding all of them ---
+    sources = [job['source'] for job in jobs if job['source'].startswith('/')]
+    top = os.path.commonpath(sources) if len(sources) > 1 else ''
+    for job in jobs:
+        job['unit'] = os.path.relpath(job['source'], top) if top and job['source'].startswith('/') else \
+                      job['source'] or job['target']
+    #--- profiles without the header were written with a linker launcher ---
+    if link_profiled is None:
+        link_profiled = any(job['target'].startswith('link ') for job in jobs)
+    return {'BUILD_JOBS': build_jobs, 'LINK_PROFILED': link_profiled, 'jobs': jobs}
+
+def critical_path(jobs):
+    """Chain of commands ending with the last one, each starting as the one before it ended
+
+    Walking back from the last command to the command that ended last
+    before it started gives the commands the build waited for. When all
+    make jobs were busy the chain follows the free slots rather than the
+    dependencies, the average concurrency tells the two apart.
+
+    Args:
+        jobs (list): commands from read_profile
+
+    Returns:
+        list: commands of the critical path, first to last
+    """
+    if not jobs:
+        return []
+    by_end = sorted(jobs, key=lambda job: job['end'])
+    path = [by_end[-1]]
+    while True:
+        current = path[-1]
+        before = [job for job in by_end if job['end'] <= current['start']+PATH_SLACK and job is not current
+                  and job['start'] < current['start']]
+        if not before:
+            break
+        path.append(before[-1])
+    return path[::-1]
+
+def get_concurrency(jobs):
+    """Seconds of a build spent with each number of commands running
+
+    Args:
+        jobs (list): commands from read_profile
+
+    Returns:
+        dict: number of running commands mapped to seconds
+    """
+    events = sorted([(job['start'], 1) for job in jobs]+[(job['end'], -1) for job in jobs])
+    seconds = {}
+    running, last = 0, 0.0
+    for time, step in events:
+        seconds[running] = seconds.get(running, 0.0)+time-last
+        running += step
+        last = time
+    return seconds
+
+def summarize_profile(profile, top=SLOWEST_UNITS):
+    """Wall and CPU time, critical path and slowest units of a build
+
+    Args:
+        profile (dict): from read_profile
+        top (int): slowest units reported
+
+    Returns:
+        dict: build summary
+    """
+    jobs = profile['jobs']
+    wall = max((job['end'] for job in jobs), default=0.0)
+    cpu  = sum(job['end']-job['start'] for job in jobs)
+    targets = {}
+    for job in jobs:
+        target = targets.setdefault(job['target'], {'units': 0, 'seconds': 0.0, 'first': job['start'], 'last': job['end']})
+        target['units']  += 1
+        target['seconds']+= job['end']-job['start']
+        target['first']   = min(target['first'], job['start'])
+        target['last']    = max(target['last'], job['end'])
+    path = critical_path(jobs)
+    slowest = sorted(jobs, key=lambda job: job['start']-job['end'])[:top]
+    return {'BUILD_JOBS': profile['BUILD_JOBS'], 'LINK_PROFILED': profile['LINK_PROFILED'], 'wall': wall, 'cpu': cpu, 'units': len(jobs),
+            'concurrency': cpu/wall if wall else 0.0,
+            'running': get_concurrency(jobs),
+            'failed': [job['unit'] for job in jobs if job['rc'] != 0],
+            'targets': dict(sorted(targets.items(), key=lambda item: -item[1]['seconds'])),
+            'critical_path': [(job['unit'], job['target'], job['end']-job['start']) for job in path],
+            'critical_seconds': sum(job['end']-job['start'] for job in path),
+            'slowest': [(job['unit'], job['target'], job['end']-job['start']) for job in slowest],
+            'unit_seconds': {job['unit']: job['end']-job['start'] for job in jobs}}
+
+def format_delta(seconds, old_seconds):
+    """Change of a time against an earlier run
+
+    Args:
+        seconds (float): time of this run
+        old_seconds (float): time of the earlier run, None when not known
+
+    Returns:
+        str: e.g. (+12.3s), empty without an earlier time
+    """
+    if old_seconds is None:
+        return ''
+    return f" ({seconds-old_seconds:+.1f}s)"
+
+def format_report(name, summary, old_summary=None):
+    """Report lines of a build profile, compared with an earlier run when given
+
+    Args:
+        name (str): compile e.g. compile_s2swa_intel
+        summary (dict): from summarize_profile
+        old_summary (dict): summary of the earlier run, None for no comparison
+
+    Returns:
+        list: lines
+    """
+    old = old_summary or {}
+    old_units   = old.get('unit_seconds', {})
+    old_targets = old.get('targets', {})
+    lines = [f"{name}: {summary['units']} commands, make -j {summary['BUILD_JOBS'] or '?'}",
+             f"  wall {summary['wall']:8.1f}s{format_delta(summary['wall'], old.get('wall'))}"
+             f"  cpu {summary['cpu']:9.1f}s{format_delta(summary['cpu'], old.get('cpu'))}"
+             f"  average concurrency {summary['concurrency']:.1f}"]
+    if summary['BUILD_JOBS'] and summary['wall']:
+        busy = sum(seconds for running, seconds in summary['running'].items() if running >= summary['BUILD_JOBS'])
+        lines.append(f"  all make jobs busy {100*busy/summary['wall']:.0f}% of the wall time")
+    if summary['failed']:
+        lines.append(f"  failed: {' '.join(summary['failed'])}")
+    if not summary['LINK_PROFILED']:
+        lines.append("  link times missing, CMake before 3.21 has no linker launcher: "
+                     "wall time and critical path end with the last compile")
+    lines.append(f"  critical path {summary['critical_seconds']:.1f}s"
+                 f"{format_delta(summary['critical_seconds'], old.get('critical_seconds'))}"
+                 f" in {len(summary['critical_path'])} commands:")
+    for unit, target, seconds in summary['critical_path']:
+        lines.append(f"    {seconds:8.1f}s  {target:20} {unit}")
+    lines.append("  targets:")
+    for target, totals in summary['targets'].items():
+        old_seconds = old_targets[target]['seconds'] if target in old_targets else None
+        lines.append(f"    {target:24} {totals['units']:5} units {totals['seconds']:9.1f}s cpu"
+                     f"{format_delta(totals['seconds'], old_seconds)}"
+                     f"  {totals['first']:7.1f}s - {totals['last']:7.1f}s")
+    lines.append("  slowest units:")
+    for unit, target, seconds in summary['slowest']:
+        lines.append(f"    {seconds:8.1f}s{format_delta(seconds, old_units.get(unit))}  {target:20} {unit}")
+    return lines
+
+def record_profile(COMPILE_PROFILE_DIR, COMPILE_ID, summary):
+    """Add a build to the profile history of a compile
+
+    Args:
+        COMPILE_PROFILE_DIR (str): profile history directory
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+        summary (dict): from summarize_profile
+    """
+    import yaml
+    history = read_history(COMPILE_PROFILE_DIR, COMPILE_ID)
+    history.append({'DATE': datetime.now().strftime("%Y%m%d %H:%M:%S"), 'BUILD_JOBS': summary['BUILD_JOBS'],
+                    'WALL': round(summary['wall'], 1), 'CPU': round(summary['cpu'], 1),
+                    'CRITICAL_PATH': round(summary['critical_seconds'], 1), 'UNITS': summary['units'],
+                    'RUNNING': {running: round(seconds, 1) for running, seconds in sorted(summary['running'].items())}})
+    os.makedirs(COMPILE_PROFILE_DIR, exist_ok=True)
+    #--- rename a complete file, so readers never see a partial history ---
+    tmp_file = COMPILE_PROFILE_DIR+'/'+COMPILE_ID+'.tmp'+str(os.getpid())
+    with open(tmp_file, 'w') as fhistory:
+        yaml.dump(history[-HISTORY_RUNS:], fhistory, sort_keys=False)
+    os.replace(tmp_file, COMPILE_PROFILE_DIR+'/'+COMPILE_ID+'.yaml')
+
+def read_history(COMPILE_PROFILE_DIR, COMPILE_ID):
+    """Recorded builds of a compile, oldest first
+
+    Args:
+        COMPILE_PROFILE_DIR (str): profile history directory
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+
+    Returns:
+        list: WALL, CPU and CRITICAL_PATH seconds, BUILD_JOBS and seconds with
+              each number of commands RUNNING of each build
+    """
+    import yaml
+    history_file = COMPILE_PROFILE_DIR+'/'+COMPILE_ID+'.yaml'
+    if not os.path.isfile(history_file):
+        return []
+    with open(history_file) as fhistory:
+        return yaml.load(fhistory, Loader=yaml.FullLoader) or []
+
+def predict_build_time(build, cores):
+    """Time of a recorded build with another number of cores
+
+    While all make jobs were busy the build is taken to scale with the
+    cores. While fewer commands ran it waited for dependencies, and only
+    slows down when more commands ran than there are cores.
+
+    Args:
+        build (dict): recorded build from read_history
+        cores (int): cores of the build
+
+    Returns:
+        float: predicted wall time in seconds
+    """
+    BUILD_JOBS = build['BUILD_JOBS'] or 1
+    return sum(seconds*(running/cores if running >= BUILD_JOBS else max(running/cores, 1.0))
+               for running, seconds in build['RUNNING'].items())
+
+def get_build_cores(history, TPN, BUILD_CORES):
+    """Cores of the next build of a compile from its recorded builds
+
+    The fewest cores within CORES_TOLERANCE of the time on a full node are
+    used, so small builds pack onto shared nodes. A build using more than
+    half a node gets the full node.
+
+    Args:
+        history (list): recorded builds from read_history
+        TPN (int): cores per node of the machine, 0 when not known
+        BUILD_CORES (int): cores without a recorded build
+
+    Returns:
+        int: cores, also the make -j of the build
+    """
+    builds = [build for build in history if build.get('RUNNING')]
+    if not builds or TPN <= 0:
+        return BUILD_CORES
+    build = builds[-1]
+    limit = (1+CORES_TOLERANCE)*predict_build_time(build, TPN)
+    cores = next(cores for cores in range(min(MIN_BUILD_CORES, TPN), TPN+1) if predict_build_time(build, cores) <= limit)
+    return TPN if 2*cores > TPN else cores
+
+def get_profiles(path):
+    """Build profiles of a log directory, or a single profile
+
+    Args:
+        path (str): log directory e.g. logs/log_hera, or a profile file
+
+    Returns:
+        dict: compile e.g. compile_s2swa_intel mapped to its profile file
+    """
+    if os.path.isfile(path):
+        name = os.path.basename(path)
+        return {name[:-len('_profile.txt')] if name.endswith('_profile.txt') else name: path}
+    return {name[:-len('_profile.txt')]: path+'/'+name for name in sorted(os.listdir(path))
+            if name.startswith('compile_') and name.endswith('_profile.txt')}
+
+def main():
+    """Report the build profiles of the compile jobs, or record one into the profile history
+
+    Usage: compile_profile.py LOG_DIR [OLD_LOG_DIR]
+           compile_profile.py record PROFILE COMPILE_ID
+
+    LOG_DIR and OLD_LOG_DIR are log directories e.g. logs/log_hera with the
+    compile_*_profile.txt files run_compile.sh copies there, or single
+    profile files. With OLD_LOG_DIR each time is compared with the same
+    compile of the earlier run. record adds the build to the history in
+    COMPILE_PROFILE_DIR.
+    """
+    args = sys.argv[1:]
+    if not args:
+        sys.exit(main.__doc__)
+    if args[0] == 'record':
+        PROFILE, COMPILE_ID = args[1], args[2]
+        COMPILE_PROFILE_DIR = str(os.getenv('COMPILE_PROFILE_DIR'))
+        summary = summarize_profile(read_profile(PROFILE))
+        if summary['units'] and COMPILE_PROFILE_DIR != 'None':
+            record_profile(COMPILE_PROFILE_DIR, COMPILE_ID, summary)
+        return
+    profiles = get_profiles(args[0])
+    old_profiles = get_profiles(args[1]) if len(args) > 1 else {}
+    if len(old_profiles) == 1 and len(profiles) == 1:
+        old_profiles = {name: file for name in profiles for file in old_profiles.values()}
+    for name, profile in profiles.items():
+        old_summary = summarize_profile(read_profile(old_profiles[name])) if name in old_profiles else None
+        print('\n'.join(format_report(name, summarize_profile(read_profile(profile)), old_summary)))
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,12 @@ import sys
 import subprocess
 import yaml
 from datetime import datetime
-from ufs_test_utils import get_testcase, write_logfile, delete_files, machine_check_off
+from ufs_test_utils import get_testcase, write_logfile, delete_files, machine_check_off, get_compile_aliases
+from build_cache import RERUN_BUILDS_DIR, read_build_status, store_build, keep_run_builds
+from opnreq_cases import OPNREQ_ENV, get_test_id
+from job_phases import PHASE_REPORT, write_phase_report
+from failure_triage import classify_job, write_triage
+from result_cache import read_result_status, store_result
 
 def finish_log():
     """Collect regression test results and generate log file.
@@ -17,6 +22,11 @@ def finish_log():
     ROCOTO     = str(os.getenv('ROCOTO'))
     CREATE_BASELINE = str(os.getenv('CREATE_BASELINE'))
     COMPILE_ONLY = str(os.getenv('COMPILE_ONLY'))
+    BUILD_CACHE  = str(os.getenv('BUILD_CACHE'))
+    RUNDIR_ROOT  = os.path.realpath(PATHRT+'/run_dir')
+    LOG_DIR      = PATHRT+'/logs/log_'+MACHINE_ID
+    build_status = read_build_status(RUNDIR_ROOT)
+    result_status= read_result_status(RUNDIR_ROOT)
 
     run_logs= f"""
 """
@@ -26,9 +36,19 @@ def finish_log():
     PASS_NR= 0
     FAIL_NR= 0
     failed_list= []
+    failed_builds= set()
+    compile_pass_list= []
+    SHARED_NR  = 0
+    SHARED_TIME= 0
+    CACHED_NR  = 0
+    RESULT_CACHED_NR = 0
+    phase_jobs = []
+    triage     = {}
     test_changes_list= PATHRT+'/test_changes.list'
     with open(UFS_TEST_YAML, 'r') as f:
         rt_yaml = yaml.load(f, Loader=yaml.FullLoader)
+        compile_aliases = get_compile_aliases(rt_yaml, MACHINE_ID)
+        compile_etimes  = {}
         for apps, jobs in rt_yaml.items():
             for key, val in jobs.items():
                 if (str(key) == 'build'):
@@ -40,13 +60,33 @@ def finish_log():
                         COMPILE_ID  = apps
                         COMPILE_LOG = 'compile_'+COMPILE_ID+'.log'
                         COMPILE_LOG_TIME ='compile_'+COMPILE_ID+'_timestamp.txt'
+                        if COMPILE_ID in compile_aliases:
+                            BUILD_ID = compile_aliases[COMPILE_ID]
+                            SHARED_NR += 1
+                            if BUILD_ID in compile_pass_list:
+                                COMPILE_PASS += 1
+                                SHARED_TIME  += compile_etimes.get(BUILD_ID, 0)
+                                compile_pass_list.append(COMPILE_ID)
+                                run_logs += "PASS -- COMPILE "+COMPILE_ID+" (shared with compile_"+BUILD_ID+")\n"
+                            else:
+                                run_logs += "FAIL -- COMPILE "+COMPILE_ID+" (shared with compile_"+BUILD_ID+")\n"
+                            continue
+                        if build_status.get(COMPILE_ID, {}).get('cached', False):
+                            COMPILE_PASS += 1
+                            CACHED_NR    += 1
+                            compile_pass_list.append(COMPILE_ID)
+                            if 'rerun_dir' in build_status[COMPILE_ID]:
+                                run_logs += "PASS -- COMPILE "+COMPILE_ID+" (reused from "+build_status[COMPILE_ID]['rerun_dir']+")\n"
+                            else:
+                                run_logs += "PASS -- COMPILE "+COMPILE_ID+" (build cache hit)\n"
+                            continue
                         with open('./logs/log_'+MACHINE_ID+'/'+COMPILE_LOG) as f:
                             if "[100%] Linking Fortran executable" in f.read():
                                 COMPILE_PASS += 1
                                 f.seek(0)
                                 for line in f:
                                     if 'export RUNDIR_ROOT=' in line:
-                                        RUNDIR_ROOT=line.split("=")[1]
+                                        RUNDIR_ROOT=line.split("=")[1].strip("\n")
                                         break
                                 compile_err = RUNDIR_ROOT.strip('\n')+'/compile_'+COMPILE_ID+'/err'
                                 with open(compile_err) as ferr:
@@ -71,8 +111,15 @@ def finish_log():
                                 time_log = " ["+etime_min+':'+etime_sec+', '+btime_min+':'+btime_sec+"]"
                                 flog.close()
                                 compile_log = "PASS -- COMPILE "+COMPILE_ID+time_log+warning_log+"\n"
+                                compile_pass_list.append(COMPILE_ID)
+                                compile_etimes[COMPILE_ID] = etime
+                                phase_jobs.append('compile_'+COMPILE_ID)
+                                if (BUILD_CACHE == 'true' and COMPILE_ID in build_status):
+                                    build = build_status[COMPILE_ID]
+                                    store_build(build['cache_dir'], build['key'], COMPILE_ID, MACHINE_ID, PATHRT, val['option'])
                             else:
-                                compile_log = "FAIL -- COMPILE "+COMPILE_ID+"\n"                        
+                                triage['compile_'+COMPILE_ID] = classify_job(LOG_DIR, RUNDIR_ROOT, 'compile_'+COMPILE_ID)
+                                compile_log = "FAIL -- COMPILE "+COMPILE_ID+" ("+triage['compile_'+COMPILE_ID]['class']+")\n"                        
                             f.close()
                         run_logs += compile_log
                     else:
@@ -82,9 +129,23 @@ def finish_log():
                         case, config = get_testcase(test)
                         machine_check = machine_check_off(MACHINE_ID, config)
                         if machine_check:
-                            JOB_NR+=1
                             TEST_NAME = case
-                            TEST_ID   = TEST_NAME+'_'+RT_COMPILER
+                            TEST_ID   = get_test_id(TEST_NAME, RT_COMPILER, config)
+                            #--- operational requirement cases not set up for the test were not run ---
+                            if ('opnreq' in config and
+                                not os.path.isfile(os.path.realpath(PATHRT+'/run_dir')+'/'+OPNREQ_ENV+TEST_ID+'.env')):
+                                continue
+                            JOB_NR+=1
+                            if 'cached' in result_status.get(TEST_ID, {}):
+                                result = result_status[TEST_ID]['cached']
+                                etime_min, etime_sec = divmod(int(result['ETIME']), 60)
+                                rtime_min, rtime_sec = divmod(int(result['RTIME']), 60)
+                                time_log = f" [{etime_min:02}:{etime_sec:02}, {rtime_min:02}:{rtime_sec:02}]"
+                                run_logs += 'PASS -- TEST '+TEST_ID+time_log+' ('+str(result['MEMSIZE'])+' MB)'+ \
+                                            ' (result cache hit from '+str(result['DATE'])+')\n'
+                                PASS_NR += 1
+                                RESULT_CACHED_NR += 1
+                                continue
                             TEST_LOG  = 'rt_'+TEST_ID+'.log'
                             TEST_LOG_TIME= 'run_'+TEST_ID+'_timestamp.txt'
                             if 'dependency' in config.keys():
@@ -95,7 +156,7 @@ def finish_log():
                             MAXS_CHECK = 'The maximum resident set size (KB)'
                             pass_flag = False
                             create_dep_flag = False
-                            if (CREATE_BASELINE == 'true' and not DEP_RUN == ""):
+                            if (CREATE_BASELINE == 'true' and not DEP_RUN == "" and not 'opnreq' in config):
                                 create_dep_flag = True
                             if not create_dep_flag:
                                 with open('./logs/log_'+MACHINE_ID+'/'+TEST_LOG) as f:
@@ -114,6 +175,7 @@ def finish_log():
                                     rtime_min = f"{rtime_min:02}"; rtime_sec = f"{rtime_sec:02}"
                                     time_log = " ["+etime_min+':'+etime_sec+', '+rtime_min+':'+rtime_sec+"]"
                                     f.close()
+                                    phase_jobs.append('run_'+TEST_ID)
                                 with open('./logs/log_'+MACHINE_ID+'/'+TEST_LOG) as f:
                                     if pass_flag :
                                         rtlog_file = f.readlines()
@@ -122,9 +184,14 @@ def finish_log():
                                                 memsize= line.split('=')[1].strip()
                                         test_log = 'PASS -- TEST '+TEST_ID+time_log+' ('+memsize+' MB)\n'
                                         PASS_NR += 1
+                                        if TEST_ID in result_status:
+                                            store_result(result_status[TEST_ID]['cache_dir'], result_status[TEST_ID]['key'],
+                                                         TEST_ID, etime, rtime, memsize)
                                     else:
-                                        test_log = 'FAIL -- TEST '+TEST_ID+'\n'
+                                        triage['run_'+TEST_ID] = classify_job(LOG_DIR, RUNDIR_ROOT, 'run_'+TEST_ID)
+                                        test_log = 'FAIL -- TEST '+TEST_ID+' ('+triage['run_'+TEST_ID]['class']+')\n'
                                         failed_list.append(TEST_NAME+' '+RT_COMPILER)
+                                        failed_builds.add(compile_aliases.get(COMPILE_ID, COMPILE_ID))
                                         FAIL_NR += 1
                                     run_logs += test_log
                                 f.close()
@@ -153,9 +220,26 @@ Ending Date/Time: {TEST_END_TIME}
 Total Time: {elapsed_time}
 Compiles Completed: {COMPILE_PASS}/{COMPILE_NR}
 Tests Completed: {PASS_NR}/{JOB_NR}
-
-"""    
+"""
+    if CACHED_NR > 0:
+        synop_log += f"""Compiles Cached: {CACHED_NR}
+"""
+    if RESULT_CACHED_NR > 0:
+        synop_log += f"""Tests Cached: {RESULT_CACHED_NR}
+"""
+    if SHARED_NR > 0:
+        synop_log += f"""Compiles Shared: {SHARED_NR} (~{SHARED_TIME/3600:.2f} compile-hours saved)
+"""
+    #--- is a slow day the queue of the machine or the overhead of the tests ---
+    phase_totals = write_phase_report(LOG_DIR, phase_jobs)
+    if phase_totals['jobs'] > 0:
+        synop_log += (f"Job Hours: {phase_totals['queue']/3600:.2f} queue wait, {phase_totals['prep']/3600:.2f} prep, "
+                      f"{phase_totals['run']/3600:.2f} run, {phase_totals['check']/3600:.2f} check, "
+                      f"{phase_totals['cleanup']/3600:.2f} cleanup (log_{MACHINE_ID}/{PHASE_REPORT})\n")
+    synop_log += "\n"
     write_logfile(filename, "a", output=synop_log)
+    #--- failure class and evidence of every failed job, to route reruns and new baselines ---
+    write_triage(LOG_DIR, triage)
 
     if (int(FAIL_NR) == 0):
         if os.path.isfile(test_changes_list):
@@ -182,6 +266,8 @@ Result: {SUCCESS}
 NOTES:
 A file test_changes.list was generated with list of all failed tests.
 You can use './rt.sh -c -b test_changes.list' to create baselines for the failed tests.
+You can use './ufs_test.sh -b test_changes.list -u {os.path.realpath(PATHRT+'/run_dir')}' to rerun
+the failed tests with the executables of this run, as long as the model sources did not change.
 If you are using this log as a pull request verification, please commit test_changes.list.
 
 Result: FAILURE
@@ -191,6 +277,10 @@ Result: FAILURE
         write_logfile(filename, "a", output=comment_log)
    
     print("Performing Cleanup...")
+    #--- ufs_test.sh -u reruns the failed tests with these builds ---
+    kept = keep_run_builds(os.path.realpath(PATHRT+'/run_dir'), sorted(failed_builds), MACHINE_ID, PATHRT)
+    if kept:
+        print('Kept builds of',len(kept),'compiles in',os.path.realpath(PATHRT+'/run_dir')+'/'+RERUN_BUILDS_DIR)
     exefiles= PATHRT+'/fv3_*.*x*'; delete_files(exefiles)
     modfiles= PATHRT+'/modules.fv3_*'; delete_files(modfiles)
     modfiles= PATHRT+'modulefiles/modules.fv3_*'; delete_files(modfiles)
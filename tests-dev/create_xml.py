@@ -1,10 +1,25 @@
 import os
 import sys
-import subprocess
-import yaml
-from ufs_test_utils import get_testcase, write_logfile, rrmdir, machine_check_off
+from ufs_test_utils import get_testcase, write_logfile, rrmdir, machine_check_off, \
+                           get_compile_aliases, get_logtimes
 
-def rocoto_create_entries(RTPWD,MACHINE_ID,INPUTDATA_ROOT,INPUTDATA_ROOT_WW3,INPUTDATA_ROOT_BMIC,RUNDIR_ROOT,NEW_BASELINE,ROCOTO_XML):
+#--- tasks the Rocoto workflows of a run keep queued or running at the same time, shared by the shards ---
+ROCOTO_TASKTHROTTLE = 10
+#--- machines building on login partitions or with the make -j compile.sh sets, their compiles keep BUILD_CORES ---
+FIXED_BUILD_MACHINES = ['derecho', 'gaea']
+
+def get_taskthrottle(ROCOTO_SHARDS):
+    """Task throttle of each workflow of a sharded run
+
+    Args:
+        ROCOTO_SHARDS (int): number of workflows run concurrently
+
+    Returns:
+        int: tasks each workflow keeps queued or running, at least 1
+    """
+    return max(1, ROCOTO_TASKTHROTTLE//max(1, ROCOTO_SHARDS))
+
+def rocoto_create_entries(RTPWD,MACHINE_ID,INPUTDATA_ROOT,INPUTDATA_ROOT_WW3,INPUTDATA_ROOT_BMIC,RUNDIR_ROOT,NEW_BASELINE,xml,WORKFLOW_LOG="workflow.log",TASKTHROTTLE=ROCOTO_TASKTHROTTLE):
     """Generate header information for Rocoto xml file
 
     Args:
@@ -15,7 +30,9 @@ def rocoto_create_entries(RTPWD,MACHINE_ID,INPUTDATA_ROOT,INPUTDATA_ROOT_WW3,INP
         INPUTDATA_ROOT_BMIC (str): BMIC input data directory
         RUNDIR_ROOT (str): Test run directory
         NEW_BASELINE (str): Directory for newly generated baselines
-        ROCOTO_XML (str): Rocoto .xml filename to write to
+        xml (list): Rocoto xml fragments, appended to
+        WORKFLOW_LOG (str): Rocoto log filename. Defaults to "workflow.log".
+        TASKTHROTTLE (int): tasks queued or running at the same time. Defaults to ROCOTO_TASKTHROTTLE.
     """
     PATHRT = os.getenv('PATHRT')
     LOG_DIR= PATHRT+'/logs/log_'+MACHINE_ID
@@ -34,28 +51,27 @@ def rocoto_create_entries(RTPWD,MACHINE_ID,INPUTDATA_ROOT,INPUTDATA_ROOT_WW3,INP
   <!ENTITY RUNDIR_ROOT    "{RUNDIR_ROOT}">
   <!ENTITY NEW_BASELINE   "{NEW_BASELINE}">
 ]>
-<workflow realtime="F" scheduler="{ROCOTO_SCHEDULER}" taskthrottle="10">
+<workflow realtime="F" scheduler="{ROCOTO_SCHEDULER}" taskthrottle="{TASKTHROTTLE}">
   <cycledef>197001010000 197001010000 01:00:00</cycledef>
-  <log>&LOG;/workflow.log</log>    
+  <log>&LOG;/{WORKFLOW_LOG}</log>    
 """
-    with open(ROCOTO_XML,"w") as f:
-        f.writelines(rocoto_entries)
-    f.close()
+    xml.append(rocoto_entries)
     
-def rocoto_create_compile_task(MACHINE_ID,COMPILE_ID,ROCOTO_COMPILE_MAXTRIES,MAKE_OPT,ACCNR,COMPILE_QUEUE,PARTITION,ROCOTO_XML):
-    """Generate and append compile task into Rocoto xml file
+def get_build_resources(MACHINE_ID, COMPILE_ID='', TPN=0):
+    """Cores and wall clock limit of a compile task
+
+    With a compile identifier and the cores per node, the cores follow the
+    builds compile_profile.py recorded in COMPILE_PROFILE_DIR. Without
+    COMPILE_PROFILE_DIR in the environment the default cores are used.
 
     Args:
         MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
-        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
-        ROCOTO_COMPILE_MAXTRIES (str): Max attempts for compile
-        MAKE_OPT (str): Make build options
-        ACCNR (str): Account to run the job with
-        COMPILE_QUEUE (str): QOS i.e. batch, windfall, normal, etc.
-        PARTITION (str): System partition i.e. xjet, c5
-        ROCOTO_XML (str): Rocoto .xml filename to write to
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel, empty for the default cores
+        TPN (int): cores per node of the machine, 0 when not known
+
+    Returns:
+        str, str: cores and walltime e.g. "8", "01:00:00"
     """
-    NATIVE=""
     BUILD_CORES="8"
     BUILD_WALLTIME="00:30:00"
     if ( MACHINE_ID == 'jet' ):  BUILD_WALLTIME="02:00:00"
@@ -64,6 +80,30 @@ def rocoto_create_compile_task(MACHINE_ID,COMPILE_ID,ROCOTO_COMPILE_MAXTRIES,MAK
     if ( MACHINE_ID == 'hercules'): BUILD_WALLTIME="01:00:00"
     if ( MACHINE_ID == 's4' ):   BUILD_WALLTIME="01:00:00"
     if ( MACHINE_ID == 'gaea' ): BUILD_WALLTIME="01:00:00"
+    COMPILE_PROFILE_DIR = os.getenv('COMPILE_PROFILE_DIR')
+    if ( COMPILE_ID and MACHINE_ID not in FIXED_BUILD_MACHINES and COMPILE_PROFILE_DIR ):
+        from compile_profile import read_history, get_build_cores
+        history = read_history(COMPILE_PROFILE_DIR, COMPILE_ID)
+        BUILD_CORES = str(get_build_cores(history, TPN, int(BUILD_CORES)))
+    return BUILD_CORES, BUILD_WALLTIME
+
+def rocoto_create_compile_task(MACHINE_ID,COMPILE_ID,ROCOTO_COMPILE_MAXTRIES,MAKE_OPT,ACCNR,COMPILE_QUEUE,PARTITION,
+                               BUILD_CORES,BUILD_WALLTIME,xml):
+    """Generate a compile task and append it to the Rocoto xml fragments
+
+    Args:
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        COMPILE_ID (str): Compile identifier e.g. s2swa_intel
+        ROCOTO_COMPILE_MAXTRIES (str): Max attempts for compile
+        MAKE_OPT (str): Make build options
+        ACCNR (str): Account to run the job with
+        COMPILE_QUEUE (str): QOS i.e. batch, windfall, normal, etc.
+        PARTITION (str): System partition i.e. xjet, c5
+        BUILD_CORES (str): cores of the compile from get_build_resources
+        BUILD_WALLTIME (str): wall clock limit of the compile from get_build_resources
+        xml (list): Rocoto xml fragments, appended to
+    """
+    NATIVE=""
     compile_task = f"""  <task name="compile_{COMPILE_ID}" maxtries="{ROCOTO_COMPILE_MAXTRIES}">
     <command>&PATHRT;/run_compile.sh &PATHRT; &RUNDIR_ROOT; "{MAKE_OPT}" {COMPILE_ID} 2>&amp;1 | tee &LOG;/compile_{COMPILE_ID}.log</\
 command>
@@ -85,34 +125,78 @@ command>
     {NATIVE}
   </task>
 """   
-    with open(ROCOTO_XML,"a") as f:
-        f.writelines(compile_task)
-    f.close()
+    xml.append(compile_task)
+
+def report_compile_aliases(compile_aliases, REGRESSIONTEST_LOG):
+    """Print compiles sharing an executable and the compile time saved
+
+    Args:
+        compile_aliases (dict): compile identifier mapped to the compile building it
+        REGRESSIONTEST_LOG (str): previous Regression Test log for compile times
+    """
+    if len(compile_aliases) == 0:
+        return
+    compile_times, test_times = get_logtimes(REGRESSIONTEST_LOG)
+    saved_time = 0
+    for alias, owner in compile_aliases.items():
+        print('compile_'+alias+' has the same build as compile_'+owner+', sharing its executable')
+        if alias in compile_times:
+            saved_time += compile_times[alias][0]
+        elif owner in compile_times:
+            saved_time += compile_times[owner][0]
+    print(f"Skipping {len(compile_aliases)} duplicate compiles, saving ~{saved_time/3600:.2f} compile-hours")
 
-def write_metatask_begin(COMPILE_METATASK_NAME, filename):
-    """Write compile task metadata to Rocoto xml file
+def write_metatask_begin(COMPILE_METATASK_NAME, xml):
+    """Write compile task metadata to Rocoto xml
 
     Args:
         COMPILE_METATASK_NAME (str): Compile job name e.g. s2swa_intel
-        filename (str): Rocoto xml filename to append to
+        xml (list): Rocoto xml fragments, appended to
     """
     metatask_name = f"""  <metatask name="compile_{COMPILE_METATASK_NAME}_tasks"><var name="zero">0</var>
 """
-    with open(filename,"a") as f:
-        f.writelines(metatask_name)
-    f.close()
+    xml.append(metatask_name)
 
-def write_metatask_end(filename):
+def write_metatask_end(xml):
     """Append closing metatask element to Rocoto xml
 
     Args:
-        filename (str): Rocoto xml filename
+        xml (list): Rocoto xml fragments, appended to
     """
     metatask_name = f"""  </metatask>
 """
-    with open(filename,"a") as f:
-        f.writelines(metatask_name)
-    f.close()    
+    xml.append(metatask_name)
+
+def write_workflow(ROCOTO_XML, xml):
+    """Write the Rocoto xml file at once
+
+    Args:
+        ROCOTO_XML (str): Rocoto .xml filename to write to
+        xml (list): Rocoto xml fragments
+    """
+    with open(ROCOTO_XML, "w") as f:
+        f.write(''.join(xml))
+        f.flush()
+        os.fsync(f.fileno())
+
+def set_run_task():
+    """Run set_run_task of ufs_test_utils.sh for the test set in the environment
+
+    rocoto_create_run_task of rt_utils.sh writes the run task to a pipe
+    given as ROCOTO_XML instead of appending it to the xml file.
+
+    Returns:
+        str: Rocoto xml of the run task, empty for tests run by a pack task
+    """
+    import subprocess
+    rfd, wfd = os.pipe()
+    env = dict(os.environ, ROCOTO_XML='/dev/fd/'+str(wfd))
+    rc_set_run_task = subprocess.Popen(['bash', '-c', '. ufs_test_utils.sh; set_run_task'], env=env, pass_fds=(wfd,))
+    os.close(wfd)
+    with os.fdopen(rfd) as ftask:
+        run_task = ftask.read()
+    rc_set_run_task.wait()
+    return run_task
     
 def write_compile_env(SCHEDULER,PARTITION,JOB_NR,COMPILE_QUEUE,RUNDIR_ROOT):
     """Generate compile task .env file
@@ -135,6 +219,8 @@ def write_compile_env(SCHEDULER,PARTITION,JOB_NR,COMPILE_QUEUE,RUNDIR_ROOT):
     ECFLOW     = os.getenv('ECFLOW')
     REGRESSIONTEST_LOG = PATHRT+'/logs/RegressionTests_'+MACHINE_ID+'.log'
     LOG_DIR    = PATHRT+'/logs/log_'+MACHINE_ID
+    COMPILE_PROFILE_DIR = os.getenv('COMPILE_PROFILE_DIR')
+    BUILD_JOBS = os.getenv('BUILD_JOBS', '')
     compile_envs = f"""export JOB_NR={JOB_NR}
 export COMPILE_ID={COMPILE_ID}
 export MACHINE_ID={MACHINE_ID}
@@ -149,6 +235,8 @@ export ROCOTO={ROCOTO}
 export ECFLOW={ECFLOW}
 export REGRESSIONTEST_LOG={REGRESSIONTEST_LOG}
 export LOG_DIR={LOG_DIR}
+export COMPILE_PROFILE_DIR={COMPILE_PROFILE_DIR}
+export BUILD_JOBS={BUILD_JOBS}
 """
     with open(filename,"w+") as f:
         f.writelines(compile_envs)
@@ -185,6 +273,7 @@ def write_runtest_env():
     delete_rundir = str(os.getenv('delete_rundir'))
     WLCLK         = str(os.getenv('WLCLK'))
     MACHINE_ID    = str(os.getenv('MACHINE_ID'))
+    STAGE_INPUTS  = str(os.getenv('STAGE_INPUTS'))
     runtest_envs = f"""
 export JOB_NR={JOB_NR}
 export TEST_ID={TEST_ID}
@@ -212,6 +301,7 @@ export DEP_RUN={DEP_RUN}
 export skip_check_results={skip_check_results}
 export delete_rundir={delete_rundir}
 export WLCLK={WLCLK}
+export STAGE_INPUTS={STAGE_INPUTS}
 export RTVERBOSE=false
 """
     if ( MACHINE_ID == 'jet' ):
@@ -248,6 +338,15 @@ def make_loghead(ACCNR,MACHINE_ID,RUNDIR_ROOT,RTPWD,REGRESSIONTEST_LOG):
     RTVERBOSE   = str(os.getenv('RTVERBOSE'))
     SRT_NAME    = str(os.getenv('SRT_NAME'))
     SRT_COMPILER= str(os.getenv('SRT_COMPILER'))
+    BUILD_CACHE = str(os.getenv('BUILD_CACHE'))
+    RESULT_CACHE= str(os.getenv('RESULT_CACHE', 'true'))
+    PRERENDER   = str(os.getenv('PRERENDER'))
+    STAGE_INPUTS= str(os.getenv('STAGE_INPUTS'))
+    PACK_TESTS  = str(os.getenv('PACK_TESTS'))
+    OPNREQ_TESTS= str(os.getenv('OPNREQ_TESTS', ''))
+    OPNREQ_TEST_CASES = str(os.getenv('OPNREQ_TEST_CASES') or 'all')
+    IMPACT_REF  = str(os.getenv('IMPACT_REF', ''))
+    RERUN_DIR   = str(os.getenv('RERUN_DIR', ''))
     
     rtlog_head=f"""====START OF {MACHINE_ID} REGRESSION TESTING LOG====
 
@@ -306,8 +405,37 @@ UFS_TEST.SH OPTIONS USED:
         write_logfile(filename, "a", output="* (-e) - USE ECFLOW"+"\n")
     if (RTVERBOSE == "true"):
         write_logfile(filename, "a", output="* (-v) - VERBOSE OUTPUT"+"\n")
+    if (BUILD_CACHE == "false"):
+        write_logfile(filename, "a", output="* (-x) - BUILD CACHE DISABLED"+"\n")
+    if (RESULT_CACHE == "false"):
+        write_logfile(filename, "a", output="* (-y) - RESULT CACHE DISABLED"+"\n")
+    if (PRERENDER == "false"):
+        write_logfile(filename, "a", output="* (-g) - PRE-RENDER DISABLED"+"\n")
+    if (STAGE_INPUTS == "true"):
+        write_logfile(filename, "a", output="* (-i) - LINK INPUT DATA FROM SHARED CACHE"+"\n")
+    if (PACK_TESTS == "true"):
+        write_logfile(filename, "a", output="* (-f) - PACK SMALL TESTS ONTO SHARED NODES"+"\n")
+    if (OPNREQ_TESTS != ""):
+        write_logfile(filename, "a", output="* (-q) - OPERATIONAL REQUIREMENT TESTS: "+OPNREQ_TESTS+" "+OPNREQ_TEST_CASES+"\n")
+    if (IMPACT_REF != ""):
+        write_logfile(filename, "a", output="* (-j) - TESTS IMPACTED BY CHANGES SINCE: "+IMPACT_REF+"\n")
+    if (RERUN_DIR != ""):
+        write_logfile(filename, "a", output="* (-u) - REUSE BUILDS OF EARLIER RUN: "+RERUN_DIR+"\n")
 
 def xml_loop():
+    #--- set_run_task imports this module once per test for write_runtest_env,
+    #--- the workflow setup dependencies are only loaded here ---
+    import subprocess
+    import yaml
+    from build_cache import get_source_hash, get_build_key, restore_build, restore_run_build, read_build_status, write_build_status
+    from rocoto_shards import split_workflow
+    from ufs_atparse import compile_templates
+    from prerender import PRERENDER_DIR, prerender_tests
+    from job_phases import PHASES_SUFFIX
+    from opnreq_cases import get_test_id, get_case_dep, get_case_settings, write_case_env
+    from node_packing import plan_compile_packs, rocoto_create_pack_task, get_machine_tpn
+    from result_cache import plan_cached_results, write_result_status
+
     ACCNR      = str(os.getenv('ACCNR'))
     PATHRT     = str(os.getenv('PATHRT'))
     MACHINE_ID = str(os.getenv('MACHINE_ID'))
@@ -377,7 +505,8 @@ def xml_loop():
             rrmdir(NEW_BASELINE)
             os.makedirs(NEW_BASELINE, exist_ok=True)
         
-    ROCOTO_TEST_MAXTRIES = "3"
+    #--- rocoto_driver.py tries a task again when it failed for a transient reason ---
+    ROCOTO_TEST_MAXTRIES = "1"
     RTVERBOSE = False
     os.environ["MACHINE_ID"]  = MACHINE_ID
     os.environ["ROCOTO_TEST_MAXTRIES"] = ROCOTO_TEST_MAXTRIES
@@ -392,14 +521,64 @@ def xml_loop():
     os.environ["RTPWD"]     = RTPWD
     os.environ["RTVERBOSE"] = str(RTVERBOSE)
 
+    BUILD_CACHE     = str(os.getenv('BUILD_CACHE'))
+    BUILD_CACHE_DIR = os.getenv('BUILD_CACHE_DIR', path+'/FV3_RT/build_cache')
+    RERUN_DIR       = os.getenv('RERUN_DIR', '')
+    PATHTR, tail    = os.path.split(PATHRT)
+    build_status    = {}
+    rerun_status    = read_build_status(RERUN_DIR) if RERUN_DIR else {}
+    #--- the build key of every compile is recorded, so a rerun with -u can verify the builds it reuses ---
+    try:
+        source_hash = get_source_hash(PATHTR)
+    except (OSError, subprocess.CalledProcessError):
+        print("Cannot hash model sources, build cache and builds of an earlier run are not used")
+        source_hash = None
+        BUILD_CACHE = 'false'
+    if (BUILD_CACHE == 'true'):
+        os.makedirs(BUILD_CACHE_DIR, exist_ok=True)
+        print('Using build cache in: ',BUILD_CACHE_DIR)
+    if RERUN_DIR:
+        print('Reusing builds of: ',RERUN_DIR)
+    #--- run_compile.sh records the profile of every build into this history ---
+    os.environ["COMPILE_PROFILE_DIR"] = os.getenv('COMPILE_PROFILE_DIR', path+'/FV3_RT/compile_profiles')
+    #--- the cores of each compile follow its recorded builds, the make -j of the build matches them ---
+    TPN = get_machine_tpn(PATHRT) if MACHINE_ID not in FIXED_BUILD_MACHINES else 0
+
+    #--- tests of a restored build whose passing result is cached are not run again ---
+    RESULT_CACHE     = str(os.getenv('RESULT_CACHE', 'true'))
+    RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', path+'/FV3_RT/result_cache')
+    if (CREATE_BASELINE == 'true' or RTPWD_NEW_BASELINE == 'true'): RESULT_CACHE = 'false'
+    result_status    = {}
+
+    PRERENDER = str(os.getenv('PRERENDER', 'true'))
+    PACK_TESTS = str(os.getenv('PACK_TESTS', 'false'))
+    prerender_list = []
+    #--- files left by an earlier run in the same RUNDIR_ROOT must not be picked up by the jobs ---
+    if os.path.isdir(RUNDIR_ROOT+'/'+PRERENDER_DIR):
+        rrmdir(RUNDIR_ROOT+'/'+PRERENDER_DIR)
+    for name in os.listdir(LOG_DIR):
+        if name.endswith(PHASES_SUFFIX):
+            os.remove(LOG_DIR+'/'+name)
+
     JOB_NR = 0
     ROCOTO = True
     ROCOTO_XML = os.getenv('ROCOTO_XML')
-    rocoto_create_entries(RTPWD,MACHINE_ID,INPUTDATA_ROOT,INPUTDATA_ROOT_WW3,INPUTDATA_ROOT_BMIC,RUNDIR_ROOT,NEW_BASELINE,ROCOTO_XML)
+    ROCOTO_SHARDS = int(os.getenv('ROCOTO_SHARDS', '1'))
     UFS_TEST_YAML = str(os.getenv('UFS_TEST_YAML'))
     with open(UFS_TEST_YAML, 'r') as f:
         rt_yaml = yaml.load(f, Loader=yaml.FullLoader)
-        for apps, jobs in rt_yaml.items():
+    REGRESSIONTEST_LOG = PATHRT+'/logs/RegressionTests_'+MACHINE_ID+'.log'
+    compile_aliases = get_compile_aliases(rt_yaml, MACHINE_ID)
+    report_compile_aliases(compile_aliases, REGRESSIONTEST_LOG)
+    workflows = split_workflow(rt_yaml, compile_aliases, ROCOTO_XML, ROCOTO_SHARDS, MACHINE_ID, REGRESSIONTEST_LOG)
+    #--- shards split the throttle, so sharding does not add jobs in the queue ---
+    TASKTHROTTLE = get_taskthrottle(len(workflows))
+    for ROCOTO_XML, shard_yaml, WORKFLOW_LOG in workflows:
+        #--- the workflow is written at once when complete ---
+        xml = []
+        rocoto_create_entries(RTPWD,MACHINE_ID,INPUTDATA_ROOT,INPUTDATA_ROOT_WW3,INPUTDATA_ROOT_BMIC,RUNDIR_ROOT,NEW_BASELINE,xml,
+                              WORKFLOW_LOG,TASKTHROTTLE)
+        for apps, jobs in shard_yaml.items():
             for key, val in jobs.items():
                 if (str(key) == 'build'):
                     machine_check = machine_check_off(MACHINE_ID, val)
@@ -408,27 +587,74 @@ def xml_loop():
                         RT_COMPILER = val['compiler']
                         COMPILE_ID  = apps
                         MAKE_OPT    = val['option']
-                        os.environ["COMPILE_ID"]  = str(COMPILE_ID)
+                        #--- tests of a duplicate compile use the executable of its first build ---
+                        BUILD_ID    = compile_aliases.get(COMPILE_ID, COMPILE_ID)
+                        os.environ["COMPILE_ID"]  = str(BUILD_ID)
                         os.environ["MAKE_OPT"]    = str(MAKE_OPT)
-                        ROCOTO_COMPILE_MAXTRIES = "3"
+                        ROCOTO_COMPILE_MAXTRIES = "1"
                         os.environ["RT_COMPILER"] = str(RT_COMPILER)
-                        write_compile_env(SCHEDULER,PARTITION,str(JOB_NR),COMPILE_QUEUE,RUNDIR_ROOT)
-                        rocoto_create_compile_task \
-                            (MACHINE_ID,COMPILE_ID,ROCOTO_COMPILE_MAXTRIES,MAKE_OPT,ACCNR,COMPILE_QUEUE,PARTITION,ROCOTO_XML)
+                        if not COMPILE_ID in compile_aliases:
+                            COMPILE_CACHED = False
+                            if source_hash is not None:
+                                build_key = get_build_key(source_hash, MACHINE_ID, RT_COMPILER, MAKE_OPT, PATHTR)
+                                build_status[COMPILE_ID] = {'key': build_key, 'cached': False}
+                                if (BUILD_CACHE == 'true'):
+                                    build_status[COMPILE_ID]['cache_dir'] = BUILD_CACHE_DIR
+                                if (RERUN_DIR and
+                                    restore_run_build(RERUN_DIR, rerun_status, build_key, COMPILE_ID, MACHINE_ID, PATHRT)):
+                                    COMPILE_CACHED = True
+                                    build_status[COMPILE_ID]['rerun_dir'] = RERUN_DIR
+                                    print('compile_'+COMPILE_ID+' built by the earlier run, skipping compile')
+                                elif (BUILD_CACHE == 'true'):
+                                    COMPILE_CACHED = restore_build(BUILD_CACHE_DIR, build_key, COMPILE_ID, MACHINE_ID, PATHRT)
+                                    if COMPILE_CACHED:
+                                        print('compile_'+COMPILE_ID+' found in build cache, skipping compile')
+                                build_status[COMPILE_ID]['cached'] = COMPILE_CACHED
+                            if not COMPILE_CACHED:
+                                BUILD_CORES, BUILD_WALLTIME = get_build_resources(MACHINE_ID, COMPILE_ID, TPN)
+                                os.environ["BUILD_JOBS"] = BUILD_CORES if MACHINE_ID not in FIXED_BUILD_MACHINES else ''
+                                write_compile_env(SCHEDULER,PARTITION,str(JOB_NR),COMPILE_QUEUE,RUNDIR_ROOT)
+                                rocoto_create_compile_task \
+                                    (MACHINE_ID,COMPILE_ID,ROCOTO_COMPILE_MAXTRIES,MAKE_OPT,ACCNR,COMPILE_QUEUE,PARTITION,
+                                     BUILD_CORES,BUILD_WALLTIME,xml)
+                        #--- tests of a cached build do not wait for a compile task ---
+                        COMPILE_CACHED = build_status.get(BUILD_ID, {}).get('cached', False)
+                        os.environ["COMPILE_CACHED"] = str(COMPILE_CACHED).lower()
                     else:
                         PASS_TESTS = True
                 if (str(key) == 'tests' and COMPILE_ONLY == 'false' and not PASS_TESTS):
                     JOB_NR+=1
                     if ( ROCOTO ):
-                        write_metatask_begin(COMPILE_ID, ROCOTO_XML)
-                        case_count=0
+                        metatask = []
+                        cached_tests = set()
+                        if (RESULT_CACHE == 'true' and COMPILE_CACHED):
+                            cached_tests = plan_cached_results(PATHRT, val, RT_COMPILER, MACHINE_ID, build_status[BUILD_ID]['key'],
+                                                               RTPWD, RESULT_CACHE_DIR, result_status)
+                            val = [test for test in val
+                                   if not get_test_id(get_testcase(test)[0], RT_COMPILER, get_testcase(test)[1]) in cached_tests]
+                            if cached_tests:
+                                print(COMPILE_ID+': '+str(len(cached_tests))+' tests passed with the same executable, '
+                                      'configuration, inputs and baselines, skipping them')
+                        packs = {}
+                        if (PACK_TESTS == 'true'):
+                            packs = plan_compile_packs(PATHRT, val, COMPILE_ID, RT_COMPILER, MACHINE_ID, SCHEDULER)
+                        packed_tests = set(TEST_ID for pack in packs.values() for TEST_NAME, TEST_ID, resources in pack)
                         for test in val:
                             case, config = get_testcase(test)
                             machine_check = machine_check_off(MACHINE_ID, config)
                             if machine_check:
                                 TEST_NAME = case
-                                TEST_ID   = TEST_NAME+'_'+RT_COMPILER
-                                if 'dependency' in config.keys():
+                                TEST_ID   = get_test_id(TEST_NAME, RT_COMPILER, config)
+                                OPNREQ_CASE = config.get('opnreq')
+                                if OPNREQ_CASE:
+                                    #--- operational requirement runs depend on the run creating their baseline ---
+                                    settings = get_case_settings(PATHRT, TEST_NAME, OPNREQ_CASE)
+                                    if settings is None:
+                                        continue
+                                    write_case_env(RUNDIR_ROOT, TEST_ID, OPNREQ_CASE, settings)
+                                    DEP_RUN = get_case_dep(TEST_NAME, RT_COMPILER, OPNREQ_CASE)
+                                    if (delete_rundir == "true"): dependency_list.append(TEST_NAME)
+                                elif 'dependency' in config.keys():
                                     DEP_RUN = str(config['dependency'])+'_'+RT_COMPILER
                                     if (delete_rundir == "true"): dependency_list.append(config['dependency'])
                                 else:
@@ -441,30 +667,36 @@ def xml_loop():
                                 os.environ["RT_SUFFIX"] = RT_SUFFIX
                                 os.environ["BL_SUFFIX"] = BL_SUFFIX
                                 os.environ["JOB_NR"]    = str(JOB_NR)
-                                if (CREATE_BASELINE == 'true'):
+                                #--- packed tests get their run environment, their pack task runs them ---
+                                os.environ["ROCOTO_PACKED"] = str(TEST_ID in packed_tests).lower()
+                                if (CREATE_BASELINE == 'true' and not OPNREQ_CASE):
                                     if (DEP_RUN == ""):
-                                        rc_set_run_task = subprocess.Popen(['bash', '-c', '. ufs_test_utils.sh; set_run_task'])
-                                        rc_set_run_task.wait()
-                                        case_count+=1
+                                        metatask.append(set_run_task())
+                                        prerender_list.append((TEST_NAME, TEST_ID, BUILD_ID))
                                 else:
-                                    rc_set_run_task = subprocess.Popen(['bash', '-c', '. ufs_test_utils.sh; set_run_task'])
-                                    rc_set_run_task.wait()
-                                    case_count+=1
-                        if int(case_count) > 0:
-                            write_metatask_end(ROCOTO_XML)
-                        else:
-                            lines = subprocess.check_output(['head', '-n', '-1', ROCOTO_XML])
-                            lines = lines.decode('utf-8')
-                            with open(ROCOTO_XML, 'w') as filetowrite:
-                                filetowrite.write(lines)
-                            filetowrite.close
-    rocoto_close=f"""</workflow>
+                                    metatask.append(set_run_task())
+                                    prerender_list.append((TEST_NAME, TEST_ID, BUILD_ID))
+                        for pack_name, pack in packs.items():
+                            rocoto_create_pack_task(pack_name, pack, BUILD_ID, COMPILE_CACHED, metatask)
+                            print(pack_name+' runs '+' '.join(TEST_ID for TEST_NAME, TEST_ID, resources in pack)+' on one node')
+                        #--- compiles without a test to run get no metatask ---
+                        if any(metatask):
+                            write_metatask_begin(COMPILE_ID, xml)
+                            xml.extend(metatask)
+                            write_metatask_end(xml)
+        rocoto_close=f"""</workflow>
 """
-    with open(ROCOTO_XML,"a") as f:
-        f.writelines(rocoto_close)
-    f.close()
+        xml.append(rocoto_close)
+        write_workflow(ROCOTO_XML, xml)
+
+    write_build_status(RUNDIR_ROOT, build_status)
+    write_result_status(RUNDIR_ROOT, result_status)
+    #--- run_test.sh only loads the substitution plans compiled here ---
+    print('Compiled',compile_templates(PATHRT, RUNDIR_ROOT),'atparse templates')
+    if (PRERENDER == 'true' and len(prerender_list) > 0):
+        print('Pre-rendered run directories of',prerender_tests(PATHRT, RUNDIR_ROOT, prerender_list),
+              'of',len(prerender_list),'tests')
 
-    REGRESSIONTEST_LOG = PATHRT+'/logs/RegressionTests_'+MACHINE_ID+'.log'
     make_loghead(ACCNR,MACHINE_ID,RUNDIR_ROOT,RTPWD,REGRESSIONTEST_LOG)
 
     if (delete_rundir == "true" and len(dependency_list) > 0):
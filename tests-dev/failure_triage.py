@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import yaml
+from nc_diff import NC_DIFF
+
+FAILURE_TRIAGE = 'failure_triage.yaml'
+EVIDENCE_LINES = 3
+#--- failure signatures: (class, route, job kinds, patterns) ---
+#--- route: retry for transient failures, baseline for changed results, fix for the rest ---
+#--- patterns start with a literal, which re finds fast in large out files ---
+SIGNATURES = [('walltime',         'fix',      ['compile', 'test'], [r'DUE TO TIME LIMIT', r'job killed: walltime']),
+              ('preempted',        'retry',    ['compile', 'test'], [r'DUE TO PREEMPTION', r'job preempted']),
+              ('node_failure',     'retry',    ['compile', 'test'], [r'DUE TO NODE FAIL', r'NODE_FAIL', r'Node failure', r'node failure']),
+              ('filesystem',       'retry',    ['compile', 'test'], [r'Stale file handle', r'Input/output error',
+                                                                     r'Transport endpoint is not connected']),
+              ('oom',              'fix',      ['compile', 'test'], [r'oom[-_]kill', r'Out Of Memory', r'OUT_OF_MEMORY',
+                                                                     r'insufficient virtual memory', r'Cannot allocate memory',
+                                                                     r'std::bad_alloc']),
+              ('compile_error',    'fix',      ['compile'],         [r'error #\d+', r'Error: ', r'CMake Error',
+                                                                     r'make(\[\d+\])?: \*\*\*']),
+              ('mpi_abort',        'fix',      ['test'],            [r'MPI_ABORT', r'MPI_Abort']),
+              ('crash',            'fix',      ['test'],            [r'forrtl: severe', r'SIGSEGV', r'Segmentation fault',
+                                                                     r'Floating point exception']),
+              ('missing_baseline', 'baseline', ['test'],            [r'MISSING baseline']),
+              ('missing_output',   'fix',      ['test'],            [r'MISSING file']),
+              ('not_identical',    'baseline', ['test'],            [r'NOT IDENTICAL'])]
+
+_matchers = {}
+
+def get_matcher(kind):
+    """Compiled patterns of the signatures of a job kind
+
+    Patterns are compiled once per process.
+
+    Args:
+        kind (str): compile or test
+
+    Returns:
+        list: (compiled pattern, SIGNATURES index)
+    """
+    if kind not in _matchers:
+        _matchers[kind] = [(re.compile(pattern), n) for n, (name, route, kinds, patterns) in enumerate(SIGNATURES)
+                           if kind in kinds for pattern in patterns]
+    return _matchers[kind]
+
+def first_match(matcher, text):
+    """Find the first line of a text matching a signature
+
+    A single alternation of all patterns is several times slower in re
+    than searching the patterns one by one. Once a match is found, the
+    other patterns only search the text before the end of its line. On
+    the same line the signature listed first wins.
+
+    Args:
+        matcher (list): patterns from get_matcher
+        text (str): file contents
+
+    Returns:
+        tuple: re.Match and SIGNATURES index; None, None without a match
+    """
+    first, first_n = None, None
+    endpos = len(text)
+    for pattern, n in matcher:
+        match = pattern.search(text, 0, endpos)
+        if match is None:
+            continue
+        if first is None or text.rfind('\n', 0, match.start()) < text.rfind('\n', 0, first.start()):
+            first, first_n = match, n
+            line_end = text.find('\n', match.end())
+            endpos = line_end if line_end >= 0 else len(text)
+    return first, first_n
+
+def get_job_files(LOG_DIR, RUNDIR_ROOT, JBNME):
+    """Files to scan for the cause of a failed job, root causes first
+
+    The Rocoto job output has the messages of the scheduler, err and out
+    of the run directory those of the executable, and the log of the
+    script the result check.
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        RUNDIR_ROOT (str): Test run directory
+        JBNME (str): job name e.g. compile_atm_intel, run_control_c48_intel
+
+    Returns:
+        list: filenames
+    """
+    if JBNME.startswith('compile_'):
+        return [RUNDIR_ROOT+'/'+JBNME+'.log', RUNDIR_ROOT+'/'+JBNME+'/err', RUNDIR_ROOT+'/'+JBNME+'/out',
+                LOG_DIR+'/'+JBNME+'.log']
+    TEST_ID = JBNME[len('run_'):]
+    return [RUNDIR_ROOT+'/'+TEST_ID+'.log', RUNDIR_ROOT+'/'+TEST_ID+'/err', RUNDIR_ROOT+'/'+TEST_ID+'/out',
+            LOG_DIR+'/rt_'+TEST_ID+'.log', LOG_DIR+'/'+JBNME+'.log']
+
+def classify_job(LOG_DIR, RUNDIR_ROOT, JBNME):
+    """Find the failure class of a job from its logs
+
+    The files are scanned in the order of get_job_files, and the first
+    line matching a signature decides.
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        RUNDIR_ROOT (str): Test run directory
+        JBNME (str): job name e.g. compile_atm_intel, run_control_c48_intel
+
+    Returns:
+        dict: class, route, the file with the match and its evidence lines
+    """
+    matcher = get_matcher('compile' if JBNME.startswith('compile_') else 'test')
+    for filename in get_job_files(LOG_DIR, RUNDIR_ROOT, JBNME):
+        if not os.path.isfile(filename):
+            continue
+        with open(filename, errors='replace') as fjob:
+            text = fjob.read()
+        match, n = first_match(matcher, text)
+        if match is None:
+            continue
+        name, route, kinds, patterns = SIGNATURES[n]
+        #--- the matching line and the lines before it ---
+        begin = match.start()
+        for count in range(EVIDENCE_LINES):
+            begin = text.rfind('\n', 0, begin)
+            if begin < 0:
+                break
+        line_end = text.find('\n', match.end())
+        lines = text[begin+1:line_end if line_end >= 0 else len(text)].splitlines()
+        evidence = [line.strip() for line in lines if line.strip()]
+        result = {'class': name, 'route': route, 'file': filename, 'evidence': evidence}
+        #--- the variables nc_diff.py found differing, to judge whether a baseline change is expected ---
+        nc_diff = RUNDIR_ROOT+'/'+JBNME[len('run_'):]+'/'+NC_DIFF
+        if name == 'not_identical' and os.path.isfile(nc_diff):
+            with open(nc_diff) as fdiff:
+                result['differences'] = yaml.load(fdiff, Loader=yaml.FullLoader)
+        return result
+    return {'class': 'unknown', 'route': 'fix', 'file': None, 'evidence': []}
+
+def write_triage(LOG_DIR, triage):
+    """Write the failure classes of the failed jobs of a run
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        triage (dict): job name mapped to its classify_job result
+    """
+    with open(LOG_DIR+'/'+FAILURE_TRIAGE, 'w') as ftriage:
+        yaml.dump(triage, ftriage, sort_keys=False)
+
+def main():
+    """Print the failure class of jobs
+
+    Usage: failure_triage.py LOG_DIR RUNDIR_ROOT JBNME...
+    """
+    LOG_DIR, RUNDIR_ROOT = sys.argv[1:3]
+    for JBNME in sys.argv[3:]:
+        result = classify_job(LOG_DIR, RUNDIR_ROOT, JBNME)
+        print(f"{JBNME}: {result['class']} ({result['route']})")
+        for line in result['evidence']:
+            print('    '+line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import sys
+import mmap
+
+#--- GRIB2 section 4 surface types used in the UFS post outputs ---
+SURFACE_TYPES = {1: 'surface', 2: 'cloud base', 3: 'cloud top', 4: '0C isotherm', 6: 'max wind',
+                 7: 'tropopause', 8: 'nominal top', 10: 'entire atmosphere', 100: 'isobaric Pa',
+                 101: 'mean sea level', 102: 'height above msl m', 103: 'height above ground m',
+                 104: 'sigma', 105: 'hybrid', 106: 'depth below land m', 107: 'isentropic K',
+                 108: 'pressure from ground Pa', 109: 'potential vorticity', 111: 'eta',
+                 200: 'entire atmosphere', 204: 'highest tropospheric freezing'}
+
+def is_grib(filename):
+    """Check whether a file starts with a GRIB message
+
+    Args:
+        filename (str): file
+
+    Returns:
+        bool: True for a GRIB file
+    """
+    with open(filename, 'rb') as fgrib:
+        return fgrib.read(4) == b'GRIB'
+
+def index_messages(data):
+    """Offsets and lengths of the GRIB messages of a file
+
+    The total length in section 0 gives the start of the next message,
+    so only the 16 byte headers are read.
+
+    Args:
+        data (mmap.mmap): file contents, bytes for an empty file
+
+    Returns:
+        list: (offset, length) of each message
+    """
+    messages = []
+    offset = data.find(b'GRIB')
+    while 0 <= offset and offset+16 <= len(data):
+        edition = data[offset+7]
+        if edition == 2:
+            length = int.from_bytes(data[offset+8:offset+16], 'big')
+        else:
+            length = int.from_bytes(data[offset+4:offset+7], 'big')
+        if length < 16 or offset+length > len(data):
+            break
+        messages.append((offset, length))
+        offset = data.find(b'GRIB', offset+length)
+    return messages
+
+def describe_message(data, offset, length):
+    """Discipline, category, parameter, level and forecast time of a GRIB2 message
+
+    Args:
+        data (mmap.mmap): file contents
+        offset (int): start of the message
+        length (int): length of the message
+
+    Returns:
+        dict: record description, only the edition for GRIB1 messages
+    """
+    record = {'edition': data[offset+7]}
+    if record['edition'] != 2:
+        return record
+    record['discipline'] = data[offset+6]
+    section = offset+16
+    end = offset+length-4
+    while section+5 <= end:
+        section_length = int.from_bytes(data[section:section+4], 'big')
+        if section_length < 5:
+            break
+        if data[section+4] == 4 and section_length >= 34:
+            #--- octets of product definition templates 4.0 to 4.15 ---
+            record['category']  = data[section+9]
+            record['parameter'] = data[section+10]
+            record['forecast_time'] = int.from_bytes(data[section+18:section+22], 'big')
+            surface = data[section+22]
+            scale = data[section+23]
+            value = int.from_bytes(data[section+24:section+28], 'big')
+            if scale != 0xff and value != 0xffffffff:
+                #--- GRIB2 signed integers are sign and magnitude ---
+                scale = -(scale & 0x7f) if scale & 0x80 else scale
+                value = -(value & 0x7fffffff) if value & 0x80000000 else value
+                record['level'] = f"{SURFACE_TYPES.get(surface, 'type '+str(surface))} {value/10**scale:g}"
+            else:
+                record['level'] = SURFACE_TYPES.get(surface, 'type '+str(surface))
+            break
+        section += section_length
+    return record
+
+def compare_grib(baseline, output, first_only=False):
+    """Compare two GRIB files message by message
+
+    Both files are memory mapped, so only the headers and the messages
+    compared are read.
+
+    Args:
+        baseline (str): baseline GRIB file
+        output (str): GRIB file of the run
+        first_only (bool): stop at the first differing message
+
+    Returns:
+        dict: number of messages of both files and the differing records
+    """
+    with open(baseline, 'rb') as fbase, open(output, 'rb') as frun:
+        #--- an empty file cannot be mapped ---
+        dbase, drun = [mmap.mmap(fgrib.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(fgrib.fileno()).st_size
+                       else b'' for fgrib in [fbase, frun]]
+        try:
+            base_messages, run_messages = index_messages(dbase), index_messages(drun)
+            records = []
+            for n, ((base_offset, base_length), (run_offset, run_length)) in enumerate(zip(base_messages, run_messages)):
+                if (base_length == run_length and
+                    dbase[base_offset:base_offset+base_length] == drun[run_offset:run_offset+run_length]):
+                    continue
+                records.append(dict(message=n+1, **describe_message(dbase, base_offset, base_length)))
+                if first_only:
+                    break
+        finally:
+            for data in [dbase, drun]:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+    return {'messages': [len(base_messages), len(run_messages)], 'records': records}
+
+def grib_identical(baseline, output):
+    """Check whether two GRIB files have identical messages
+
+    Args:
+        baseline (str): baseline GRIB file
+        output (str): GRIB file of the run
+
+    Returns:
+        bool: True when identical
+    """
+    result = compare_grib(baseline, output, first_only=True)
+    return result['messages'][0] == result['messages'][1] and not result['records']
+
+def format_records(name, result):
+    """Summary lines of the differing records of a GRIB file
+
+    Args:
+        name (str): GRIB file
+        result (dict): from compare_grib
+
+    Returns:
+        list: lines
+    """
+    base_count, run_count = result['messages']
+    lines = [f"{name}: {len(result['records'])} of {base_count} messages differ"+
+             (f", {run_count} messages in run" if run_count != base_count else '')]
+    for record in result['records']:
+        if record['edition'] != 2:
+            lines.append(f"  message {record['message']:4}  GRIB{record['edition']}")
+            continue
+        lines.append(f"  message {record['message']:4}  discipline {record['discipline']} "
+                     f"category {record.get('category', '-')} parameter {record.get('parameter', '-'):>3}  "
+                     f"{record.get('level', '-')}  fhr {record.get('forecast_time', '-')}")
+    return lines
+
+def main():
+    """Report the differing records of GRIB files
+
+    Usage: grib_diff.py BASELINE_DIR FILE...
+
+    The run directory is the current directory.
+    """
+    BASELINE_DIR, names = sys.argv[1], sys.argv[2:]
+    for name in names:
+        print('\n'.join(format_records(name, compare_grib(BASELINE_DIR+'/'+name, name))))
+
+if __name__ == "__main__":
+    main()
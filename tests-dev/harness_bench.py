@@ -0,0 +1,339 @@
+import os
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import statistics
+from datetime import datetime
+import yaml
+
+BENCH_SIZES       = [100, 1000, 5000]
+BENCH_ROUNDS      = 3
+#--- benchmarks starting a process per test are not run on the larger fixtures ---
+BENCH_MAX_TESTS   = {'xml_loop': 1000}
+#--- kept outside the checkout, so it is never committed with the logs ---
+BENCH_HISTORY     = '~/.ufs_harness_bench.yaml'
+TESTS_PER_COMPILE = 20
+MACHINE_ID        = 'hera'
+#--- a benchmark is reported as a regression when it is that much slower than the last run ---
+REGRESSION_RATIO  = 1.5
+
+class BenchJob:
+    """Job object of tests/auto with the attributes process_logfile uses"""
+    def __init__(self):
+        self.machine = MACHINE_ID
+        self.compiler = 'intel'
+        self.preq_dict = {'action': 'RT'}
+        self.comment_text = ''
+
+    def comment_text_append(self, text):
+        self.comment_text += text+'\n'
+
+    def job_failed(self, logger, job_name):
+        raise RuntimeError(job_name+' failed')
+
+def write_rt_conf(filename, ntests):
+    """Write an rt.conf with compiles of TESTS_PER_COMPILE tests each
+
+    Every fifth test is a restart depending on the test before it.
+
+    Args:
+        filename (str): rt.conf filename
+        ntests (int): number of tests
+    """
+    with open(filename, 'w') as fconf:
+        for n in range(ntests):
+            if n % TESTS_PER_COMPILE == 0:
+                fconf.write(f"COMPILE | bench{n//TESTS_PER_COMPILE} | intel | -DAPP=ATM -DCCPP_SUITES=FV3_GFS_v17_p8 | - wcoss2 | fv3 |\n")
+            if n % 5 == 4:
+                fconf.write(f"RUN | bench_restart_{n} | - noaacloud | | bench_control_{n-1}\n")
+            else:
+                fconf.write(f"RUN | bench_control_{n} | - noaacloud | baseline |\n")
+
+def write_run_logs(PATHRT, rt_yaml, RUNDIR_ROOT):
+    """Write the compile and test logs finish_log reads after a passing run
+
+    Args:
+        PATHRT (str): Test directory of the fixture
+        rt_yaml (dict): test yaml configuration
+        RUNDIR_ROOT (str): run directory of the fixture
+    """
+    LOG_DIR = PATHRT+'/logs/log_'+MACHINE_ID
+    os.makedirs(LOG_DIR, exist_ok=True)
+    for apps, jobs in rt_yaml.items():
+        os.makedirs(RUNDIR_ROOT+'/compile_'+apps, exist_ok=True)
+        with open(RUNDIR_ROOT+'/compile_'+apps+'/err', 'w') as ferr:
+            ferr.write("module_physics.F90(10): warning #6843: unused\n"*50)
+            ferr.write("module_physics.F90(20): remark #7712: unused\n"*200)
+        with open(LOG_DIR+'/compile_'+apps+'.log', 'w') as flog:
+            flog.write("+ export RUNDIR_ROOT="+RUNDIR_ROOT+"\n"+"[ 50%] Building Fortran object\n"*500)
+            flog.write("[100%] Linking Fortran executable ufs_model\n")
+        with open(LOG_DIR+'/compile_'+apps+'_timestamp.txt', 'w') as ftime:
+            ftime.write("compile, 1700000000, 1700000010, 1700000800, 1700000810\n")
+        for test in jobs['tests']:
+            TEST_ID = list(test)[0]+'_intel'
+            with open(LOG_DIR+'/rt_'+TEST_ID+'.log', 'w') as flog:
+                flog.write(f"\nbaseline dir = /baselines/{TEST_ID}\nworking dir  = {RUNDIR_ROOT}/{TEST_ID}\n")
+                flog.write("Checking test "+TEST_ID+" results ....\n"+" Comparing sfcf000.nc .....USING NCCMP......OK\n"*40)
+                flog.write(" The maximum resident set size (KB) = 1234567\n\nTest "+TEST_ID+" PASS\n")
+            with open(LOG_DIR+'/run_'+TEST_ID+'_timestamp.txt', 'w') as ftime:
+                ftime.write("run, 1700001000, 1700001020, 1700001400, 1700001420, 4\n")
+
+def write_rt_log(filename, rt_yaml):
+    """Write a RegressionTests log as finish_log does, with a failed test every hundred
+
+    Args:
+        filename (str): RegressionTests log filename
+        rt_yaml (dict): test yaml configuration
+    """
+    with open(filename, 'w') as flog:
+        flog.write(f"====START OF {MACHINE_ID} REGRESSION TESTING LOG====\n\n")
+        flog.write("working dir  = /scratch/FV3_RT/rt_1234/control_intel\n")
+        n = 0
+        for apps, jobs in rt_yaml.items():
+            flog.write(f"PASS -- COMPILE {apps} [13:20, 13:00](50 warnings,200 remarks)\n")
+            for test in jobs['tests']:
+                n += 1
+                TEST_ID = list(test)[0]+'_intel'
+                if n % 100 == 0:
+                    flog.write(f"FAIL -- TEST {TEST_ID}\nTest {TEST_ID} failed in run_test failed\n")
+                else:
+                    flog.write(f"PASS -- TEST {TEST_ID} [06:40, 06:20] (1234567 MB)\n")
+        flog.write("\nResult: SUCCESSFUL\n")
+
+def make_fixture(ntests):
+    """Create a synthetic test directory with ntests tests
+
+    Args:
+        ntests (int): number of tests
+
+    Returns:
+        str: fixture directory, used as PATHRT and working directory
+    """
+    from ufs_test_utils import create_yaml
+    PATHRT = tempfile.mkdtemp(prefix=f"harness_bench_{ntests}_")
+    RUNDIR_ROOT = PATHRT+'/FV3_RT/rt_bench'
+    os.makedirs(RUNDIR_ROOT)
+    os.symlink(RUNDIR_ROOT, PATHRT+'/run_dir')
+    write_rt_conf(PATHRT+'/rt.conf', ntests)
+    cwd = os.getcwd()
+    os.chdir(PATHRT)
+    try:
+        create_yaml()
+    finally:
+        os.chdir(cwd)
+    with open(PATHRT+'/ufs_test.yaml') as f:
+        rt_yaml = yaml.load(f, Loader=yaml.FullLoader)
+    write_run_logs(PATHRT, rt_yaml, RUNDIR_ROOT)
+    write_rt_log(PATHRT+'/RegressionTests_bench.log', rt_yaml)
+    os.environ.update({'PATHRT': PATHRT, 'MACHINE_ID': MACHINE_ID, 'UFS_TEST_YAML': 'ufs_test.yaml',
+                       'RUNDIR_ROOT': RUNDIR_ROOT, 'KEEP_RUNDIR': 'true', 'ROCOTO': 'false',
+                       'CREATE_BASELINE': 'false', 'COMPILE_ONLY': 'false', 'BUILD_CACHE': 'false',
+                       'TEST_START_TIME': '20240101 00:00:00', 'TEST_END_TIME': '20240101 04:00:00',
+                       'ROCOTO_SCHEDULER': 'slurm'})
+    return PATHRT
+
+def bench_update_testyaml(PATHRT):
+    """Select a tenth of the tests as -b <file> does"""
+    from ufs_test_utils import update_testyaml
+    with open('ufs_test.yaml') as f:
+        rt_yaml = yaml.load(f, Loader=yaml.FullLoader)
+    tests = [list(test)[0] for jobs in rt_yaml.values() for test in jobs['tests']]
+    #--- update_testyaml removes the tests it found from its input list ---
+    return lambda: update_testyaml([name+' intel' for name in tests[::10]])
+
+def bench_create_yaml(PATHRT):
+    """Convert rt.conf into ufs_test.yaml"""
+    from ufs_test_utils import create_yaml
+    return create_yaml
+
+#--- rt_utils.sh functions set_run_task calls, without the test configuration they read ---
+RT_UTILS_STUB = """compute_petbounds_and_tasks() {
+  TASKS=${TASKS:-150}
+}
+rocoto_create_run_task() {
+  cat << EOF >> "${ROCOTO_XML}"
+    <task name="${TEST_ID}" maxtries="${ROCOTO_TEST_MAXTRIES:-3}">
+      <dependency> <taskdep task="compile_${COMPILE_ID}"/> </dependency>
+      <command>&PATHRT;/run_test.sh &PATHRT; &RUNDIR_ROOT; ${TEST_NAME} ${TEST_ID} ${COMPILE_ID}</command>
+      <nodes>${NODES}:ppn=${TPN}</nodes>
+      <walltime>00:${WLCLK}:00</walltime>
+    </task>
+EOF
+}
+"""
+
+def write_xml_fixture(PATHRT, rt_yaml):
+    """Write the files xml_loop and set_run_task read into the fixture
+
+    Args:
+        PATHRT (str): Test directory of the fixture
+        rt_yaml (dict): test yaml configuration
+
+    Returns:
+        dict: environment of ufs_test.sh when it calls xml_loop
+    """
+    PATHTR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(PATHRT+'/bl_date.conf', 'w') as fdate:
+        fdate.write("export BL_DATE=20240101\n")
+    os.makedirs(PATHRT+'/disk/NEMSfv3gfs/develop-20240101', exist_ok=True)
+    base = {'QUEUE': 'batch', 'COMPILE_QUEUE': 'batch', 'PARTITION': None, 'dprefix': PATHRT,
+            'DISKNM': PATHRT+'/disk', 'STMP': PATHRT+'/stmp', 'PTMP': PATHRT+'/ptmp',
+            'RUNDIR_ROOT': os.environ['RUNDIR_ROOT'], 'SCHEDULER': 'slurm', 'INPUTDATA_ROOT': '/input',
+            'INPUTDATA_ROOT_WW3': '/input_ww3', 'INPUTDATA_ROOT_BMIC': '/input_bmic'}
+    with open(PATHRT+'/baseline_setup.yaml', 'w') as fsetup:
+        yaml.dump({MACHINE_ID: base}, fsetup)
+    for name, src in [('ufs_test_utils.sh', PATHTR+'/tests-dev/ufs_test_utils.sh'),
+                      ('default_vars.sh', PATHTR+'/tests/default_vars.sh')]:
+        if not os.path.lexists(PATHRT+'/'+name):
+            os.symlink(src, PATHRT+'/'+name)
+    with open(PATHRT+'/rt_utils.sh', 'w') as futils:
+        futils.write(RT_UTILS_STUB)
+    os.makedirs(PATHRT+'/tests', exist_ok=True)
+    for jobs in rt_yaml.values():
+        for test in jobs['tests']:
+            with open(PATHRT+'/tests/'+list(test)[0], 'w') as ftest:
+                ftest.write("export TEST_DESCR='harness benchmark'\nexport CNTL_DIR=control_c48\nexport WLCLK=30\n")
+    return {'ACCNR': 'acct', 'USER': 'bench', 'ROCOTO': 'true', 'ECFLOW': 'false',
+            'ROCOTO_XML': PATHRT+'/rocoto_workflow.xml', 'RTPWD_NEW_BASELINE': 'false',
+            'delete_rundir': 'false', 'skip_check_results': 'false', 'RTVERBOSE': 'false',
+            'TESTS_FILE': 'ufs_test.yaml', 'NEW_BASELINES_FILE': '', 'RUN_SINGLE_TEST': 'false',
+            'PRERENDER': 'false', 'PYTHONPATH': PATHTR+'/tests-dev'}
+
+def bench_xml_loop(PATHRT):
+    """Write the Rocoto workflow with xml_loop, set_run_task of every test included
+
+    Pre-rendering is off, it renders the templates of the real tests.
+    """
+    from create_xml import xml_loop
+    with open('ufs_test.yaml') as f:
+        rt_yaml = yaml.load(f, Loader=yaml.FullLoader)
+    env = write_xml_fixture(PATHRT, rt_yaml)
+    def loop():
+        environ = dict(os.environ)
+        os.environ.update(env)
+        #--- ufs_test.sh sends the output of xml_loop and set_run_task to its log ---
+        sys.stdout.flush()
+        saved = os.dup(1), os.dup(2)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        try:
+            xml_loop()
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for fd in saved+(devnull,):
+                os.close(fd)
+            os.environ.clear()
+            os.environ.update(environ)
+    return loop
+
+def bench_finish_log(PATHRT):
+    """Collect the results of a passing run into the RegressionTests log"""
+    from create_log import finish_log
+    return finish_log
+
+def bench_process_logfile(PATHRT):
+    """Scan a RegressionTests log for failed tests as tests/auto does"""
+    PATHTR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if PATHTR+'/tests/auto' not in sys.path:
+        sys.path.append(PATHTR+'/tests/auto')
+    from jobs.rt import process_logfile
+    return lambda: process_logfile(BenchJob(), PATHRT+'/RegressionTests_bench.log')
+
+BENCHMARKS = {'update_testyaml': bench_update_testyaml,
+              'create_yaml':     bench_create_yaml,
+              'xml_loop':        bench_xml_loop,
+              'finish_log':      bench_finish_log,
+              'process_logfile': bench_process_logfile}
+
+def run_benchmarks(sizes, rounds=BENCH_ROUNDS):
+    """Time the harness functions on fixtures of each size
+
+    Args:
+        sizes (list): numbers of tests in the fixtures
+        rounds (int): timed calls of each benchmark
+
+    Returns:
+        dict: benchmark name and size mapped to min and median times in seconds
+    """
+    results = {}
+    cwd = os.getcwd()
+    for ntests in sizes:
+        PATHRT = make_fixture(ntests)
+        os.chdir(PATHRT)
+        try:
+            for name, setup in BENCHMARKS.items():
+                if ntests > BENCH_MAX_TESTS.get(name, ntests):
+                    continue
+                bench = setup(PATHRT)
+                times = []
+                for n in range(rounds):
+                    start = time.perf_counter()
+                    bench()
+                    times.append(time.perf_counter()-start)
+                results[f"{name}[{ntests}]"] = {'min': min(times), 'median': statistics.median(times)}
+                print(f"{name+'['+str(ntests)+']':24} min {min(times)*1000:10.1f} ms  median {statistics.median(times)*1000:10.1f} ms")
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(PATHRT)
+    return results
+
+def compare_history(results, history):
+    """Find benchmarks slower than in the last run on this host
+
+    Args:
+        results (dict): times from run_benchmarks
+        history (list): earlier records of the history file
+
+    Returns:
+        list: names of the benchmarks that regressed
+    """
+    host = socket.gethostname()
+    previous = [record for record in history if record['host'] == host]
+    if not previous:
+        return []
+    last = previous[-1]['results']
+    regressed = []
+    for name, times in results.items():
+        if name in last and times['min'] > REGRESSION_RATIO*last[name]['min']:
+            print(f"{name} regressed: {last[name]['min']*1000:.1f} ms -> {times['min']*1000:.1f} ms")
+            regressed.append(name)
+    return regressed
+
+def main():
+    """Benchmark the tests-dev and tests/auto harness functions
+
+    Usage: harness_bench.py [NTESTS...]
+
+    Results are appended to BENCH_HISTORY, ~/.ufs_harness_bench.yaml unless
+    set in the environment. Exits with 1 when a
+    benchmark is REGRESSION_RATIO slower than in the last run on this host.
+    """
+    PATHRT = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, PATHRT)
+    sizes = [int(size) for size in sys.argv[1:]] or BENCH_SIZES
+    environ = dict(os.environ)
+    try:
+        results = run_benchmarks(sizes)
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    history_file = os.path.expanduser(os.getenv('BENCH_HISTORY', BENCH_HISTORY))
+    history = []
+    if os.path.isfile(history_file):
+        with open(history_file) as fhistory:
+            history = yaml.load(fhistory, Loader=yaml.FullLoader) or []
+    regressed = compare_history(results, history)
+    history.append({'date': datetime.now().strftime('%Y%m%d %H:%M:%S'), 'host': socket.gethostname(),
+                    'python': sys.version.split()[0], 'results': results})
+    with open(history_file, 'w') as fhistory:
+        yaml.dump(history, fhistory)
+    if regressed:
+        sys.exit(f"*** Harness benchmarks regressed: {', '.join(regressed)} ***")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import subprocess
+import statistics
+
+#--- entry point module: (import time budget in ms, how often it is started) ---
+IMPORT_BUDGETS = {'create_xml':     (40, 'set_run_task, once per test'),
+                  'ufs_atparse':    (40, 'atparse, once per template of a test'),
+                  'stage_inputs':   (40, 'stage_inputs.sh, once per test'),
+                  'opnreq_compare': (80, 'run_test.sh, once per operational requirement run'),
+                  'rocoto_driver':  (60, 'ufs_test.sh, once per workflow'),
+                  'create_log':     (150, 'ufs_test.sh, once per workflow')}
+REPEATS = 5
+
+def import_time(module, PATHRT):
+    """Import time of a module in a new interpreter, from python -X importtime
+
+    Args:
+        module (str): module name e.g. create_xml
+        PATHRT (str): Test directory
+
+    Returns:
+        tuple: cumulative import time of the module in ms, and the three
+               slowest modules it pulled in as (name, ms)
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import '+module], cwd=PATHRT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True).stderr
+    #--- lines are written after each import completes, nested imports are indented more ---
+    entries = []
+    for line in output.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        entries.append((name.strip(), len(name)-len(name.lstrip()), int(fields[1])/1000))
+    for n in range(len(entries)-1, -1, -1):
+        if entries[n][0] == module:
+            break
+    else:
+        return 0.0, []
+    nested = []
+    for name, indent, ms in reversed(entries[:n]):
+        if indent <= entries[n][1]:
+            break
+        nested.append((name, ms))
+    return entries[n][2], sorted(nested, key=lambda item: -item[1])[:3]
+
+def check_budgets(PATHRT, repeats=REPEATS):
+    """Measure the import time of the tests-dev entry points against their budget
+
+    The median of several interpreters is used, the first import also
+    writes the byte code caches.
+
+    Args:
+        PATHRT (str): Test directory
+        repeats (int): interpreters started per module
+
+    Returns:
+        list: modules over budget
+    """
+    over_budget = []
+    print(f"{'MODULE':16} {'MEDIAN ms':>9} {'BUDGET ms':>9}  SLOWEST IMPORTS")
+    for module, (budget, started) in IMPORT_BUDGETS.items():
+        import_time(module, PATHRT)
+        runs = [import_time(module, PATHRT) for n in range(repeats)]
+        median = statistics.median(ms for ms, nested in runs)
+        slowest = ', '.join(f"{name} {ms:.1f}" for name, ms in runs[-1][1])
+        status = '' if median <= budget else '  OVER BUDGET'
+        print(f"{module:16} {median:>9.1f} {budget:>9}  {slowest}{status}")
+        print(f"{'':16} started by {started}")
+        if median > budget:
+            over_budget.append(module)
+    return over_budget
+
+def main():
+    """Check the import time budget of the tests-dev entry points
+
+    Usage: import_budget.py [REPEATS]
+
+    Exits with 1 when a module is over budget.
+    """
+    PATHRT = os.path.dirname(os.path.abspath(__file__))
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else REPEATS
+    over_budget = check_budgets(PATHRT, repeats)
+    if over_budget:
+        sys.exit(f"*** Import time over budget: {', '.join(over_budget)} ***")
+
+if __name__ == "__main__":
+    main()
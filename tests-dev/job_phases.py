@@ -0,0 +1,142 @@
+import os
+import sys
+
+#--- job events in order, recorded in the _timestamp.txt and _phases.txt files of a job ---
+PHASES = ['submit', 'start', 'run_begin', 'run_end', 'check_end', 'finish']
+#--- time between two events: (name, from event, to event) ---
+PHASE_SPANS = [('queue',   'submit',    'start'),
+               ('prep',    'start',     'run_begin'),
+               ('run',     'run_begin', 'run_end'),
+               ('check',   'run_end',   'check_end'),
+               ('cleanup', 'check_end', 'finish')]
+PHASES_SUFFIX = '_phases.txt'
+PHASE_REPORT  = 'job_phases.txt'
+
+def record_phase(LOG_DIR, JBNME, phase, when):
+    """Append the time of a job event to the phases file of the job
+
+    rocoto_driver.py writes submit when Rocoto submitted the task and
+    starts the file of a new try, run_test.sh writes check_end.
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        JBNME (str): job name e.g. compile_atm_intel, run_control_c48_intel
+        phase (str): one of PHASES
+        when (float): seconds since epoch
+    """
+    with open(LOG_DIR+'/'+JBNME+PHASES_SUFFIX, 'w' if phase == PHASES[0] else 'a') as fphase:
+        fphase.write(f"{phase} {int(when)}\n")
+
+def read_job_phases(LOG_DIR, JBNME):
+    """Times of the events of a job
+
+    The _timestamp.txt file written by run_compile.sh and run_test.sh has
+    the script start, job card start, job card end and script end. The
+    script is the Rocoto task, so its start is the start of the job. The
+    last try of a job counts.
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        JBNME (str): job name e.g. compile_atm_intel, run_control_c48_intel
+
+    Returns:
+        dict: event mapped to seconds since epoch, events not recorded are left out;
+              None when the job has no complete timestamp file
+    """
+    try:
+        with open(LOG_DIR+'/'+JBNME+'_timestamp.txt') as ftime:
+            fields = ftime.read().split('\n', 1)[0].split(',')
+        script_start, run_begin, run_end, finish = (int(field) for field in fields[1:5])
+    except (OSError, ValueError):
+        return None
+    phases = {'start': script_start, 'run_begin': run_begin, 'run_end': run_end, 'finish': finish}
+    recorded = {}
+    if os.path.isfile(LOG_DIR+'/'+JBNME+PHASES_SUFFIX):
+        with open(LOG_DIR+'/'+JBNME+PHASES_SUFFIX) as fphase:
+            for line in fphase:
+                fields = line.split()
+                if len(fields) == 2 and fields[0] in PHASES and fields[1].isdigit():
+                    recorded[fields[0]] = int(fields[1])
+    #--- times of an earlier try are dropped ---
+    if recorded.get('submit', script_start+1) <= script_start:
+        phases['submit'] = recorded['submit']
+    if run_end <= recorded.get('check_end', 0) <= finish:
+        phases['check_end'] = recorded['check_end']
+    return phases
+
+def phase_durations(phases):
+    """Length of the phases of a job
+
+    Args:
+        phases (dict): events from read_job_phases
+
+    Returns:
+        dict: span name of PHASE_SPANS mapped to seconds, None when not recorded
+    """
+    #--- a job without a result check, like a compile, checks in no time ---
+    phases = dict(phases)
+    phases.setdefault('check_end', phases['run_end'])
+    durations = {}
+    for name, begin, end in PHASE_SPANS:
+        if begin in phases and end in phases:
+            durations[name] = phases[end]-phases[begin]
+        else:
+            durations[name] = None
+    return durations
+
+def format_span(seconds):
+    """Format seconds as minutes and seconds
+
+    Args:
+        seconds (int): time in seconds, None when not recorded
+
+    Returns:
+        str: e.g. 05:07, - when not recorded
+    """
+    if seconds is None:
+        return '-'
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes:02}:{seconds:02}"
+
+def write_phase_report(LOG_DIR, jobs, filename=None):
+    """Write the phase breakdown of jobs and sum it over the suite
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        jobs (list): job names e.g. compile_atm_intel, run_control_c48_intel
+        filename (str): report filename. Defaults to PHASE_REPORT in LOG_DIR.
+
+    Returns:
+        dict: span name of PHASE_SPANS mapped to the sum over the jobs in seconds,
+              and jobs to the number of jobs with a timestamp file
+    """
+    filename = filename or LOG_DIR+'/'+PHASE_REPORT
+    totals = {name: 0 for name, begin, end in PHASE_SPANS}
+    totals['jobs'] = 0
+    lines = [f"{'JOB':56}"+''.join(f" {name.upper():>8}" for name, begin, end in PHASE_SPANS)]
+    for JBNME in jobs:
+        phases = read_job_phases(LOG_DIR, JBNME)
+        if phases is None:
+            continue
+        totals['jobs'] += 1
+        durations = phase_durations(phases)
+        for name, seconds in durations.items():
+            totals[name] += seconds or 0
+        lines.append(f"{JBNME:56}"+''.join(f" {format_span(durations[name]):>8}"
+                                            for name, begin, end in PHASE_SPANS))
+    lines.append(f"{'TOTAL':56}"+''.join(f" {format_span(totals[name]):>8}" for name, begin, end in PHASE_SPANS))
+    with open(filename, 'w') as freport:
+        freport.write('\n'.join(lines)+'\n')
+    return totals
+
+def main():
+    """Print the phase breakdown of the jobs in a log directory
+
+    Usage: job_phases.py LOG_DIR
+    """
+    LOG_DIR = sys.argv[1]
+    jobs = sorted(name[:-len('_timestamp.txt')] for name in os.listdir(LOG_DIR) if name.endswith('_timestamp.txt'))
+    write_phase_report(LOG_DIR, jobs, '/dev/stdout')
+
+if __name__ == "__main__":
+    main()
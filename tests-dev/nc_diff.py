@@ -0,0 +1,188 @@
+import os
+import sys
+
+NC_DIFF = 'nc_diff.yaml'
+#--- values read at a time from each file, bounds the memory of a worker ---
+CHUNK_ELEMENTS = 1 << 24
+MAX_WORKERS    = 8
+
+def have_engine():
+    """Check whether numpy and netCDF4 can be imported
+
+    Returns:
+        bool: True when the difference engine can run
+    """
+    try:
+        import numpy
+        import netCDF4
+    except ImportError:
+        return False
+    return True
+
+def get_chunks(shape):
+    """Slices of the first dimension reading at most CHUNK_ELEMENTS values
+
+    A variable whose leading dimension is a single time level is split
+    along the next dimension, levels for most outputs.
+
+    Args:
+        shape (tuple): shape of the variable
+
+    Returns:
+        list: tuples of slices
+    """
+    if len(shape) == 0:
+        return [()]
+    axis = 1 if len(shape) > 1 and shape[0] == 1 else 0
+    row_size = 1
+    for length in shape[axis+1:]:
+        row_size *= length
+    rows = max(1, CHUNK_ELEMENTS // max(row_size, 1))
+    lead = (slice(0, 1),) if axis == 1 else ()
+    return [lead+(slice(begin, min(begin+rows, shape[axis])),) for begin in range(0, shape[axis], rows)]
+
+def compare_variable(baseline, output, name):
+    """Differences of a variable between the baseline and the run
+
+    Missing values are equal when missing in both files, NaNs when NaN
+    in both.
+
+    Args:
+        baseline (str): baseline NetCDF file
+        output (str): NetCDF file of the run
+        name (str): variable name
+
+    Returns:
+        dict: max abs and rel difference, number of differing points, size and
+              first differing index by dimension; None when identical
+    """
+    import numpy as np
+    import netCDF4
+    with netCDF4.Dataset(baseline) as fbase, netCDF4.Dataset(output) as frun:
+        if name not in frun.variables:
+            return {'error': 'missing in run'}
+        if name not in fbase.variables:
+            return {'error': 'missing in baseline'}
+        vbase, vrun = fbase.variables[name], frun.variables[name]
+        if vbase.shape != vrun.shape:
+            return {'error': f"shape {vbase.shape} in baseline, {vrun.shape} in run"}
+        vbase.set_auto_mask(True)
+        vrun.set_auto_mask(True)
+        numeric = np.issubdtype(vbase.dtype, np.number) and np.issubdtype(vrun.dtype, np.number)
+        count, max_abs, max_rel, first = 0, 0.0, 0.0, None
+        for chunk in get_chunks(vbase.shape):
+            base, run = np.ma.asarray(vbase[chunk]), np.ma.asarray(vrun[chunk])
+            mask_base, mask_run = np.ma.getmaskarray(base), np.ma.getmaskarray(run)
+            base_data, run_data = np.ma.getdata(base), np.ma.getdata(run)
+            if numeric:
+                base_data = base_data.astype(np.float64)
+                run_data  = run_data.astype(np.float64)
+                both_nan = np.isnan(base_data) & np.isnan(run_data)
+                differ = (base_data != run_data) & ~both_nan
+            else:
+                differ = base_data != run_data
+            differ = (differ & ~(mask_base | mask_run)) | (mask_base != mask_run)
+            nonzero = np.flatnonzero(differ)
+            if nonzero.size == 0:
+                continue
+            count += int(nonzero.size)
+            if first is None:
+                index = np.unravel_index(nonzero[0], differ.shape)
+                first = [int(i)+(chunk[axis].start if axis < len(chunk) else 0) for axis, i in enumerate(index)]
+            if numeric:
+                valid = differ & ~(mask_base | mask_run)
+                #--- a NaN in one file counts as differing, not in the maxima ---
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    delta = np.abs(run_data[valid]-base_data[valid])
+                    rel = delta/np.abs(base_data[valid])
+                delta, rel = delta[np.isfinite(delta)], rel[np.isfinite(rel)]
+                if delta.size:
+                    max_abs = max(max_abs, float(delta.max()))
+                if rel.size:
+                    max_rel = max(max_rel, float(rel.max()))
+        if count == 0:
+            return None
+        return {'max_abs': max_abs, 'max_rel': max_rel, 'count': count, 'size': int(vbase.size),
+                'first_index': dict(zip(vbase.dimensions, first))}
+
+def compare_files(BASELINE_DIR, RUNDIR, names, max_workers=MAX_WORKERS):
+    """Differences of the variables of NetCDF files, variables compared in parallel
+
+    Args:
+        BASELINE_DIR (str): baseline directory of the test
+        RUNDIR (str): run directory of the test
+        names (list): NetCDF files reported NOT IDENTICAL
+        max_workers (int): variables compared at the same time
+
+    Returns:
+        dict: file mapped to the differences of its differing variables
+    """
+    import netCDF4
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = []
+    for name in names:
+        with netCDF4.Dataset(BASELINE_DIR+'/'+name) as fbase, netCDF4.Dataset(RUNDIR+'/'+name) as frun:
+            variables = list(fbase.variables)+[var for var in frun.variables if var not in fbase.variables]
+        jobs.extend((name, var) for var in variables)
+    differences = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(compare_variable, [BASELINE_DIR+'/'+name for name, var in jobs],
+                               [RUNDIR+'/'+name for name, var in jobs], [var for name, var in jobs])
+        for (name, var), result in zip(jobs, results):
+            differences.setdefault(name, {})
+            if result is not None:
+                differences[name][var] = result
+    return differences
+
+def format_table(differences):
+    """Summary table of the differing variables
+
+    Args:
+        differences (dict): from compare_files
+
+    Returns:
+        list: lines of the table
+    """
+    lines = [f"{'FILE':28} {'VARIABLE':16} {'MAX ABS':>10} {'MAX REL':>10} {'DIFFERING':>16}  FIRST AT"]
+    for name, variables in differences.items():
+        if not variables:
+            lines.append(f"{name:28} {'-':16} identical data, differences in the header or attributes")
+        for var, result in variables.items():
+            if 'error' in result:
+                lines.append(f"{name:28} {var:16} {result['error']}")
+                continue
+            first = ','.join(f"{dim}={index}" for dim, index in result['first_index'].items())
+            lines.append(f"{name:28} {var:16} {result['max_abs']:10.3e} {result['max_rel']:10.3e} "
+                         f"{str(result['count'])+'/'+str(result['size']):>16}  {first}")
+    return lines
+
+def main():
+    """Report the variables of NetCDF files and the records of GRIB files differing from the baseline
+
+    Usage: nc_diff.py BASELINE_DIR FILE...
+
+    The run directory is the current directory. The tables are printed and
+    the differences are written to nc_diff.yaml, which failure_triage.py
+    adds to the failure class of the test. Other files are skipped.
+    """
+    import yaml
+    from grib_diff import is_grib, compare_grib, format_records
+    BASELINE_DIR, names = sys.argv[1], sys.argv[2:]
+    nc_names = [name for name in names if name.split('.')[-1].startswith('nc')]
+    differences = {}
+    if nc_names and have_engine():
+        differences = compare_files(BASELINE_DIR, os.getcwd(), nc_names)
+        print('\n'.join(format_table(differences)))
+    elif nc_names:
+        print("nc_diff.py needs numpy and netCDF4, no field differences reported")
+    #--- GRIB records are compared without numpy ---
+    for name in names:
+        if name not in nc_names and is_grib(name):
+            differences[name] = compare_grib(BASELINE_DIR+'/'+name, name)
+            print('\n'.join(format_records(name, differences[name])))
+    if differences:
+        with open(NC_DIFF, 'w') as fdiff:
+            yaml.dump(differences, fdiff, sort_keys=False)
+
+if __name__ == "__main__":
+    main()
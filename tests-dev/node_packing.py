@@ -0,0 +1,233 @@
+import os
+from ufs_test_utils import get_testcase, machine_check_off
+from opnreq_cases import read_test_vars, get_test_id
+
+PACK_PREFIX = 'pack_'
+#--- components of compute_petbounds_and_tasks after ATM, in PET order ---
+PET_COMPONENTS = ['ocn', 'ice', 'wav', 'lnd', 'fbh']
+
+def get_int(test_vars, name):
+    """Value of a variable in bash arithmetic, unset and empty are 0
+
+    Args:
+        test_vars (dict): test configuration
+        name (str): variable name
+
+    Returns:
+        int: value
+    """
+    value = str(test_vars.get(name) or '0').strip()
+    return int(value) if value.lstrip('-').isdigit() else 0
+
+def compute_petbounds_and_tasks(test_vars):
+    """PET bounds and task count of the components of a test
+
+    Reproduces compute_petbounds_and_tasks of rt_utils.sh.
+
+    Args:
+        test_vars (dict): test configuration from read_test_vars
+
+    Returns:
+        dict: ATM_compute_tasks, ATM_io_tasks, <COMPONENT>_tasks,
+              <component>_petlist_bounds and UFS_tasks as set by rt_utils.sh
+    """
+    tasks = {}
+    ATM_compute_tasks = get_int(test_vars, 'ATM_compute_tasks')
+    ATM_io_tasks = get_int(test_vars, 'ATM_io_tasks')
+    if str(test_vars.get('DATM_CDEPS')) == 'false':
+        if ATM_compute_tasks == 0:
+            ATM_compute_tasks = get_int(test_vars, 'INPES')*get_int(test_vars, 'JNPES')*get_int(test_vars, 'NTILES')
+        if str(test_vars.get('QUILTING')) == '.true.':
+            ATM_io_tasks = get_int(test_vars, 'WRITE_GROUP')*get_int(test_vars, 'WRTTASK_PER_GROUP')
+    tasks['ATM_compute_tasks'] = ATM_compute_tasks
+    tasks['ATM_io_tasks'] = ATM_io_tasks
+
+    n = 0
+    atm_threads = get_int(test_vars, 'atm_omp_num_threads')
+    if ATM_compute_tasks+ATM_io_tasks > 0:
+        atm_pets = ATM_compute_tasks*atm_threads+ATM_io_tasks*atm_threads
+        tasks['atm_petlist_bounds'] = f"{n} {n+atm_pets-1}"
+        n += atm_pets
+    for component in PET_COMPONENTS:
+        #--- CHM, MED and AQM run on the ATM compute tasks ---
+        if component == 'lnd':
+            for shared in ['chm', 'med', 'aqm']:
+                tasks[shared+'_petlist_bounds'] = f"0 {ATM_compute_tasks*atm_threads-1}"
+        COMPONENT_tasks = get_int(test_vars, component.upper()+'_tasks')
+        if COMPONENT_tasks > 0:
+            COMPONENT_tasks *= get_int(test_vars, component+'_omp_num_threads')
+            tasks[component.upper()+'_tasks'] = COMPONENT_tasks
+            tasks[component+'_petlist_bounds'] = f"{n} {n+COMPONENT_tasks-1}"
+            n += COMPONENT_tasks
+    tasks['UFS_tasks'] = n
+    return tasks
+
+def get_run_resources(TASKS, TPN, THRD):
+    """Nodes and cores per node of a test job
+
+    Reproduces set_run_task of ufs_test_utils.sh and the node request of
+    rocoto_create_run_task of rt_utils.sh.
+
+    Args:
+        TASKS (int): MPI tasks from compute_petbounds_and_tasks
+        TPN (int): cores per node of the machine
+        THRD (int): threads per task
+
+    Returns:
+        tuple: NODES, PPN and the cores per node requested from Rocoto
+    """
+    TPN = TPN//THRD
+    NODES = -(-TASKS//TPN)
+    PPN = -(-TASKS//NODES)
+    CORES = TASKS*THRD
+    return NODES, PPN, min(TPN, CORES)
+
+def get_machine_tpn(PATHRT):
+    """Cores per node of the machine as default_vars.sh sets TPN
+
+    Args:
+        PATHRT (str): Test directory
+
+    Returns:
+        int: cores per node, 0 when default_vars.sh cannot be read
+    """
+    import subprocess
+    try:
+        output = subprocess.check_output(['bash', '-c', 'source default_vars.sh; echo "${TPN:-0}"'],
+                                         cwd=PATHRT, stderr=subprocess.DEVNULL)
+        return int(output.split()[-1])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return 0
+
+def get_test_resources(PATHRT, TEST_NAME, settings=None):
+    """Nodes, cores per node and wall clock limit of a test
+
+    Args:
+        PATHRT (str): Test directory
+        TEST_NAME (str): test name e.g. control_c48
+        settings (dict): variables overriding the test configuration, e.g. of an opnReqTest case
+
+    Returns:
+        dict: TASKS, THRD, NODES, PPN, CORES, TPN and WLCLK
+    """
+    test_vars = read_test_vars(PATHRT, TEST_NAME)
+    test_vars.update(settings or {})
+    TASKS = compute_petbounds_and_tasks(test_vars)['UFS_tasks']
+    THRD  = max(1, get_int(test_vars, 'THRD'))
+    NODES, PPN, CORES = get_run_resources(TASKS, get_int(test_vars, 'TPN'), THRD)
+    return {'TASKS': TASKS, 'THRD': THRD, 'NODES': NODES, 'PPN': PPN,
+            'CORES': CORES, 'TPN': get_int(test_vars, 'TPN'), 'WLCLK': get_int(test_vars, 'WLCLK')}
+
+def is_packable(resources, SCHEDULER):
+    """Check whether a test can share a node with other tests
+
+    Only single threaded tests using at most half a node are packed, on
+    Slurm where the srun of each job card takes its own cores of the
+    allocation.
+
+    Args:
+        resources (dict): test resources from get_test_resources
+        SCHEDULER (str): slurm or pbs
+
+    Returns:
+        bool: True when the test can be packed
+    """
+    return (SCHEDULER == 'slurm' and resources['THRD'] == 1 and resources['NODES'] == 1
+            and 2*resources['CORES'] <= resources['TPN'])
+
+def plan_packs(candidates, TPN):
+    """Bin-pack small tests onto shared nodes, first fit decreasing
+
+    Args:
+        candidates (list): (TEST_NAME, TEST_ID, resources) of packable tests
+        TPN (int): cores per node of the machine
+
+    Returns:
+        list: packs of at least two (TEST_NAME, TEST_ID, resources)
+    """
+    packs = []
+    for test in sorted(candidates, key=lambda test: test[2]['CORES'], reverse=True):
+        for pack in packs:
+            if sum(packed[2]['CORES'] for packed in pack)+test[2]['CORES'] <= TPN:
+                pack.append(test)
+                break
+        else:
+            packs.append([test])
+    return [pack for pack in packs if len(pack) > 1]
+
+def plan_compile_packs(PATHRT, tests, COMPILE_ID, RT_COMPILER, MACHINE_ID, SCHEDULER):
+    """Packs of the small tests of a compile
+
+    Tests with a dependency, tests other tests depend on and operational
+    requirement runs keep their own task.
+
+    Args:
+        PATHRT (str): Test directory
+        tests (list): tests of the compile in the test yaml
+        COMPILE_ID (str): Compile identifier e.g. atm_dyn32_intel
+        RT_COMPILER (str): intel or gnu
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        SCHEDULER (str): slurm or pbs
+
+    Returns:
+        dict: pack task name mapped to its (TEST_NAME, TEST_ID, resources)
+    """
+    if SCHEDULER != 'slurm':
+        return {}
+    configs = [get_testcase(test) for test in tests]
+    dependencies = set(str(config['dependency']) for case, config in configs if 'dependency' in config)
+    candidates = []
+    TPN = 0
+    for TEST_NAME, config in configs:
+        if (not machine_check_off(MACHINE_ID, config) or 'dependency' in config or 'opnreq' in config
+            or TEST_NAME in dependencies):
+            continue
+        resources = get_test_resources(PATHRT, TEST_NAME)
+        if is_packable(resources, SCHEDULER):
+            candidates.append((TEST_NAME, get_test_id(TEST_NAME, RT_COMPILER, config), resources))
+            TPN = resources['TPN']
+    packs = plan_packs(candidates, TPN)
+    return {PACK_PREFIX+COMPILE_ID+'_'+str(n+1): pack for n, pack in enumerate(packs)}
+
+def rocoto_create_pack_task(pack_name, pack, COMPILE_ID, COMPILE_CACHED, xml):
+    """Add a Rocoto task running a pack of tests on one node
+
+    The task runs run_packed.sh, which runs run_test.sh of every test of
+    the pack at the same time. Queue and partition follow
+    rocoto_create_run_task of rt_utils.sh.
+
+    Args:
+        pack_name (str): task name e.g. pack_atm_intel_1
+        pack (list): (TEST_NAME, TEST_ID, resources) from plan_packs
+        COMPILE_ID (str): compile providing the executable
+        COMPILE_CACHED (bool): executable is already in place, no compile task to wait for
+        xml (list): Rocoto xml fragments, appended to
+    """
+    MACHINE_ID = str(os.getenv('MACHINE_ID'))
+    PARTITION  = str(os.getenv('PARTITION', ''))
+    CORES = sum(resources['CORES'] for TEST_NAME, TEST_ID, resources in pack)
+    WLCLK = max(resources['WLCLK'] for TEST_NAME, TEST_ID, resources in pack)
+    tests = ' '.join(TEST_NAME+':'+TEST_ID for TEST_NAME, TEST_ID, resources in pack)
+    dependency = '' if COMPILE_CACHED else f"<dependency> <taskdep task=\"compile_{COMPILE_ID}\"/> </dependency>"
+    NODESIZE = os.getenv('ROCOTO_NODESIZE')
+    task = f"""    <task name="{pack_name}" maxtries="{os.getenv('ROCOTO_TEST_MAXTRIES', '3')}">
+      {dependency}
+      <command>bash -c 'set -xe -o pipefail ; &PATHRT;/run_packed.sh &PATHRT; &RUNDIR_ROOT; &LOG; {COMPILE_ID} {tests} 2>&amp;1 | tee &LOG;/{pack_name}.log' </command>
+      <jobname>{pack_name}</jobname>
+      <account>{os.getenv('ACCNR')}</account>
+      {f'<nodesize>{NODESIZE}</nodesize>' if NODESIZE else ''}
+"""
+    if MACHINE_ID == 'gaea':
+        task += f"""      <native>--clusters={PARTITION}</native>
+      <native>--partition=batch</native>
+"""
+    elif PARTITION or MACHINE_ID != 'hera':
+        task += f"""      <queue>{os.getenv('QUEUE')}</queue>
+      <partition>{PARTITION}</partition>
+"""
+    task += f"""      <nodes>1:ppn={CORES}</nodes>
+      <walltime>00:{WLCLK}:00</walltime>
+      <join>&RUNDIR_ROOT;/{pack_name}.log</join>
+    </task>
+"""
+    xml.append(task)
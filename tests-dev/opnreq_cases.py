@@ -0,0 +1,497 @@
+import os
+import re
+import sys
+import shlex
+from datetime import datetime, timedelta
+from ufs_test_utils import get_testcase
+
+OPNREQ_ENV   = 'opnreq_test_'
+#--- test cases of tests/opnReqTest, in the order they are run ---
+OPNREQ_CASES = ['std', 'thr', 'mpi', 'dcp', 'rst', 'bit', 'dbg', 'fhz']
+#--- run case: compile case building its executable, run case creating its baseline ---
+OPNREQ_RUNS  = {'std_base': ('std', None),
+                'std':      ('std', 'std_base'),
+                'thr':      ('std', 'std_base'),
+                'mpi':      ('std', 'std_base'),
+                'dcp':      ('std', 'std_base'),
+                'rst':      ('std', 'std_base'),
+                'fhz':      ('std', 'std_base'),
+                'bit_base': ('bit', None),
+                'bit':      ('bit', 'bit_base'),
+                'dbg_base': ('dbg', None),
+                'dbg':      ('dbg', 'dbg_base')}
+FORECAST_HOUR = re.compile(r"(phyf|dynf|sfcf|atmf)(\d{3})|(GrbF)(\d{2})")
+FILE_TIMES    = [re.compile(r"(\d{4})(\d{2})(\d{2})\.(\d{2})(\d{2})(\d{2})"),
+                 re.compile(r"(\d{4})-(\d{2})-(\d{2})-(\d{5})"),
+                 re.compile(r"(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})z")]
+
+def get_application(TEST_NAME):
+    """Application of a test as classified by tests/opnReqTest
+
+    Args:
+        TEST_NAME (str): test name e.g. control_p8
+
+    Returns:
+        str: regional, cpld, datm, atmw or global
+    """
+    for application in ['regional', 'cpld', 'datm', 'atmw']:
+        if application in TEST_NAME:
+            return application
+    return 'global'
+
+def get_run_cases(cases, compare=()):
+    """Run cases needed for a list of test cases
+
+    Args:
+        cases (list): test cases from OPNREQ_CASES
+        compare (list): of std, bit and dbg, rerun and compare against their own baseline
+
+    Returns:
+        list: run cases from OPNREQ_RUNS, baseline runs before the runs comparing against them
+    """
+    run_cases = []
+    for case in OPNREQ_CASES:
+        if not case in cases:
+            continue
+        base_case = OPNREQ_RUNS[case][0]+'_base'
+        if not base_case in run_cases:
+            run_cases.append(base_case)
+        if not case in ['std', 'bit', 'dbg'] or case in compare:
+            run_cases.append(case)
+    return run_cases
+
+def get_make_opt(MAKE_OPT, compile_case):
+    """Compile options of a compile case
+
+    Args:
+        MAKE_OPT (str): compile options of the base test
+        compile_case (str): std, bit or dbg
+
+    Returns:
+        str: compile options
+    """
+    opts = MAKE_OPT.split()
+    if compile_case == 'bit':
+        #--- bit flips between 32 and 64 bit dynamics ---
+        if '-D32BIT=ON' in opts:
+            opts = [opt for opt in opts if opt != '-D32BIT=ON']
+        else:
+            opts.append('-D32BIT=ON')
+    elif compile_case == 'dbg':
+        opts.append('-DDEBUG=ON')
+    return ' '.join(opts)
+
+def get_test_id(TEST_NAME, RT_COMPILER, config):
+    """Test identifier, carrying the run case of operational requirement tests
+
+    Args:
+        TEST_NAME (str): test name e.g. control_p8
+        RT_COMPILER (str): compiler e.g. intel
+        config (dict): test configuration from the test yaml
+
+    Returns:
+        str: test identifier e.g. control_p8_intel, control_p8_intel_thr
+    """
+    TEST_ID = TEST_NAME+'_'+RT_COMPILER
+    if 'opnreq' in config:
+        TEST_ID += '_'+str(config['opnreq'])
+    return TEST_ID
+
+def get_case_dep(TEST_NAME, RT_COMPILER, run_case):
+    """Test a run case waits for, the run creating its baseline
+
+    Args:
+        TEST_NAME (str): test name e.g. control_p8
+        RT_COMPILER (str): compiler e.g. intel
+        run_case (str): run case from OPNREQ_RUNS
+
+    Returns:
+        str: test identifier of the baseline run, "" for baseline runs
+    """
+    base_case = OPNREQ_RUNS[run_case][1]
+    if base_case is None:
+        return ""
+    return get_test_id(TEST_NAME, RT_COMPILER, {'opnreq': base_case})
+
+def read_test_vars(PATHRT, TEST_NAME):
+    """Read the configuration of a test as run_test.sh sets it
+
+    Args:
+        PATHRT (str): Test directory
+        TEST_NAME (str): test name e.g. control_p8
+
+    Returns:
+        dict: variable name mapped to its value
+    """
+    import subprocess
+    script = f"set -a; source default_vars.sh; source tests/{TEST_NAME}; env -0"
+    output = subprocess.check_output(['bash', '-c', script], cwd=PATHRT, stderr=subprocess.DEVNULL)
+    test_vars = {}
+    for item in output.decode(errors='surrogateescape').split('\0'):
+        name, sep, value = item.partition('=')
+        if sep:
+            test_vars[name] = value
+    return test_vars
+
+def get_start_time(PATHRT, test_vars):
+    """Start time of a test
+
+    Taken from the model_configure template when it sets a fixed start
+    date, as the regional templates do, else from SYEAR, SMONTH, SDAY and SHOUR.
+
+    Args:
+        PATHRT (str): Test directory
+        test_vars (dict): test configuration from read_test_vars
+
+    Returns:
+        datetime: start time
+    """
+    start = {'year': test_vars['SYEAR'], 'month': test_vars['SMONTH'],
+             'day': test_vars['SDAY'], 'hour': test_vars['SHOUR']}
+    MODEL_CONFIGURE = PATHRT+'/parm/'+test_vars.get('MODEL_CONFIGURE', 'model_configure.IN')
+    if os.path.isfile(MODEL_CONFIGURE):
+        with open(MODEL_CONFIGURE) as fconf:
+            for line in fconf:
+                match = re.match(r"start_(year|month|day|hour):\s*(\d+)\s*$", line)
+                if match:
+                    start[match.group(1)] = match.group(2)
+    return datetime(int(start['year']), int(start['month']), int(start['day']), int(start['hour']))
+
+def file_time(name, start):
+    """Valid time of an output file from its forecast hour or time stamp
+
+    Args:
+        name (str): output file name e.g. sfcf024.nc, RESTART/20210323.060000.coupler.res
+        start (datetime): start time of the test
+
+    Returns:
+        datetime: valid time, None when the name has none
+    """
+    match = FORECAST_HOUR.search(os.path.basename(name))
+    if match:
+        return start+timedelta(hours=int(match.group(2) or match.group(4)))
+    for n, pattern in enumerate(FILE_TIMES):
+        match = pattern.search(name)
+        if not match:
+            continue
+        fields = [int(field) for field in match.groups()]
+        if n == 1:
+            return datetime(*fields[:3])+timedelta(seconds=fields[3])
+        return datetime(*fields)
+    return None
+
+def set_file_time(name, start, time):
+    """Change the forecast hour or time stamp of an output file name
+
+    Args:
+        name (str): output file name
+        start (datetime): start time of the test
+        time (datetime): new valid time
+
+    Returns:
+        str: output file name
+    """
+    hours = int((time-start).total_seconds())//3600
+    name = FORECAST_HOUR.sub(lambda m: m.group(1)+f"{hours:03d}" if m.group(1) else m.group(3)+f"{hours:02d}", name)
+    secs = time.hour*3600+time.minute*60+time.second
+    name = FILE_TIMES[0].sub(time.strftime('%Y%m%d.%H%M%S'), name)
+    name = FILE_TIMES[1].sub(time.strftime('%Y-%m-%d-')+f"{secs:05d}", name)
+    return FILE_TIMES[2].sub(time.strftime('%Y%m%d_%H%Mz'), name)
+
+def restart_times(start, FHROT):
+    """Restart time stamps of a run restarting at forecast hour FHROT
+
+    Args:
+        start (datetime): start time of the test
+        FHROT (int): forecast hour of the restart
+
+    Returns:
+        dict: RESTART_FILE_PREFIX, RESTART_FILE_SUFFIX_SECS and RUN_BEG
+    """
+    time = start+timedelta(hours=FHROT)
+    secs = time.hour*3600+time.minute*60+time.second
+    return {'RESTART_FILE_PREFIX': time.strftime('%Y%m%d.%H%M%S'),
+            'RESTART_FILE_SUFFIX_SECS': time.strftime('%Y-%m-%d-')+f"{secs:05d}",
+            'RUN_BEG': time.strftime('%Y%m%d %H%M%S')}
+
+def get_decomposition(test_vars):
+    """Halve the layout of a test, keeping the tile decomposition valid
+
+    Args:
+        test_vars (dict): test configuration from read_test_vars
+
+    Returns:
+        dict: INPES, JNPES and ATM_compute_tasks, None when neither INPES nor JNPES is even
+    """
+    INPES = int(test_vars['INPES'])
+    JNPES = int(test_vars['JNPES'])
+    if JNPES % 2 == 0:
+        JNPES //= 2
+    elif INPES % 2 == 0:
+        INPES //= 2
+    else:
+        return None
+    return set_decomposition(test_vars, INPES, JNPES)
+
+def set_decomposition(test_vars, INPES, JNPES):
+    """Settings of an ATM layout
+
+    Args:
+        test_vars (dict): test configuration from read_test_vars
+        INPES (int): tasks in x direction
+        JNPES (int): tasks in y direction
+
+    Returns:
+        dict: INPES, JNPES and ATM_compute_tasks
+    """
+    settings = {'INPES': INPES, 'JNPES': JNPES}
+    #--- tests setting ATM_compute_tasks do not derive it from the layout ---
+    if int(test_vars.get('ATM_compute_tasks') or 0) > 0:
+        settings['ATM_compute_tasks'] = INPES*JNPES*int(test_vars['NTILES'])
+    return settings
+
+def std_settings(test_vars, application, start):
+    """Settings shared by all run cases: restart files are written halfway
+
+    Args:
+        test_vars (dict): test configuration from read_test_vars
+        application (str): application from get_application
+        start (datetime): start time of the test
+
+    Returns:
+        dict: variable name mapped to its value
+    """
+    FHMAX = int(test_vars['FHMAX'])
+    return {'RESTART_N': FHMAX//2, 'RESTART_INTERVAL': f"{FHMAX//2} -1"}
+
+def thr_settings(test_vars, application, start):
+    """Two OpenMP threads per ATM task on half the layout
+    """
+    if application == 'datm':
+        return None
+    settings = get_decomposition(test_vars)
+    if settings is None:
+        return None
+    settings['atm_omp_num_threads'] = 2*int(test_vars.get('atm_omp_num_threads') or 1)
+    return settings
+
+def mpi_settings(test_vars, application, start):
+    """Half the layout with two write groups
+    """
+    if application in ['regional', 'cpld', 'datm']:
+        return None
+    settings = get_decomposition(test_vars)
+    if settings is None:
+        return None
+    settings.update({'WRITE_GROUP': 2, 'WRTTASK_PER_GROUP': 12})
+    return settings
+
+def dcp_settings(test_vars, application, start):
+    """Transposed layout, 5x12 for regional tests
+    """
+    if application == 'datm':
+        return None
+    if application == 'regional':
+        return set_decomposition(test_vars, 5, 12)
+    if test_vars['INPES'] == test_vars['JNPES']:
+        return None
+    return set_decomposition(test_vars, int(test_vars['JNPES']), int(test_vars['INPES']))
+
+def rst_settings(test_vars, application, start):
+    """Restart halfway from the files of the baseline run
+    """
+    if application == 'datm':
+        return None
+    FHMAX = int(test_vars['FHMAX'])
+    FHROT = FHMAX//2
+    end   = start+timedelta(hours=FHMAX)
+    settings = {'FHROT': FHROT, 'WARM_START': '.true.', 'NGGPS_IC': '.false.', 'EXTERNAL_IC': '.false.',
+                'MAKE_NH': '.false.', 'MOUNTAIN': '.true.', 'NA_INIT': 0}
+    settings.update(restart_times(start, FHROT))
+    for name in ['OUT_BEG', 'RST_BEG', 'RST_2_BEG']:
+        settings[name] = settings['RUN_BEG']
+    NSTF_NAME = test_vars.get('NSTF_NAME', '').split(',')
+    if len(NSTF_NAME) > 1 and NSTF_NAME[1] == '1':
+        NSTF_NAME[1] = '0'
+        settings['NSTF_NAME'] = ','.join(NSTF_NAME)
+    if application == 'global':
+        settings['OUTPUT_FH'] = '3 -1'
+    elif application == 'cpld':
+        settings.update({'CICE_RUNTYPE': 'continue', 'RUNTYPE': 'continue', 'CICE_USE_RESTART_TIME': '.true.',
+                         'MOM6_RESTART_SETTING': 'r', 'RESTART_N': FHMAX-FHROT})
+    elif application == 'atmw':
+        settings.update({'WW3_RSTDTHR': 6, 'WW3_DT_2_RST': 6*3600, 'RUNTYPE': 'continue',
+                         'CICE_USE_RESTART_TIME': '.true.', 'RESTART_N': FHMAX-FHROT})
+    #--- the restart run writes its output at the end time only ---
+    list_files = []
+    for name in test_vars['LIST_FILES'].split():
+        if 'atmos_4xdaily' in name or file_time(name, start) not in [None, end]:
+            continue
+        if not name in list_files:
+            list_files.append(name)
+    settings['LIST_FILES'] = ' '.join(list_files)
+    return settings
+
+def bit_settings(test_vars, application, start):
+    """Same configuration on the bit executable
+    """
+    return {}
+
+def dbg_settings(test_vars, application, start):
+    """Short run on the debug executable
+    """
+    if application in ['regional', 'datm']:
+        return None
+    FHMAX = int(test_vars['FHMAX'])
+    end   = start+timedelta(hours=FHMAX)
+    settings = {'WLCLK': 60}
+    if application == 'global':
+        new_FHMAX = 1
+        settings.update({'FHMAX': new_FHMAX, 'OUTPUT_FH': f"0 {new_FHMAX}", 'WRITE_DOPOST': '.false.'})
+    else:
+        new_FHMAX = 3
+        settings.update({'FHMAX': new_FHMAX, 'DAYS': new_FHMAX/24, 'RESTART_INTERVAL': new_FHMAX,
+                         'RESTART_N': new_FHMAX, 'OUTPUT_FH': f"0 {new_FHMAX}"})
+        if application == 'cpld':
+            settings['AOD_FRQ'] = f"{new_FHMAX:02d}0000"
+        else:
+            settings.update({'WW3_RSTDTHR': new_FHMAX, 'WW3_DT_2_RST': new_FHMAX*3600})
+    new_end = start+timedelta(hours=new_FHMAX)
+    #--- output of the end time moves to the new end time, later output is not written ---
+    list_files = []
+    for name in test_vars['LIST_FILES'].split():
+        time = file_time(name, start)
+        if application == 'global' and not FORECAST_HOUR.search(os.path.basename(name)):
+            continue
+        if application == 'global' and 'GrbF' in name:
+            continue
+        if time == end:
+            name = set_file_time(name, start, new_end)
+        elif time is not None and time > new_end:
+            continue
+        if not name in list_files:
+            list_files.append(name)
+    settings['LIST_FILES'] = ' '.join(list_files)
+    return settings
+
+def fhz_settings(test_vars, application, start):
+    """Accumulation buckets zeroed every 3 hours
+    """
+    if application in ['regional', 'datm']:
+        return None
+    end = start+timedelta(hours=int(test_vars['FHMAX']))
+    #--- buckets zeroed every FHZERO hours change the accumulated fields of the end time ---
+    list_files = [name for name in test_vars['LIST_FILES'].split()
+                  if not (FORECAST_HOUR.search(os.path.basename(name)) and file_time(name, start) == end)]
+    return {'FHZERO': 3, 'CMP_DATAONLY': 'true', 'LIST_FILES': ' '.join(list_files)}
+
+CASE_SETTINGS = {'std': std_settings, 'thr': thr_settings, 'mpi': mpi_settings, 'dcp': dcp_settings,
+                 'rst': rst_settings, 'bit': bit_settings, 'dbg': dbg_settings, 'fhz': fhz_settings}
+
+def get_case_settings(PATHRT, TEST_NAME, run_case):
+    """Configuration of a run case of an operational requirement test
+
+    Args:
+        PATHRT (str): Test directory
+        TEST_NAME (str): test name e.g. control_p8
+        run_case (str): run case from OPNREQ_RUNS
+
+    Returns:
+        dict: variable name mapped to its value, None when the case does not apply to the test
+    """
+    test_vars = read_test_vars(PATHRT, TEST_NAME)
+    if test_vars.get('WARM_START') not in [None, '.false.', '.F.']:
+        print(f"{TEST_NAME} is a restart run, skipping operational requirement test {run_case}")
+        return None
+    application = get_application(TEST_NAME)
+    start = get_start_time(PATHRT, test_vars)
+    settings = std_settings(test_vars, application, start)
+    case = run_case.replace('_base', '')
+    case_settings = CASE_SETTINGS[case](test_vars, application, start)
+    if case_settings is None:
+        print(f"{TEST_NAME} ({application}) is not set up for operational requirement test {case}, skipping...")
+        return None
+    settings.update(case_settings)
+    return settings
+
+def write_case_env(RUNDIR_ROOT, TEST_ID, run_case, settings):
+    """Write the settings of a run case, sourced after the test configuration
+
+    Args:
+        RUNDIR_ROOT (str): Test run directory
+        TEST_ID (str): test identifier e.g. control_p8_intel_thr
+        run_case (str): run case from OPNREQ_RUNS
+        settings (dict): configuration from get_case_settings
+    """
+    base_case = OPNREQ_RUNS[run_case][1]
+    settings = dict(settings)
+    settings['CREATE_BASELINE'] = 'true' if base_case is None else 'false'
+    settings['BL_SUFFIX'] = '_'+(base_case or run_case)
+    if base_case is not None:
+        #--- runs compare against the baseline written by their base run ---
+        settings['RTPWD'] = str(os.getenv('NEW_BASELINE'))
+        #--- kill or flag, how opnreq_compare.py handles a divergent forecast hour ---
+        settings['OPNREQ_WATCH'] = os.getenv('OPNREQ_WATCH', 'kill')
+    with open(RUNDIR_ROOT+'/'+OPNREQ_ENV+TEST_ID+'.env', 'w') as fenv:
+        for name, value in settings.items():
+            fenv.write(f"export {name}={shlex.quote(str(value))}\n")
+
+def opnreq_yaml(rt_yaml, test_names, cases, compare=()):
+    """Test yaml of the operational requirement tests of several tests
+
+    Each build of the tests gets a compile for the std, bit and dbg cases,
+    so all cases of all tests run as one workflow.
+
+    Args:
+        rt_yaml (dict): test yaml configuration
+        test_names (list): tests e.g. ['control_p8', 'cpld_control_p8']
+        cases (list): test cases from OPNREQ_CASES
+        compare (list): of std, bit and dbg, rerun and compare against their own baseline
+
+    Returns:
+        dict: test yaml configuration
+    """
+    import copy
+    run_cases = get_run_cases(cases, compare)
+    new_yaml = {}
+    found = set()
+    for apps, jobs in rt_yaml.items():
+        build = jobs['build']
+        compiler = str(build['compiler'])
+        for test in jobs.get('tests', []):
+            case, config = get_testcase(test)
+            if not case in test_names or (case, compiler) in found:
+                continue
+            found.add((case, compiler))
+            prefix = apps[:-len(compiler)-1] if apps.endswith('_'+compiler) else apps
+            for run_case in run_cases:
+                compile_case = OPNREQ_RUNS[run_case][0]
+                COMPILE_ID = apps if compile_case == 'std' else prefix+'_'+compile_case+'_'+compiler
+                if not COMPILE_ID in new_yaml:
+                    compile_build = dict(copy.deepcopy(build), option=get_make_opt(str(build['option']), compile_case))
+                    new_yaml[COMPILE_ID] = {'build': compile_build, 'tests': []}
+                test_config = {key: copy.deepcopy(val) for key, val in config.items() if key != 'dependency'}
+                test_config['opnreq'] = run_case
+                new_yaml[COMPILE_ID]['tests'].append({case: test_config})
+    for name in test_names:
+        if not any(case == name for case, compiler in found):
+            print(f"*** Test {name} given with runtime option -q is not found in ufs_test.yaml! ***")
+    return new_yaml
+
+def update_testyaml_q():
+    """Update test yaml file for the operational requirement tests specified in -q "<tests> [<cases>]"
+    """
+    OPNREQ_TESTS      = str(os.getenv('OPNREQ_TESTS')).split(',')
+    OPNREQ_TEST_CASES = os.getenv('OPNREQ_TEST_CASES') or ','.join(OPNREQ_CASES)
+    cases = OPNREQ_TEST_CASES.split(',')
+    for case in cases:
+        if not case in OPNREQ_CASES:
+            sys.exit(f"*** Unknown operational requirement test case {case}, use {','.join(OPNREQ_CASES)} ***")
+    import yaml
+    with open('ufs_test.yaml', 'r') as file_yaml:
+        rt_yaml = yaml.load(file_yaml, Loader=yaml.FullLoader)
+    new_yaml = opnreq_yaml(rt_yaml, OPNREQ_TESTS, cases)
+    if len(new_yaml) == 0:
+        sys.exit("*** No operational requirement tests to run ***")
+    with open('ufs_test_temp.yaml', 'w') as yaml_file:
+        yaml.dump(new_yaml, yaml_file)
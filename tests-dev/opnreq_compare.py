@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import signal
+import shutil
+import filecmp
+import subprocess
+from opnreq_cases import file_time, get_start_time
+from grib_diff import is_grib, grib_identical
+
+DIVERGENCE_FILE = 'opnreq_divergence.txt'
+POLL_SECONDS    = 30
+
+def get_hour_groups(LIST_FILES, start):
+    """Output files of a test grouped by valid time
+
+    Files without a valid time in their name are left to the results
+    check of run_test.sh.
+
+    Args:
+        LIST_FILES (list): output files compared by the test
+        start (datetime): start time of the test
+
+    Returns:
+        list: (valid time, files) sorted by valid time
+    """
+    groups = {}
+    for name in LIST_FILES:
+        valid_time = file_time(name, start)
+        if valid_time is not None:
+            groups.setdefault(valid_time, []).append(name)
+    return sorted(groups.items())
+
+def compare_file(name, RUNDIR, BASELINE_DIR, CMP_DATAONLY):
+    """Compare an output file against the baseline as run_test.sh does
+
+    NetCDF files are compared with nccmp, and skipped when nccmp is not
+    available since their headers differ between runs. GRIB files are
+    compared message by message up to the first differing message, other
+    files byte by byte.
+
+    Args:
+        name (str): output file
+        RUNDIR (str): run directory of the test
+        BASELINE_DIR (str): baseline directory of the test
+        CMP_DATAONLY (bool): only compare the data of NetCDF files
+
+    Returns:
+        bool: False when the file differs, True when identical or not compared
+    """
+    baseline, output = BASELINE_DIR+'/'+name, RUNDIR+'/'+name
+    if not os.path.isfile(baseline):
+        return True
+    if name.split('.')[-1].startswith('nc'):
+        if shutil.which('nccmp') is None:
+            return True
+        options = '-d -S -q -f -B' if CMP_DATAONLY else '-d -S -q -f -g -B'
+        command = ['nccmp']+options.split()+['--Attribute=checksum', '--warn=format', baseline, output]
+        return subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+    if is_grib(output):
+        return grib_identical(baseline, output)
+    return filecmp.cmp(baseline, output, shallow=False)
+
+def kill_tree(pid):
+    """Terminate a process and all its descendants
+
+    Args:
+        pid (int): process id
+    """
+    children = subprocess.run(['pgrep', '-P', str(pid)], stdout=subprocess.PIPE, text=True).stdout.split()
+    for child in children:
+        kill_tree(int(child))
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+def is_running(pid):
+    """Check whether a process is still running
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        bool: True when running
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+def watch_run(pid, RUNDIR, BASELINE_DIR, hour_groups, CMP_DATAONLY, action='kill', poll=POLL_SECONDS):
+    """Compare output files hour by hour while the model is running
+
+    The files of a valid time are compared once files of a later valid
+    time exist, so they are not compared while still being written. The
+    files of the last valid time are left to the results check.
+
+    Args:
+        pid (int): process id of the model job
+        RUNDIR (str): run directory of the test
+        BASELINE_DIR (str): baseline directory of the test
+        hour_groups (list): (valid time, files) from get_hour_groups
+        CMP_DATAONLY (bool): only compare the data of NetCDF files
+        action (str): kill stops the model at the first divergent hour, flag only records it
+        poll (int): seconds between checks of the run directory
+
+    Returns:
+        str: first divergent file, None when no divergence was found
+    """
+    checked = 0
+    while checked < len(hour_groups)-1 and is_running(pid):
+        valid_time, names = hour_groups[checked]
+        later = [name for group in hour_groups[checked+1:] for name in group[1]]
+        if not any(os.path.isfile(RUNDIR+'/'+name) for name in later):
+            time.sleep(poll)
+            continue
+        for name in names:
+            if os.path.isfile(RUNDIR+'/'+name) and not compare_file(name, RUNDIR, BASELINE_DIR, CMP_DATAONLY):
+                with open(RUNDIR+'/'+DIVERGENCE_FILE, 'w') as fdiv:
+                    fdiv.write(f" Diverged from baseline at {valid_time:%Y-%m-%d %H:%M}: {name}\n")
+                print(f"{name} differs from {BASELINE_DIR}/{name}")
+                if action == 'kill':
+                    kill_tree(pid)
+                return name
+        print(f"{valid_time:%Y-%m-%d %H:%M} identical")
+        checked += 1
+    return None
+
+def main():
+    """Watch an operational requirement test run against its baseline
+
+    Usage: opnreq_compare.py PID BASELINE_DIR
+
+    The run directory is the current directory. PATHRT, LIST_FILES,
+    CMP_DATAONLY, OPNREQ_WATCH and the start date of the test are read
+    from the environment of run_test.sh.
+    """
+    pid, BASELINE_DIR = int(sys.argv[1]), sys.argv[2]
+    start = get_start_time(str(os.getenv('PATHRT')), os.environ)
+    hour_groups = get_hour_groups(str(os.getenv('LIST_FILES')).split(), start)
+    CMP_DATAONLY = str(os.getenv('CMP_DATAONLY')) == 'true'
+    action = 'flag' if str(os.getenv('OPNREQ_WATCH')) == 'flag' else 'kill'
+    watch_run(pid, os.getcwd(), BASELINE_DIR, hour_groups, CMP_DATAONLY, action)
+
+if __name__ == "__main__":
+    main()
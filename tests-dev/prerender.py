@@ -0,0 +1,50 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+PRERENDER_DIR = 'prerender'
+
+def prerender_test(PATHRT, RUNDIR_ROOT, TEST_NAME, TEST_ID, COMPILE_ID):
+    """Write run script and configuration files of a test
+
+    Runs run_test.sh with RT_PRERENDER=render, which stops before staging
+    input data and submitting. The test job copies the files from
+    RUNDIR_ROOT/prerender/TEST_ID instead of rendering them.
+
+    Args:
+        PATHRT (str): Test directory
+        RUNDIR_ROOT (str): Test run directory
+        TEST_NAME (str): test name e.g. control_c48
+        TEST_ID (str): test identifier e.g. control_c48_intel
+        COMPILE_ID (str): compile providing the executable
+
+    Returns:
+        bool: True when the files were written
+    """
+    env = dict(os.environ, RT_PRERENDER='render')
+    with open(RUNDIR_ROOT+'/'+PRERENDER_DIR+'/'+TEST_ID+'.log', 'w') as flog:
+        rc = subprocess.call(['bash', PATHRT+'/run_test.sh', PATHRT, RUNDIR_ROOT, TEST_NAME, TEST_ID, COMPILE_ID],
+                             env=env, cwd=PATHRT, stdout=flog, stderr=subprocess.STDOUT)
+    return rc == 0
+
+def prerender_tests(PATHRT, RUNDIR_ROOT, prerender_list, max_workers=8):
+    """Write run directory files of all tests in parallel before submission
+
+    Args:
+        PATHRT (str): Test directory
+        RUNDIR_ROOT (str): Test run directory
+        prerender_list (list): (TEST_NAME, TEST_ID, COMPILE_ID) of each test
+        max_workers (int): tests rendered at the same time
+
+    Returns:
+        int: number of tests whose files were written
+    """
+    os.makedirs(RUNDIR_ROOT+'/'+PRERENDER_DIR, exist_ok=True)
+    max_workers = max(1, min(max_workers, os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rendered = list(executor.map(lambda test: prerender_test(PATHRT, RUNDIR_ROOT, *test), prerender_list))
+    for test, ok in zip(prerender_list, rendered):
+        if not ok:
+            print(f"Pre-render of {test[1]} failed, its job sets up the run directory: "
+                  f"{RUNDIR_ROOT}/{PRERENDER_DIR}/{test[1]}.log")
+    return sum(rendered)
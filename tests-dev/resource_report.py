@@ -0,0 +1,177 @@
+import os
+import heapq
+import yaml
+from ufs_test_utils import get_testcase, machine_check_off, get_compile_aliases, get_logtimes
+from opnreq_cases import get_test_id, get_case_dep, get_case_settings
+from node_packing import get_test_resources, get_machine_tpn
+from rocoto_shards import DEFAULT_COMPILE_TIME, DEFAULT_TEST_TIME
+from create_xml import FIXED_BUILD_MACHINES, get_build_resources, get_taskthrottle
+
+TOP_CONSUMERS = 10
+
+def get_history(PATHRT, MACHINE_ID):
+    """Compile and test times of earlier runs on a machine
+
+    Times of the tests-dev log take precedence over the tests/logs log.
+
+    Args:
+        PATHRT (str): Test directory
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+
+    Returns:
+        dict, dict: compile and test identifiers mapped to the [total, run] times in seconds
+    """
+    compile_times, test_times = {}, {}
+    PATHTR, tail = os.path.split(PATHRT)
+    for log_dir in [PATHTR+'/tests/logs', PATHRT+'/logs']:
+        log_compile_times, log_test_times = get_logtimes(log_dir+'/RegressionTests_'+MACHINE_ID+'.log')
+        compile_times.update(log_compile_times)
+        test_times.update(log_test_times)
+    return compile_times, test_times
+
+def get_workflow_jobs(rt_yaml, PATHRT, MACHINE_ID, CREATE_BASELINE='false', COMPILE_ONLY='false'):
+    """Compile and test jobs xml_loop would write to the Rocoto workflow
+
+    Args:
+        rt_yaml (dict): test yaml configuration
+        PATHRT (str): Test directory
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        CREATE_BASELINE (str): true when creating baselines, tests with a dependency are skipped
+        COMPILE_ONLY (str): true when only compiling
+
+    Returns:
+        list: jobs in workflow order, each a dict of kind, name, tasks, nodes,
+              walltime in seconds, runtime in seconds, history and deps
+    """
+    compile_times, test_times = get_history(PATHRT, MACHINE_ID)
+    compile_aliases = get_compile_aliases(rt_yaml, MACHINE_ID)
+    TPN = get_machine_tpn(PATHRT) if MACHINE_ID not in FIXED_BUILD_MACHINES else 0
+    jobs_list = []
+    for apps, jobs in rt_yaml.items():
+        build = jobs['build']
+        if not machine_check_off(MACHINE_ID, build):
+            continue
+        RT_COMPILER = str(build['compiler'])
+        BUILD_ID = compile_aliases.get(apps, apps)
+        if apps not in compile_aliases:
+            BUILD_CORES, BUILD_WALLTIME = get_build_resources(MACHINE_ID, apps, TPN)
+            hours, minutes, seconds = (int(field) for field in BUILD_WALLTIME.split(':'))
+            jobs_list.append({'kind': 'COMPILE', 'name': 'compile_'+apps, 'tasks': int(BUILD_CORES), 'nodes': 1,
+                              'walltime': hours*3600+minutes*60+seconds,
+                              'runtime': compile_times.get(apps, [DEFAULT_COMPILE_TIME])[0],
+                              'history': apps in compile_times, 'deps': []})
+        if COMPILE_ONLY == 'true':
+            continue
+        for test in jobs.get('tests', []):
+            TEST_NAME, config = get_testcase(test)
+            if not machine_check_off(MACHINE_ID, config):
+                continue
+            TEST_ID = get_test_id(TEST_NAME, RT_COMPILER, config)
+            OPNREQ_CASE = config.get('opnreq')
+            settings = None
+            if OPNREQ_CASE:
+                settings = get_case_settings(PATHRT, TEST_NAME, OPNREQ_CASE)
+                if settings is None:
+                    continue
+                DEP_RUN = get_case_dep(TEST_NAME, RT_COMPILER, OPNREQ_CASE)
+            elif 'dependency' in config:
+                DEP_RUN = str(config['dependency'])+'_'+RT_COMPILER
+            else:
+                DEP_RUN = ''
+            if CREATE_BASELINE == 'true' and not OPNREQ_CASE and DEP_RUN != '':
+                continue
+            resources = get_test_resources(PATHRT, TEST_NAME, settings)
+            #--- operational requirement runs take about as long as their base test ---
+            base_time = test_times.get(TEST_NAME+'_'+RT_COMPILER)
+            runtime = test_times.get(TEST_ID, base_time)
+            jobs_list.append({'kind': 'TEST', 'name': TEST_ID, 'tasks': resources['TASKS'],
+                              'nodes': resources['NODES'], 'walltime': resources['WLCLK']*60,
+                              'runtime': runtime[0] if runtime else DEFAULT_TEST_TIME,
+                              'history': runtime is not None,
+                              'deps': ['compile_'+BUILD_ID]+([DEP_RUN] if DEP_RUN else [])})
+    return jobs_list
+
+def predict_makespan(jobs_list, throttle):
+    """Predict the time to run a workflow limited to a number of active tasks
+
+    Jobs are started in workflow order once their dependencies are done,
+    as rocotorun submits them, and take their historical runtime.
+
+    Args:
+        jobs_list (list): jobs from get_workflow_jobs
+        throttle (int): tasks queued or running at the same time
+
+    Returns:
+        int: predicted time in seconds
+    """
+    names = set(job['name'] for job in jobs_list)
+    pending = list(jobs_list)
+    running = []
+    done = set()
+    now = 0
+    while pending or running:
+        for job in list(pending):
+            if len(running) >= throttle:
+                break
+            if all(dep in done or dep not in names for dep in job['deps']):
+                heapq.heappush(running, (now+job['runtime'], job['name']))
+                pending.remove(job)
+        if not running:
+            break
+        now, name = heapq.heappop(running)
+        done.add(name)
+    return now
+
+def format_time(seconds):
+    """Format seconds as hours and minutes
+
+    Args:
+        seconds (int): time in seconds
+
+    Returns:
+        str: e.g. 1:05
+    """
+    minutes = int(seconds+59)//60
+    return f"{minutes//60}:{minutes%60:02d}"
+
+def write_report(jobs_list, throttle, MACHINE_ID):
+    """Print the resources of the jobs, their totals and the top consumers
+
+    Args:
+        jobs_list (list): jobs from get_workflow_jobs
+        throttle (int): tasks queued or running at the same time
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+    """
+    print(f"Resource report for {MACHINE_ID}, times in h:mm, * no earlier run, default runtime used")
+    print(f"{'JOB':8} {'NAME':52} {'TASKS':>6} {'NODES':>5} {'WALLTIME':>8} {'RUNTIME':>8} {'NODE-HOURS':>10}")
+    for job in jobs_list:
+        job['node_hours'] = job['nodes']*job['runtime']/3600
+        print(f"{job['kind']:8} {job['name']:52} {job['tasks']:>6} {job['nodes']:>5} {format_time(job['walltime']):>8} "
+              f"{format_time(job['runtime'])+('' if job['history'] else '*'):>8} {job['node_hours']:>10.2f}")
+    compiles = [job for job in jobs_list if job['kind'] == 'COMPILE']
+    tests    = [job for job in jobs_list if job['kind'] == 'TEST']
+    node_hours = sum(job['node_hours'] for job in jobs_list)
+    requested  = sum(job['nodes']*job['walltime']/3600 for job in jobs_list)
+    print()
+    print(f"{len(compiles)} compiles, {len(tests)} tests, {sum(job['nodes'] for job in tests)} test nodes")
+    print(f"Node-hours: {node_hours:.2f} predicted, {requested:.2f} requested walltime")
+    print(f"Predicted makespan with taskthrottle {throttle}: {format_time(predict_makespan(jobs_list, throttle))}")
+    print()
+    print(f"Top {TOP_CONSUMERS} consumers:")
+    for job in sorted(jobs_list, key=lambda job: job['node_hours'], reverse=True)[:TOP_CONSUMERS]:
+        print(f"  {job['name']:52} {job['node_hours']:>8.2f} node-hours {100*job['node_hours']/max(node_hours, 1e-9):5.1f}%")
+
+def resource_report():
+    """Report the resources of the tests in UFS_TEST_YAML without running them
+
+    Shards run as separate workflows sharing the task throttle.
+    """
+    PATHRT     = str(os.getenv('PATHRT'))
+    MACHINE_ID = str(os.getenv('MACHINE_ID'))
+    UFS_TEST_YAML = str(os.getenv('UFS_TEST_YAML'))
+    ROCOTO_SHARDS = int(os.getenv('ROCOTO_SHARDS', '1'))
+    with open(UFS_TEST_YAML, 'r') as f:
+        rt_yaml = yaml.load(f, Loader=yaml.FullLoader)
+    jobs_list = get_workflow_jobs(rt_yaml, PATHRT, MACHINE_ID, str(os.getenv('CREATE_BASELINE')),
+                                  str(os.getenv('COMPILE_ONLY')))
+    write_report(jobs_list, get_taskthrottle(ROCOTO_SHARDS)*ROCOTO_SHARDS, MACHINE_ID)
@@ -0,0 +1,213 @@
+import os
+import hashlib
+from datetime import datetime
+import yaml
+
+RESULT_STATUS = 'result_status.yaml'
+#--- scripts rendering and checking every test ---
+TEST_SCRIPTS = ['default_vars.sh', 'run_test.sh', 'rt_utils.sh', 'atparse.bash']
+#--- every file run_test.sh renders or copies, by variable, default or fixed name, is in these trees ---
+CONFIG_DIRS = ['parm', 'fv3_conf']
+#--- digest of the configuration trees by test directory ---
+config_digests = {}
+
+def get_baseline_manifest(RTPWD, TEST_ID):
+    """Describe the baseline files of a test without reading them
+
+    Args:
+        RTPWD (str): baseline directory
+        TEST_ID (str): test identifier e.g. control_c48_intel
+
+    Returns:
+        list: relative path, size and modification time of each baseline file
+    """
+    manifest = []
+    baseline_dir = RTPWD+'/'+TEST_ID
+    for dirpath, dirnames, filenames in os.walk(baseline_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            stat = os.stat(os.path.join(dirpath, filename))
+            manifest.append(f"{os.path.relpath(os.path.join(dirpath, filename), baseline_dir)} "
+                            f"{stat.st_size} {stat.st_mtime_ns}")
+    return manifest
+
+def get_config_digest(PATHRT):
+    """Digest of the configuration trees of the tests
+
+    Hashing the whole trees covers the templates of subdirectories like
+    diag_table, the defaults run_test.sh falls back to and the files it
+    copies by fixed name. It is computed once per process.
+
+    Args:
+        PATHRT (str): Test directory
+
+    Returns:
+        str: digest of the path and contents of every file in CONFIG_DIRS
+    """
+    if PATHRT in config_digests:
+        return config_digests[PATHRT]
+    digest = hashlib.sha256()
+    for config_dir in CONFIG_DIRS:
+        top = PATHRT+'/'+config_dir
+        for dirpath, dirnames, filenames in os.walk(top, followlinks=True):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                digest.update(os.path.relpath(os.path.join(dirpath, filename), PATHRT).encode()+b'\0')
+                with open(os.path.join(dirpath, filename), 'rb') as fconf:
+                    digest.update(fconf.read())
+    config_digests[PATHRT] = digest.hexdigest()
+    return config_digests[PATHRT]
+
+def get_result_key(build_key, PATHRT, TEST_NAME, TEST_ID, RTPWD, dep_key=''):
+    """Generate result cache key of a test
+
+    The executable is identified by its build key, the rendered run
+    directory by the variables the test sets, the scripts and the
+    configuration trees, the input data by the dated input directory
+    paths and the baseline by its manifest.
+
+    Args:
+        build_key (str): build cache key of the executable
+        PATHRT (str): Test directory
+        TEST_NAME (str): test name e.g. control_c48
+        TEST_ID (str): test identifier e.g. control_c48_intel
+        RTPWD (str): baseline directory
+        dep_key (str): result key of the test providing the restart files
+
+    Returns:
+        str: result cache key
+    """
+    from opnreq_cases import read_test_vars
+    result_key = hashlib.sha256()
+    result_key.update(f"{build_key} {dep_key} {TEST_ID} {os.getenv('MACHINE_ID')} "
+                      f"{os.getenv('skip_check_results')}".encode())
+    for name in ['INPUTDATA_ROOT', 'INPUTDATA_ROOT_WW3', 'INPUTDATA_ROOT_BMIC']:
+        result_key.update(f"{name}={os.getenv(name)}\n".encode())
+    #--- variables inherited unchanged from the environment are not part of the test ---
+    test_vars = read_test_vars(PATHRT, TEST_NAME)
+    for name, value in sorted(test_vars.items()):
+        if os.environ.get(name) == value:
+            continue
+        result_key.update(f"{name}={value}\n".encode())
+    result_key.update(get_config_digest(PATHRT).encode())
+    for config_file in [PATHRT+'/'+name for name in TEST_SCRIPTS]+[PATHRT+'/tests/'+TEST_NAME]:
+        if os.path.isfile(config_file):
+            with open(config_file, 'rb') as fconf:
+                result_key.update(fconf.read())
+    for line in get_baseline_manifest(RTPWD, TEST_ID):
+        result_key.update((line+'\n').encode())
+    return result_key.hexdigest()
+
+def lookup_result(RESULT_CACHE_DIR, result_key):
+    """Find the passing result of an earlier run of a test
+
+    Args:
+        RESULT_CACHE_DIR (str): result cache directory
+        result_key (str): result cache key
+
+    Returns:
+        dict: stored result, None when the test has not passed with this key
+    """
+    result_file = RESULT_CACHE_DIR+'/'+result_key+'.yaml'
+    if not os.path.isfile(result_file):
+        return None
+    with open(result_file) as fresult:
+        return yaml.load(fresult, Loader=yaml.FullLoader)
+
+def store_result(RESULT_CACHE_DIR, result_key, TEST_ID, etime, rtime, memsize):
+    """Save the passing result of a test into the cache
+
+    Args:
+        RESULT_CACHE_DIR (str): result cache directory
+        result_key (str): result cache key
+        TEST_ID (str): test identifier e.g. control_c48_intel
+        etime (int): script time in seconds
+        rtime (int): run phase time in seconds
+        memsize (str): maximum resident set size in MB
+    """
+    result = {'TEST_ID': TEST_ID, 'RESULT': 'PASS', 'ETIME': int(etime), 'RTIME': int(rtime),
+              'MEMSIZE': memsize, 'DATE': datetime.now().strftime("%Y%m%d %H:%M:%S")}
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    #--- rename a complete file, so readers never see a partial result ---
+    tmp_file = RESULT_CACHE_DIR+'/'+result_key+'.tmp'+str(os.getpid())
+    with open(tmp_file, 'w') as fresult:
+        yaml.dump(result, fresult)
+    os.replace(tmp_file, RESULT_CACHE_DIR+'/'+result_key+'.yaml')
+
+def plan_cached_results(PATHRT, tests, RT_COMPILER, MACHINE_ID, build_key, RTPWD, RESULT_CACHE_DIR, result_status):
+    """Find the tests of a compile whose passing result can be reused
+
+    A test providing the restart files of a test that runs is run too.
+    Operational requirement cases are always run.
+
+    Args:
+        PATHRT (str): Test directory
+        tests (list): tests of the compile in the test yaml
+        RT_COMPILER (str): compiler e.g. intel, gnu
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        build_key (str): build cache key of the executable
+        RTPWD (str): baseline directory
+        RESULT_CACHE_DIR (str): result cache directory
+        result_status (dict): test identifier mapped to its result key and cached result, updated
+
+    Returns:
+        set: identifiers of the tests to skip
+    """
+    from ufs_test_utils import get_testcase, machine_check_off
+    from opnreq_cases import get_test_id, get_case_dep
+    result_keys = {}
+    depends_on  = {}
+    cached = {}
+    for test in tests:
+        TEST_NAME, config = get_testcase(test)
+        if not machine_check_off(MACHINE_ID, config):
+            continue
+        TEST_ID = get_test_id(TEST_NAME, RT_COMPILER, config)
+        if config.get('opnreq'):
+            depends_on[TEST_ID] = get_case_dep(TEST_NAME, RT_COMPILER, config['opnreq'])
+            continue
+        DEP_RUN = str(config['dependency'])+'_'+RT_COMPILER if 'dependency' in config else ''
+        depends_on[TEST_ID] = DEP_RUN
+        #--- a test without the key of the test it restarts from cannot be identified ---
+        if DEP_RUN and DEP_RUN not in result_keys:
+            continue
+        result_keys[TEST_ID] = get_result_key(build_key, PATHRT, TEST_NAME, TEST_ID, RTPWD, result_keys.get(DEP_RUN, ''))
+        result = lookup_result(RESULT_CACHE_DIR, result_keys[TEST_ID])
+        if result is not None:
+            cached[TEST_ID] = result
+    skipped = set(cached)
+    changed = True
+    while changed:
+        needed = set(DEP_RUN for TEST_ID, DEP_RUN in depends_on.items() if TEST_ID not in skipped)
+        changed = bool(skipped & needed)
+        skipped -= needed
+    for TEST_ID, result_key in result_keys.items():
+        result_status[TEST_ID] = {'key': result_key, 'cache_dir': RESULT_CACHE_DIR}
+        if TEST_ID in skipped:
+            result_status[TEST_ID]['cached'] = cached[TEST_ID]
+    return skipped
+
+def write_result_status(RUNDIR_ROOT, result_status):
+    """Record the result key of each test of this run and whether its result was reused
+
+    Args:
+        RUNDIR_ROOT (str): Test run directory
+        result_status (dict): test identifier mapped to its result key and cached result
+    """
+    with open(RUNDIR_ROOT+'/'+RESULT_STATUS, 'w') as fstatus:
+        yaml.dump(result_status, fstatus)
+
+def read_result_status(RUNDIR_ROOT):
+    """Read result status written during workflow generation
+
+    Args:
+        RUNDIR_ROOT (str): Test run directory
+
+    Returns:
+        dict: test identifier mapped to its result key and cached result
+    """
+    status_file = RUNDIR_ROOT+'/'+RESULT_STATUS
+    if not os.path.isfile(status_file):
+        return {}
+    with open(status_file) as fstatus:
+        return yaml.load(fstatus, Loader=yaml.FullLoader) or {}
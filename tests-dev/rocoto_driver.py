@@ -0,0 +1,322 @@
+import os
+import re
+import sys
+import time
+import random
+import sqlite3
+import subprocess
+from job_phases import record_phase
+
+ROCOTO_CYCLE    = 0   # 197001010000 in seconds since epoch, as stored in the Rocoto database
+ACTIVE_STATES   = ['SUBMITTING', 'QUEUED', 'RUNNING', 'UNKNOWN']
+SUBMIT_STATES   = ['SUBMITTING', 'QUEUED']
+FAILED_STATES   = ['FAILED', 'DEAD', 'LOST']
+#--- tasks are written with maxtries 1, transient failures are retried here ---
+RETRY_MAXTRIES  = 3
+#--- exit status of a job killed by the scheduler with SIGKILL or SIGTERM ---
+SCHEDULER_SIGNALS = [128+9, 128+15]
+
+def read_jobs(ROCOTO_DB):
+    """Read state of the workflow jobs from the Rocoto database
+
+    Args:
+        ROCOTO_DB (str): Rocoto database filename
+
+    Returns:
+        dict: task name mapped to its state, jobid, tries and exit status;
+              None when the database can not be read
+    """
+    if not os.path.isfile(ROCOTO_DB):
+        return None
+    try:
+        con = sqlite3.connect('file:'+ROCOTO_DB+'?mode=ro', uri=True, timeout=30)
+        try:
+            rows = con.execute("SELECT taskname, state, jobid, tries, exit_status FROM jobs "
+                               "WHERE cycle = ?", (ROCOTO_CYCLE,)).fetchall()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return None
+    jobs = {}
+    for taskname, state, jobid, tries, exit_status in rows:
+        jobs[taskname] = {'state': state, 'jobid': jobid, 'tries': tries,
+                          'exit_status': exit_status}
+    return jobs
+
+def read_cycle_done(ROCOTO_DB):
+    """Check in the Rocoto database whether the workflow cycle is done
+
+    Args:
+        ROCOTO_DB (str): Rocoto database filename
+
+    Returns:
+        bool: True when Rocoto marked the cycle done
+    """
+    if not os.path.isfile(ROCOTO_DB):
+        return False
+    try:
+        con = sqlite3.connect('file:'+ROCOTO_DB+'?mode=ro', uri=True, timeout=30)
+        try:
+            row = con.execute("SELECT done FROM cycles WHERE cycle = ?", (ROCOTO_CYCLE,)).fetchone()
+        finally:
+            con.close()
+    except sqlite3.Error:
+        return False
+    return row is not None and bool(row[0])
+
+def job_events(old_jobs, new_jobs):
+    """Compare two database reads and generate task state transitions
+
+    Args:
+        old_jobs (dict): previous read_jobs result
+        new_jobs (dict): current read_jobs result
+
+    Yields:
+        tuple: task name, previous state (None for a new job), current state, job
+    """
+    for taskname, job in new_jobs.items():
+        old_job = old_jobs.get(taskname)
+        old_state = old_job['state'] if old_job else None
+        if old_state != job['state'] or (old_job and old_job['tries'] != job['tries']):
+            yield taskname, old_state, job['state'], job
+
+def job_name(taskname):
+    """Job name of a task, as used for the log files of run_compile.sh and run_test.sh
+
+    Args:
+        taskname (str): Rocoto task name e.g. compile_atm_intel, control_c48_intel
+
+    Returns:
+        str: job name e.g. compile_atm_intel, run_control_c48_intel
+    """
+    if taskname.startswith('compile_'):
+        return taskname
+    return 'run_'+taskname
+
+def job_finished(taskname, LOG_DIR, since=0.0):
+    """Check whether the script of a task has written its end time
+
+    run_compile.sh and run_test.sh append the end time and node count as the
+    last fields of their timestamp file, so a complete file means the job is
+    about to leave the queue and free its slot. The log directory is kept
+    across runs, a file last written before the job was submitted is left
+    by an earlier run.
+
+    Args:
+        taskname (str): Rocoto task name e.g. compile_atm_intel, control_c48_intel
+        LOG_DIR (str): log directory of the tests
+        since (float): seconds since epoch the job was first seen submitted
+
+    Returns:
+        bool: True when the task wrote its end time
+    """
+    filename = LOG_DIR+'/'+job_name(taskname)+'_timestamp.txt'
+    try:
+        if os.path.getmtime(filename) < since:
+            return False
+        with open(filename) as ftime:
+            return len(ftime.read().split(',')) >= 6
+    except OSError:
+        return False
+
+def failed_pack_members(taskname, LOG_DIR):
+    """Job names of the tests that failed in a try of a node pack
+
+    run_packed.sh reports every failed test in the log of the pack.
+
+    Args:
+        taskname (str): Rocoto task name of the pack e.g. pack_atm_intel_1
+        LOG_DIR (str): log directory of the tests
+
+    Returns:
+        list: job names e.g. run_control_c48_intel, empty when the pack did not finish
+    """
+    try:
+        with open(LOG_DIR+'/'+taskname+'.log', errors='replace') as flog:
+            text = flog.read()
+    except OSError:
+        return []
+    return ['run_'+TEST_ID for TEST_ID in re.findall(r'^(\S+) failed in pack$', text, re.MULTILINE)]
+
+def is_transient(taskname, job, LOG_DIR, RUNDIR_ROOT):
+    """Classify the failure of a task from its logs and exit status
+
+    A node pack is classified by the logs of the tests that failed in it,
+    and is tried again when all of them failed transiently.
+
+    Args:
+        taskname (str): Rocoto task name e.g. compile_atm_intel, control_c48_intel
+        job (dict): job from read_jobs
+        LOG_DIR (str): log directory of the tests
+        RUNDIR_ROOT (str): Test run directory
+
+    Returns:
+        bool, str: True when trying again may succeed, and the failure class
+    """
+    from failure_triage import classify_job
+    from node_packing import PACK_PREFIX
+    JBNMES = [job_name(taskname)]
+    if taskname.startswith(PACK_PREFIX):
+        JBNMES = failed_pack_members(taskname, LOG_DIR) or JBNMES
+    transient = True
+    failures = []
+    for JBNME in JBNMES:
+        failure = classify_job(LOG_DIR, RUNDIR_ROOT, JBNME)
+        if failure['class'] == 'unknown':
+            #--- only a job lost or killed by the scheduler without a message likely lost its node ---
+            exit_status = job['exit_status']
+            transient = transient and (exit_status is None or exit_status in SCHEDULER_SIGNALS)
+        else:
+            transient = transient and failure['route'] == 'retry'
+        if failure['class'] not in failures:
+            failures.append(failure['class'])
+    return transient, ', '.join(failures)
+
+def rocotorewind(ROCOTO_XML, ROCOTO_DB, taskname):
+    """Reset a task, so the next rocotorun submits it again
+
+    Args:
+        ROCOTO_XML (str): Rocoto .xml filename
+        ROCOTO_DB (str): Rocoto database filename
+        taskname (str): Rocoto task name
+    """
+    ROCOTOREWIND = os.path.dirname(str(os.getenv('ROCOTORUN')))+'/rocotorewind'
+    cycle = time.strftime('%Y%m%d%H%M', time.gmtime(ROCOTO_CYCLE))
+    subprocess.run([ROCOTOREWIND, '-w', ROCOTO_XML, '-d', ROCOTO_DB, '-c', cycle, '-t', taskname],
+                   check=True, stdout=subprocess.DEVNULL)
+
+def rocotorun(ROCOTO_XML, ROCOTO_DB):
+    """Run one iteration of rocotorun
+
+    Args:
+        ROCOTO_XML (str): Rocoto .xml filename
+        ROCOTO_DB (str): Rocoto database filename
+    """
+    ROCOTORUN = os.getenv('ROCOTORUN')
+    subprocess.run([ROCOTORUN, '-v', '10', '-w', ROCOTO_XML, '-d', ROCOTO_DB],
+                   check=True, stdout=subprocess.DEVNULL)
+
+def drive_workflow(ROCOTO_XML, ROCOTO_DB, LOG_DIR, naptime=15, max_idle=300,
+                   max_time=3600, max_step_attempts=100):
+    """Run a Rocoto workflow until it is complete, generating task state transitions
+
+    The database is polled every naptime seconds. rocotorun is only called
+    when the database was changed by someone else, an active job finished,
+    or max_idle seconds passed, which catches jobs killed by the scheduler.
+    A job triggers rocotorun once when it finishes, until it is submitted again.
+
+    Args:
+        ROCOTO_XML (str): Rocoto .xml filename
+        ROCOTO_DB (str): Rocoto database filename
+        LOG_DIR (str): log directory of the tests
+        naptime (int): seconds between database polls
+        max_idle (int): maximum seconds between rocotorun calls
+        max_time (int): seconds to wait for Rocoto to start working again
+        max_step_attempts (int): failed rocotorun calls before giving up
+
+    Yields:
+        tuple: task name, previous state, current state, job
+
+    Raises:
+        RuntimeError: when rocotorun keeps failing
+    """
+    jobs = {}
+    db_mtime = None
+    last_run = None
+    #--- time each job was first seen submitted, and the jobs that triggered rocotorun when they finished ---
+    submitted = {}
+    finished = set()
+    while True:
+        now = time.time()
+        active = [taskname for taskname, job in jobs.items()
+                  if job['state'] in ACTIVE_STATES and taskname not in finished]
+        finished_now = [taskname for taskname in active if job_finished(taskname, LOG_DIR, submitted[taskname])]
+        finished.update(finished_now)
+        trigger = (last_run is None or now-last_run >= max_idle
+                   or (os.path.isfile(ROCOTO_DB) and os.path.getmtime(ROCOTO_DB) != db_mtime)
+                   or bool(finished_now))
+        if trigger:
+            #--- exponential backoff to handle temporary system failures breaking Rocoto ---
+            start_time = time.time()
+            for step_attempts in range(1, max_step_attempts+1):
+                try:
+                    rocotorun(ROCOTO_XML, ROCOTO_DB)
+                except (OSError, subprocess.CalledProcessError):
+                    if (time.time()-start_time > max_time or step_attempts >= max_step_attempts):
+                        raise RuntimeError(f"Rocoto commands failed {step_attempts} times "
+                                           f"for {(time.time()-start_time+30)//60:.0f} minutes")
+                    time.sleep(naptime * 2**((step_attempts-1)%4) * random.random())
+                else:
+                    break
+            last_run = time.time()
+        read_time = time.time()
+        new_jobs = read_jobs(ROCOTO_DB)
+        if new_jobs is not None:
+            #--- a task rewound while handling the events changes the database again ---
+            db_mtime = os.path.getmtime(ROCOTO_DB)
+            old_jobs, jobs = jobs, new_jobs
+            for taskname, old_state, state, job in job_events(old_jobs, new_jobs):
+                old_job = old_jobs.get(taskname)
+                if state in ACTIVE_STATES and (old_state not in ACTIVE_STATES or old_job['tries'] != job['tries']):
+                    submitted[taskname] = read_time
+                    finished.discard(taskname)
+                yield taskname, old_state, state, job
+        if read_cycle_done(ROCOTO_DB):
+            return
+        time.sleep(naptime)
+
+def run_workflow(ROCOTO_XML=None, ROCOTO_DB=None, ROCOTO_STATE=None):
+    """Run a Rocoto workflow until it is complete and log its task state transitions
+
+    Args:
+        ROCOTO_XML (str): Rocoto .xml filename. Defaults to $ROCOTO_XML.
+        ROCOTO_DB (str): Rocoto database filename. Defaults to $ROCOTO_DB.
+        ROCOTO_STATE (str): workflow state filename. Defaults to $ROCOTO_STATE.
+
+    Returns:
+        bool: True when the workflow completed
+    """
+    PATHRT       = str(os.getenv('PATHRT'))
+    MACHINE_ID   = str(os.getenv('MACHINE_ID'))
+    ROCOTO_XML   = ROCOTO_XML or str(os.getenv('ROCOTO_XML'))
+    ROCOTO_DB    = ROCOTO_DB or str(os.getenv('ROCOTO_DB'))
+    ROCOTO_STATE = ROCOTO_STATE or str(os.getenv('ROCOTO_STATE'))
+    LOG_DIR      = PATHRT+'/logs/log_'+MACHINE_ID
+    RUNDIR_ROOT  = os.path.realpath(PATHRT+'/run_dir')
+    tries = {}
+    print(f"rocoto_driver.py: Running ROCOTO workflow {ROCOTO_XML}", flush=True)
+    with open(ROCOTO_STATE, 'w') as fstate:
+        fstate.write('Active\n')
+    try:
+        for taskname, old_state, state, job in drive_workflow(ROCOTO_XML, ROCOTO_DB, LOG_DIR):
+            print(f"{time.strftime('%H:%M:%S')} {taskname}: {old_state or 'NEW'} -> {state} "
+                  f"(jobid {job['jobid']}, try {tries.get(taskname, 1)})", flush=True)
+            #--- the queue wait of a job starts when Rocoto submitted it ---
+            if state in SUBMIT_STATES and old_state not in SUBMIT_STATES:
+                record_phase(LOG_DIR, job_name(taskname), 'submit', time.time())
+            #--- only failures of the node, file system or scheduler are tried again ---
+            if state in FAILED_STATES and old_state not in FAILED_STATES:
+                transient, failure = is_transient(taskname, job, LOG_DIR, RUNDIR_ROOT)
+                if transient and tries.get(taskname, 1) < RETRY_MAXTRIES:
+                    tries[taskname] = tries.get(taskname, 1)+1
+                    print(f"{time.strftime('%H:%M:%S')} {taskname}: {failure} is transient, "
+                          f"try {tries[taskname]} of {RETRY_MAXTRIES}", flush=True)
+                    try:
+                        rocotorewind(ROCOTO_XML, ROCOTO_DB, taskname)
+                    except (OSError, subprocess.CalledProcessError):
+                        print(f"{taskname} could not be rewound, not tried again", flush=True)
+                else:
+                    print(f"{time.strftime('%H:%M:%S')} {taskname}: {failure}, not tried again", flush=True)
+    except RuntimeError as e:
+        print(f"{e}. There may be something wrong with the node or the batch system.")
+        return False
+    with open(ROCOTO_STATE, 'w') as fstate:
+        fstate.write('Done\n')
+    print(f"Rocoto workflow {ROCOTO_XML} has completed.", flush=True)
+    return True
+
+def main():
+    """Run the Rocoto workflow of ufs_test.sh
+    """
+    if not run_workflow():
+        sys.exit("***Rocoto workflow trouble***")
@@ -0,0 +1,110 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from ufs_test_utils import get_testcase, machine_check_off, get_logtimes
+from rocoto_driver import run_workflow
+from opnreq_cases import get_test_id
+
+ROCOTO_SHARDS_FILE = 'rocoto_shards.yaml'
+DEFAULT_COMPILE_TIME = 900
+DEFAULT_TEST_TIME    = 600
+
+def predict_cost(apps, jobs, MACHINE_ID, compile_times, test_times):
+    """Predict the time a compile and its tests keep a workflow busy
+
+    Args:
+        apps (str): Compile identifier e.g. s2swa_intel
+        jobs (dict): build and tests configuration of the compile
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        compile_times (dict): previous compile times from get_logtimes
+        test_times (dict): previous test times from get_logtimes
+
+    Returns:
+        int: predicted cost in seconds
+    """
+    build = jobs['build']
+    if not machine_check_off(MACHINE_ID, build):
+        return 0
+    cost = compile_times.get(apps, [DEFAULT_COMPILE_TIME])[0]
+    for test in jobs.get('tests', []):
+        case, config = get_testcase(test)
+        if machine_check_off(MACHINE_ID, config):
+            TEST_ID = get_test_id(case, str(build['compiler']), config)
+            #--- operational requirement runs take about as long as their base test ---
+            base_time = test_times.get(case+'_'+str(build['compiler']), [DEFAULT_TEST_TIME])
+            cost += test_times.get(TEST_ID, base_time)[0]
+    return cost
+
+def split_workflow(rt_yaml, compile_aliases, ROCOTO_XML, ROCOTO_SHARDS, MACHINE_ID, REGRESSIONTEST_LOG):
+    """Split test yaml into independent Rocoto workflows of similar cost
+
+    A compile stays in the same workflow as its tests and as the compiles
+    sharing its executable.
+
+    Args:
+        rt_yaml (dict): test yaml configuration
+        compile_aliases (dict): compile identifier mapped to the compile building it
+        ROCOTO_XML (str): Rocoto .xml filename of the unsharded workflow
+        ROCOTO_SHARDS (int): number of workflows to create
+        MACHINE_ID (str): Machine ID i.e. Hera, Gaea, Jet, etc.
+        REGRESSIONTEST_LOG (str): previous Regression Test log for predicting cost
+
+    Returns:
+        list: Rocoto xml filename, test yaml and workflow log name of each workflow
+    """
+    if ROCOTO_SHARDS <= 1:
+        return [(ROCOTO_XML, rt_yaml, 'workflow.log')]
+    compile_times, test_times = get_logtimes(REGRESSIONTEST_LOG)
+    units = {}
+    for apps, jobs in rt_yaml.items():
+        owner = compile_aliases.get(apps, apps)
+        units.setdefault(owner, {'apps': [], 'cost': 0})
+        units[owner]['apps'].append(apps)
+        units[owner]['cost'] += predict_cost(apps, jobs, MACHINE_ID, compile_times, test_times)
+    #--- longest processing time first: largest unit goes to the least loaded shard ---
+    shard_cost = [0]*ROCOTO_SHARDS
+    shard_apps = [[] for n in range(ROCOTO_SHARDS)]
+    for owner in sorted(units, key=lambda unit: units[unit]['cost'], reverse=True):
+        n = shard_cost.index(min(shard_cost))
+        shard_cost[n] += units[owner]['cost']
+        shard_apps[n] += units[owner]['apps']
+    workflows = []
+    shard_list= []
+    xml_root  = os.path.splitext(ROCOTO_XML)[0]
+    for n in range(ROCOTO_SHARDS):
+        if len(shard_apps[n]) == 0:
+            continue
+        shard_xml  = xml_root+'_'+str(n+1)+'.xml'
+        shard_yaml = {apps: jobs for apps, jobs in rt_yaml.items() if apps in shard_apps[n]}
+        workflows.append((shard_xml, shard_yaml, 'workflow_'+str(n+1)+'.log'))
+        shard_list.append({'xml': shard_xml, 'db': xml_root+'_'+str(n+1)+'.db',
+                           'state': xml_root+'_'+str(n+1)+'.state', 'cost': shard_cost[n]})
+        print(f"Rocoto shard {n+1}: {len(shard_apps[n])} compiles, predicted {shard_cost[n]/3600:.2f} hours")
+    with open(os.path.dirname(ROCOTO_XML)+'/'+ROCOTO_SHARDS_FILE, 'w') as fshard:
+        yaml.dump(shard_list, fshard)
+    return workflows
+
+def read_shards(PATHRT):
+    """Read list of Rocoto workflows written by split_workflow
+
+    Args:
+        PATHRT (str): Test directory
+
+    Returns:
+        list: xml, database and state filenames of each workflow
+    """
+    with open(PATHRT+'/'+ROCOTO_SHARDS_FILE) as fshard:
+        return yaml.load(fshard, Loader=yaml.FullLoader)
+
+def run_shards():
+    """Run all Rocoto workflows concurrently until they are complete
+    """
+    PATHRT = str(os.getenv('PATHRT'))
+    shards = read_shards(PATHRT)
+    print(f"Running {len(shards)} Rocoto workflows")
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        completed = list(executor.map(lambda shard: run_workflow(shard['xml'], shard['db'], shard['state']),
+                                      shards))
+    if not all(completed):
+        sys.exit("***Rocoto workflow trouble***")
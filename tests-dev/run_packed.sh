@@ -0,0 +1,37 @@
+#!/bin/bash
+set -eux
+
+# Runs the tests of a node pack at the same time in one job allocation.
+# Usage: run_packed.sh PATHRT RUNDIR_ROOT LOG_DIR COMPILE_ID TEST_NAME:TEST_ID...
+# A test that passed in an earlier try of the pack is not run again.
+
+PATHRT=$1
+RUNDIR_ROOT=$2
+LOG_DIR=$3
+COMPILE_ID=$4
+shift 4
+
+# every srun of the job cards only takes the cores its test asks for
+export SLURM_EXACT=1
+
+declare -A test_pids
+for test in "$@"; do
+  TEST_NAME=${test%%:*}
+  TEST_ID=${test#*:}
+  [[ -f ${RUNDIR_ROOT}/packed_${TEST_ID}.done ]] && continue
+  ( set -o pipefail
+    "${PATHRT}"/run_test.sh "${PATHRT}" "${RUNDIR_ROOT}" "${TEST_NAME}" "${TEST_ID}" "${COMPILE_ID}" 2>&1 \
+      | tee "${LOG_DIR}/run_${TEST_ID}.log" > /dev/null ) &
+  test_pids[${TEST_ID}]=$!
+done
+
+pack_rc=0
+for TEST_ID in "${!test_pids[@]}"; do
+  if wait "${test_pids[${TEST_ID}]}"; then
+    touch "${RUNDIR_ROOT}/packed_${TEST_ID}.done"
+  else
+    echo "${TEST_ID} failed in pack"
+    pack_rc=1
+  fi
+done
+exit "${pack_rc}"
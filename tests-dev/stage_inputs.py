@@ -0,0 +1,260 @@
+import os
+import sys
+import stat
+import shutil
+import fnmatch
+
+INPUT_CACHE    = 'input_cache'
+INPUT_MANIFEST = 'input_manifest.txt'
+#--- files the components rewrite during the run are always copied ---
+COPY_PATTERNS  = ['rpointer.*', '*restart_file*', '*.pointer']
+NOT_STAGED     = 3
+
+def get_input_roots():
+    """Input data directories whose files can be shared between tests
+
+    Returns:
+        list: real paths of INPUTDATA_ROOT, INPUTDATA_ROOT_WW3 and INPUTDATA_ROOT_BMIC
+    """
+    roots = []
+    for name in ['INPUTDATA_ROOT', 'INPUTDATA_ROOT_WW3', 'INPUTDATA_ROOT_BMIC']:
+        root = os.getenv(name)
+        if root and os.path.isdir(root):
+            roots.append(os.path.realpath(root))
+    return roots
+
+def get_cache_path(src, roots, cache_dir):
+    """Location of an input file in the shared cache
+
+    Args:
+        src (str): input file or directory
+        roots (list): input data directories from get_input_roots
+        cache_dir (str): shared cache directory
+
+    Returns:
+        str: cache path, None when src is not in an input data directory
+    """
+    src = os.path.realpath(src)
+    for n, root in enumerate(roots):
+        if src == root or src.startswith(root+os.sep):
+            return os.path.join(cache_dir, str(n), os.path.relpath(src, root))
+    return None
+
+def cache_file(src, cached):
+    """Copy an input file into the shared cache unless it is already there
+
+    Cached files are read-only, so a test writing into a linked input
+    fails instead of changing the input of other tests.
+
+    Args:
+        src (str): input file
+        cached (str): cache path from get_cache_path
+    """
+    if os.path.isfile(cached):
+        return
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    tmp_file = cached+'.tmp'+str(os.getpid())
+    shutil.copy2(src, tmp_file)
+    os.chmod(tmp_file, os.stat(tmp_file).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+    os.replace(tmp_file, cached)
+
+def link_file(cached, dst):
+    """Materialize a cached input file in a run directory
+
+    Tries a hardlink, then a reflink, then a symlink. Files matching
+    COPY_PATTERNS are copied.
+
+    Args:
+        cached (str): cache path
+        dst (str): file in the run directory
+
+    Returns:
+        str: method used, one of hardlink, reflink, symlink, copy
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if any(fnmatch.fnmatch(os.path.basename(dst), pattern) for pattern in COPY_PATTERNS):
+        shutil.copyfile(cached, dst)
+        return 'copy'
+    try:
+        os.link(cached, dst)
+        return 'hardlink'
+    except OSError:
+        pass
+    import subprocess
+    if subprocess.call(['cp', '--reflink=always', cached, dst], stderr=subprocess.DEVNULL) == 0:
+        return 'reflink'
+    os.symlink(cached, dst)
+    return 'symlink'
+
+def stage_path(src, dst, roots, cache_dir, manifest):
+    """Stage an input file or directory tree through the shared cache
+
+    Args:
+        src (str): input file or directory
+        dst (str): target path in the run directory
+        roots (list): input data directories from get_input_roots
+        cache_dir (str): shared cache directory
+        manifest (list): (method, src, dst) of each staged file, appended to
+    """
+    if os.path.isdir(src):
+        os.makedirs(dst, exist_ok=True)
+        for name in sorted(os.listdir(src)):
+            stage_path(os.path.join(src, name), os.path.join(dst, name), roots, cache_dir, manifest)
+        return
+    cached = get_cache_path(src, roots, cache_dir)
+    if cached is None:
+        #--- symlink inside the input data pointing elsewhere ---
+        shutil.copy2(src, dst)
+        manifest.append(('copy', src, dst))
+        return
+    cache_file(src, cached)
+    manifest.append((link_file(cached, dst), src, dst))
+
+def parse_command(command, args):
+    """Sources and target of a cp or rsync command that can be staged
+
+    Handles the forms used by the fv3_conf run scripts: cp [-r] SRC... DST
+    and rsync -arv SRC/. DST.
+
+    Args:
+        command (str): cp or rsync
+        args (list): command arguments
+
+    Returns:
+        tuple: list of (source, target) pairs, None when the command can not be staged
+    """
+    options = [arg for arg in args if arg.startswith('-')]
+    paths   = [arg for arg in args if not arg.startswith('-')]
+    allowed = {'cp': 'rRfpv', 'rsync': 'arvlptgoD'}[command]
+    if len(paths) < 2 or any(option.startswith('--') or not set(option[1:]) <= set(allowed) for option in options):
+        return None
+    recursive = command == 'rsync' or any(set(option[1:]) & set('rR') for option in options)
+    srcs, dst = paths[:-1], paths[-1]
+    pairs = []
+    for src in srcs:
+        if not os.path.exists(src) or (os.path.isdir(src) and not recursive):
+            return None
+        if os.path.isdir(dst) or len(srcs) > 1:
+            #--- rsync SRC/. DST copies the content of SRC ---
+            if command == 'rsync' and (src.endswith('/.') or src.endswith('/')):
+                pairs.append((src, dst))
+            else:
+                pairs.append((src, os.path.join(dst, os.path.basename(os.path.normpath(src)))))
+        else:
+            pairs.append((src, dst))
+    return pairs
+
+def release_targets(pairs, staged):
+    """Remove staged files a command is about to overwrite
+
+    Staged files are read-only and may share their data with the cache,
+    so they are removed before cp or rsync writes a new file in their place.
+
+    Args:
+        pairs (list): (source, target) pairs from parse_command
+        staged (set): absolute paths of the files staged in the run directory
+    """
+    for src, dst in pairs:
+        if os.path.isdir(src):
+            targets = [os.path.join(dst, os.path.relpath(os.path.join(root, name), src))
+                       for root, dirs, files in os.walk(src) for name in files]
+        else:
+            targets = [dst]
+        for target in targets:
+            if os.path.abspath(target) in staged and os.path.lexists(target):
+                os.remove(target)
+
+def stage(command, args, roots, cache_dir, staged):
+    """Stage a cp or rsync command of a run script through the shared cache
+
+    Args:
+        command (str): cp or rsync
+        args (list): command arguments
+        roots (list): input data directories from get_input_roots
+        cache_dir (str): shared cache directory
+        staged (set): absolute paths of the files staged so far, updated
+
+    Returns:
+        list: (method, src, dst) of each staged file, None when the command
+              has to run as is
+    """
+    pairs = parse_command(command, args)
+    if pairs is None:
+        return None
+    if any(get_cache_path(src, roots, '') is None for src, dst in pairs):
+        release_targets(pairs, staged)
+        return None
+    manifest = []
+    for src, dst in pairs:
+        stage_path(src, dst, roots, cache_dir, manifest)
+    staged.update(os.path.abspath(dst) for method, src, dst in manifest)
+    return manifest
+
+def read_requests(fd):
+    """Commands sent by stage_inputs.sh
+
+    A request is a field count followed by that many NUL terminated
+    fields: working directory, command and its arguments.
+
+    Args:
+        fd (int): file descriptor to read from
+
+    Yields:
+        tuple: working directory, command, argument list
+    """
+    buffer = b''
+    fields = []
+    while True:
+        data = os.read(fd, 65536)
+        if not data:
+            return
+        buffer += data
+        *complete, buffer = buffer.split(b'\0')
+        fields += [os.fsdecode(field) for field in complete]
+        while fields and len(fields) > int(fields[0]):
+            count = int(fields[0])
+            request, fields = fields[1:count+1], fields[count+1:]
+            yield request[0], request[1], request[2:]
+
+def serve():
+    """Stage the cp and rsync commands of one test, in the order they run
+
+    The commands of the run scripts are answered one at a time, since
+    the scripts remove and copy over earlier inputs. Replies with the
+    exit code of each command, NOT_STAGED when it has to run as is.
+    Staged files are appended to INPUT_MANIFEST in RUNDIR.
+    """
+    RUNDIR_ROOT = os.getenv('RUNDIR_ROOT')
+    roots = get_input_roots()
+    staged = set()
+    with open(os.getenv('RUNDIR', '.')+'/'+INPUT_MANIFEST, 'a') as fmanifest:
+        for cwd, command, args in read_requests(sys.stdin.fileno()):
+            rc = NOT_STAGED
+            if RUNDIR_ROOT and roots and command in ['cp', 'rsync']:
+                try:
+                    os.chdir(cwd)
+                    manifest = stage(command, args, roots, RUNDIR_ROOT+'/'+INPUT_CACHE, staged)
+                except Exception as e:
+                    print(f"stage_inputs.py: {command} {' '.join(args)}: {e}", file=sys.stderr)
+                    rc = 1
+                else:
+                    if manifest is not None:
+                        for method, src, dst in manifest:
+                            fmanifest.write(f"{method} {src} {os.path.abspath(dst)}\n")
+                        fmanifest.flush()
+                        rc = 0
+            sys.stdout.write(f"{rc}\n")
+            sys.stdout.flush()
+
+def main():
+    """Serve the cp and rsync commands of a test through the shared cache
+
+    Usage: stage_inputs.py serve
+    """
+    if sys.argv[1:] != ['serve']:
+        sys.exit("Usage: stage_inputs.py serve")
+    serve()
+
+if __name__ == "__main__":
+    main()
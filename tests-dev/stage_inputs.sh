@@ -0,0 +1,41 @@
+#!/bin/bash
+# Sourced by run_test.sh before the input data of a test is copied when
+# STAGE_INPUTS=true. cp and rsync of files from the input data directories
+# link them from the shared cache in RUNDIR_ROOT; any other cp or rsync runs
+# as before. One stage_inputs.py process serves all commands of the test,
+# in order, and stage_inputs_end stops it.
+
+if command -v python3 >/dev/null 2>&1; then
+  coproc STAGE_INPUTS { python3 "${PATHRT}"/stage_inputs.py serve; }
+fi
+
+function stage_command {
+    local rc=3
+    if [[ -n ${STAGE_INPUTS[1]:-} ]]; then
+        trap '' PIPE
+        printf '%s\0' "$(( $# + 1 ))" "${PWD}" "$@" >&"${STAGE_INPUTS[1]}" &&
+            read -r rc <&"${STAGE_INPUTS[0]}" || rc=3
+        trap - PIPE
+    fi
+    if [[ ${rc} == 3 ]]; then
+        command "$@"
+    else
+        return "${rc}"
+    fi
+}
+
+function cp {
+    stage_command cp "$@"
+}
+
+function rsync {
+    stage_command rsync "$@"
+}
+
+function stage_inputs_end {
+    if [[ -n ${STAGE_INPUTS[1]:-} ]]; then
+        exec {STAGE_INPUTS[1]}>&-
+        wait "${STAGE_INPUTS_PID}" || true
+    fi
+    unset -f cp rsync stage_command stage_inputs_end
+}
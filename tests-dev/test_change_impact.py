@@ -0,0 +1,57 @@
+"""Tests of the test selection of change_impact.py
+
+Usage: python -m unittest test_change_impact
+"""
+import os
+import tempfile
+import unittest
+import change_impact
+
+def write_test(PATHTR, TEST_NAME, FV3_RUN):
+    """Write a test configuration setting FV3_RUN
+
+    Args:
+        PATHTR (str): Top directory of the checkout
+        TEST_NAME (str): test name
+        FV3_RUN (str): run scripts of the test, separated by spaces
+    """
+    with open(PATHTR+'/tests/tests/'+TEST_NAME, 'w') as ftest:
+        ftest.write(f'export TEST_DESCR="{TEST_NAME}"\nexport FV3_RUN="{FV3_RUN}"\n')
+
+class ImpactedYamlTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.PATHTR = self.tmpdir.name
+        os.makedirs(self.PATHTR+'/tests/tests')
+        with open(self.PATHTR+'/tests/default_vars.sh', 'w') as fvars:
+            fvars.write('export FV3_RUN=""\n')
+        write_test(self.PATHTR, 'control_p8', 'control_run.IN')
+        write_test(self.PATHTR, 'control_p8_atmlnd', 'control_run.IN noahmp_run.IN')
+        write_test(self.PATHTR, 'datm_cdeps_lnd', 'datm_cdeps_run.IN noahmp_run.IN')
+        write_test(self.PATHTR, 'hafs_regional', 'hafs_fv3_run.IN')
+        self.rt_yaml = {'atm_intel': {'build': {'compiler': 'intel', 'option': '-DAPP=ATM'},
+                                      'tests': [{'control_p8': {'project': ['daily']}},
+                                                {'control_p8_atmlnd': {'project': ['daily']}},
+                                                {'hafs_regional': {'project': ['daily']}}]},
+                        'datm_intel': {'build': {'compiler': 'intel', 'option': '-DAPP=LND'},
+                                       'tests': [{'datm_cdeps_lnd': {'project': ['daily']}}]}}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def selected(self, changed_paths):
+        new_yaml = change_impact.impacted_yaml(self.rt_yaml, self.PATHTR, changed_paths)
+        return {apps: [list(test)[0] for test in jobs['tests']] for apps, jobs in new_yaml.items()}
+
+    def test_several_fv3_run_files(self):
+        self.assertEqual(self.selected(['tests/fv3_conf/control_run.IN']),
+                         {'atm_intel': ['control_p8', 'control_p8_atmlnd']})
+        self.assertEqual(self.selected(['tests/fv3_conf/noahmp_run.IN']),
+                         {'atm_intel': ['control_p8_atmlnd'], 'datm_intel': ['datm_cdeps_lnd']})
+
+    def test_unnamed_config_runs_full_suite(self):
+        self.assertIsNone(change_impact.impacted_yaml(self.rt_yaml, self.PATHTR, ['tests/parm/unknown.IN']))
+
+if __name__ == '__main__':
+    unittest.main()
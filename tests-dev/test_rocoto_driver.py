@@ -0,0 +1,182 @@
+"""Tests of rocoto_driver.py against a synthetic Rocoto database
+
+Usage: python -m unittest test_rocoto_driver
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import unittest
+import rocoto_driver
+
+def write_db(ROCOTO_DB, jobs, done=False):
+    """Write the jobs and cycles tables the way Rocoto stores them
+
+    Args:
+        ROCOTO_DB (str): Rocoto database filename
+        jobs (dict): task name mapped to state and tries
+        done (bool): cycle is done
+    """
+    con = sqlite3.connect(ROCOTO_DB)
+    with con:
+        con.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, jobid VARCHAR(64), "
+                    "taskname VARCHAR(64), cycle DATETIME, cores INTEGER, state VARCHAR(64), "
+                    "native_state VARCHAR[64], exit_status INTEGER, tries INTEGER, nunknowns INTEGER, "
+                    "duration REAL)")
+        con.execute("CREATE TABLE IF NOT EXISTS cycles (id INTEGER PRIMARY KEY, cycle DATETIME, "
+                    "activated DATETIME, expired DATETIME, done DATETIME)")
+        con.execute("DELETE FROM jobs")
+        con.execute("DELETE FROM cycles")
+        for n, (taskname, (state, tries)) in enumerate(jobs.items()):
+            con.execute("INSERT INTO jobs (jobid, taskname, cycle, state, exit_status, tries) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (str(1000+n), taskname, rocoto_driver.ROCOTO_CYCLE, state, 0, tries))
+        con.execute("INSERT INTO cycles (cycle, activated, done) VALUES (?, ?, ?)",
+                    (rocoto_driver.ROCOTO_CYCLE, 0, int(time.time()) if done else 0))
+    con.close()
+
+def write_timestamp(LOG_DIR, taskname, complete=True, mtime=None):
+    """Write the timestamp file of a task as run_test.sh does
+
+    Args:
+        LOG_DIR (str): log directory of the tests
+        taskname (str): Rocoto task name
+        complete (bool): the end time is written
+        mtime (float): modification time of the file, now when None
+    """
+    JBNME = rocoto_driver.job_name(taskname)
+    filename = LOG_DIR+'/'+JBNME+'_timestamp.txt'
+    with open(filename, 'w') as ftime:
+        ftime.write(f"{JBNME}, 100,")
+        if complete:
+            ftime.write(" 110, 120, 130, 140, 1")
+    if mtime is not None:
+        os.utime(filename, (mtime, mtime))
+
+class RocotoDriverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ROCOTO_DB = self.tmpdir.name+'/rocoto_ufs.db'
+        self.LOG_DIR = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def drive(self, jobs, on_poll, polls=5):
+        """Run drive_workflow with rocotorun and sleep replaced
+
+        on_poll is called before every sleep with the poll number, the
+        workflow stops after the given number of polls.
+
+        Returns:
+            tuple: events and the number of rocotorun calls before each poll
+        """
+        write_db(self.ROCOTO_DB, jobs)
+        runs = []
+        calls = []
+        def rocotorun(ROCOTO_XML, ROCOTO_DB):
+            runs.append(ROCOTO_DB)
+        def sleep(naptime):
+            calls.append(len(runs))
+            on_poll(len(calls))
+            if len(calls) == polls:
+                write_db(self.ROCOTO_DB, jobs, done=True)
+        saved = rocoto_driver.rocotorun, rocoto_driver.time.sleep
+        rocoto_driver.rocotorun, rocoto_driver.time.sleep = rocotorun, sleep
+        try:
+            events = list(rocoto_driver.drive_workflow('rocoto_ufs.xml', self.ROCOTO_DB, self.LOG_DIR,
+                                                       naptime=0, max_idle=3600))
+        finally:
+            rocoto_driver.rocotorun, rocoto_driver.time.sleep = saved
+        return events, calls
+
+    def test_read_jobs(self):
+        self.assertIsNone(rocoto_driver.read_jobs(self.ROCOTO_DB))
+        self.assertFalse(rocoto_driver.read_cycle_done(self.ROCOTO_DB))
+        write_db(self.ROCOTO_DB, {'compile_atm_intel': ('SUCCEEDED', 1), 'control_c48_intel': ('QUEUED', 2)})
+        jobs = rocoto_driver.read_jobs(self.ROCOTO_DB)
+        self.assertEqual(sorted(jobs), ['compile_atm_intel', 'control_c48_intel'])
+        self.assertEqual(jobs['control_c48_intel']['state'], 'QUEUED')
+        self.assertEqual(jobs['control_c48_intel']['tries'], 2)
+        self.assertEqual(jobs['compile_atm_intel']['jobid'], '1000')
+        self.assertFalse(rocoto_driver.read_cycle_done(self.ROCOTO_DB))
+        write_db(self.ROCOTO_DB, {}, done=True)
+        self.assertEqual(rocoto_driver.read_jobs(self.ROCOTO_DB), {})
+        self.assertTrue(rocoto_driver.read_cycle_done(self.ROCOTO_DB))
+
+    def test_job_events(self):
+        old_jobs = {'a': {'state': 'QUEUED', 'tries': 1}, 'b': {'state': 'RUNNING', 'tries': 1},
+                    'c': {'state': 'FAILED', 'tries': 1}}
+        new_jobs = {'a': {'state': 'RUNNING', 'tries': 1}, 'b': {'state': 'RUNNING', 'tries': 1},
+                    'c': {'state': 'FAILED', 'tries': 2}, 'd': {'state': 'SUBMITTING', 'tries': 1}}
+        events = {taskname: (old_state, state)
+                  for taskname, old_state, state, job in rocoto_driver.job_events(old_jobs, new_jobs)}
+        self.assertEqual(events, {'a': ('QUEUED', 'RUNNING'), 'c': ('FAILED', 'FAILED'),
+                                  'd': (None, 'SUBMITTING')})
+
+    def test_job_finished(self):
+        taskname = 'control_c48_intel'
+        self.assertFalse(rocoto_driver.job_finished(taskname, self.LOG_DIR))
+        write_timestamp(self.LOG_DIR, taskname, complete=False)
+        self.assertFalse(rocoto_driver.job_finished(taskname, self.LOG_DIR))
+        write_timestamp(self.LOG_DIR, taskname)
+        self.assertTrue(rocoto_driver.job_finished(taskname, self.LOG_DIR))
+        write_timestamp(self.LOG_DIR, taskname, mtime=time.time()-3600)
+        self.assertFalse(rocoto_driver.job_finished(taskname, self.LOG_DIR, since=time.time()))
+
+    def test_stale_timestamp_does_not_trigger(self):
+        #--- complete file of an earlier run while the job waits in the queue ---
+        write_timestamp(self.LOG_DIR, 'control_c48_intel', mtime=time.time()-3600)
+        events, calls = self.drive({'control_c48_intel': ('QUEUED', 1)}, lambda poll: None)
+        self.assertEqual(events[0][:3], ('control_c48_intel', None, 'QUEUED'))
+        self.assertEqual(calls, [1, 1, 1, 1, 1])
+
+    def test_finished_job_triggers_once(self):
+        def on_poll(poll):
+            if poll == 2:
+                write_timestamp(self.LOG_DIR, 'control_c48_intel')
+        events, calls = self.drive({'control_c48_intel': ('RUNNING', 1)}, on_poll)
+        self.assertEqual(calls, [1, 1, 2, 2, 2])
+
+    def test_database_change_triggers(self):
+        jobs = {'control_c48_intel': ('QUEUED', 1)}
+        def on_poll(poll):
+            if poll == 2:
+                jobs['control_c48_intel'] = ('RUNNING', 1)
+                write_db(self.ROCOTO_DB, jobs)
+                os.utime(self.ROCOTO_DB, (time.time()+10, time.time()+10))
+        events, calls = self.drive(jobs, on_poll)
+        self.assertEqual(calls, [1, 1, 2, 2, 2])
+        self.assertEqual([event[1:3] for event in events], [(None, 'QUEUED'), ('QUEUED', 'RUNNING')])
+
+    def write_log(self, filename, text):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'w') as flog:
+            flog.write(text)
+
+    def test_unknown_failure_retried_when_lost_or_killed(self):
+        taskname = 'control_c48_intel'
+        for exit_status, transient in [(None, True), (137, True), (143, True), (134, False), (1, False)]:
+            job = {'state': 'DEAD', 'exit_status': exit_status}
+            self.assertEqual(rocoto_driver.is_transient(taskname, job, self.LOG_DIR, self.LOG_DIR),
+                             (transient, 'unknown'))
+
+    def test_pack_classified_by_failed_tests(self):
+        taskname = 'pack_atm_intel_1'
+        job = {'state': 'DEAD', 'exit_status': 1}
+        self.write_log(self.LOG_DIR+'/'+taskname+'.log',
+                       "+ echo 'control_c48_intel failed in pack'\ncontrol_c48_intel failed in pack\n")
+        self.write_log(self.LOG_DIR+'/control_c48_intel/err', "srun: error: DUE TO NODE FAILURE\n")
+        self.assertEqual(rocoto_driver.failed_pack_members(taskname, self.LOG_DIR), ['run_control_c48_intel'])
+        self.assertEqual(rocoto_driver.is_transient(taskname, job, self.LOG_DIR, self.LOG_DIR),
+                         (True, 'node_failure'))
+        #--- a deterministic failure of another test of the pack is not tried again ---
+        with open(self.LOG_DIR+'/'+taskname+'.log', 'a') as flog:
+            flog.write("control_p8_intel failed in pack\n")
+        self.write_log(self.LOG_DIR+'/control_p8_intel/err', "forrtl: severe (174): SIGSEGV\n")
+        self.assertEqual(rocoto_driver.is_transient(taskname, job, self.LOG_DIR, self.LOG_DIR),
+                         (False, 'node_failure, crash'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import os
+import re
+import sys
+import pickle
+import hashlib
+
+ATPARSE_PLANS = 'atparse_plans'
+TOKEN = re.compile(r"@\[([a-zA-Z_][a-zA-Z_0-9]*)\]|@\['([^']*)'\]|@\[@\]")
+VARIABLE_ARG = re.compile(r"^([a-zA-Z][a-zA-Z0-9_]*)=(.*)$", re.DOTALL)
+
+class UndefinedVariableError(Exception):
+    """Template references a variable that is not set"""
+
+def compile_template(text):
+    """Compile template text into a substitution plan
+
+    Follows tests/atparse.bash: the template is read as a whole with
+    leading and trailing blanks and newlines removed, @[var] inserts the
+    value of var, @['string'] inserts string, @[@] inserts @ and anything
+    else is copied verbatim. The rendered text ends with one newline.
+
+    Args:
+        text (str): template text
+
+    Returns:
+        list: literal strings and (variable name, template line) tuples
+    """
+    stripped = text.strip(' \t\n')
+    if not stripped:
+        return []
+    lineno = text[:text.index(stripped)].count('\n')+1
+    plan = []
+    pos = 0
+    for match in TOKEN.finditer(stripped):
+        literal = stripped[pos:match.start()]
+        lineno += literal.count('\n')
+        if match.group(1):
+            plan += [literal, (match.group(1), lineno)]
+        else:
+            plan.append(literal+(match.group(2) if match.group(2) is not None else '@'))
+            lineno += match.group(0).count('\n')
+        pos = match.end()
+    plan.append(stripped[pos:]+'\n')
+    #--- merge neighbouring literals so rendering is one join ---
+    merged = []
+    for part in plan:
+        if isinstance(part, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += part
+        elif part != '':
+            merged.append(part)
+    return merged
+
+def plan_file(template, cache_dir):
+    """Plan cache filename of a template, changing with its content
+
+    Args:
+        template (str): template filename
+        cache_dir (str): plan cache directory
+
+    Returns:
+        str: plan cache filename
+    """
+    stat = os.stat(template)
+    key = f"{os.path.realpath(template)} {stat.st_mtime_ns} {stat.st_size}"
+    return cache_dir+'/'+hashlib.sha1(key.encode()).hexdigest()+'.pickle'
+
+def get_plan(template, cache_dir=None):
+    """Load the substitution plan of a template, compiling it when not cached
+
+    Args:
+        template (str): template filename
+        cache_dir (str): plan cache directory, None to not cache plans
+
+    Returns:
+        list: substitution plan from compile_template
+    """
+    if cache_dir:
+        cache_file = plan_file(template, cache_dir)
+        try:
+            with open(cache_file, 'rb') as fplan:
+                return pickle.load(fplan)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+    with open(template, errors='surrogateescape') as ftemp:
+        plan = compile_template(ftemp.read())
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = cache_file+'.tmp'+str(os.getpid())
+        with open(tmp_file, 'wb') as fplan:
+            pickle.dump(plan, fplan)
+        os.replace(tmp_file, cache_file)
+    return plan
+
+def compile_templates(PATHRT, RUNDIR_ROOT):
+    """Precompile every parm and fv3_conf template of the test directory
+
+    Args:
+        PATHRT (str): Test directory
+        RUNDIR_ROOT (str): Test run directory holding the plan cache
+
+    Returns:
+        int: number of compiled templates
+    """
+    cache_dir = RUNDIR_ROOT+'/'+ATPARSE_PLANS
+    count = 0
+    for top in ['parm', 'fv3_conf']:
+        for root, dirs, files in os.walk(PATHRT+'/'+top, followlinks=True):
+            for name in files:
+                get_plan(os.path.join(root, name), cache_dir)
+                count += 1
+    return count
+
+def render(plan, variables, template='-', abort_on_undefined=True):
+    """Render a substitution plan
+
+    Args:
+        plan (list): substitution plan from compile_template
+        variables (dict): variable name mapped to its value
+        template (str): template filename used in error messages
+        abort_on_undefined (bool): raise on unset variables instead of inserting ''
+
+    Returns:
+        str: rendered text
+
+    Raises:
+        UndefinedVariableError: variable is not set and abort_on_undefined is True
+    """
+    out = []
+    for part in plan:
+        if isinstance(part, str):
+            out.append(part)
+            continue
+        name, lineno = part
+        value = variables.get(name)
+        if value is None:
+            if abort_on_undefined:
+                raise UndefinedVariableError(f"{template}:{lineno}: {name}: unbound variable")
+            value = ''
+        out.append(value)
+    return ''.join(out)
+
+def render_files(files, variables, cache_dir=None, abort_on_undefined=True):
+    """Render several templates in one process
+
+    Args:
+        files (list): (template, output, append) tuples
+        variables (dict): variable name mapped to its value
+        cache_dir (str): plan cache directory, None to not cache plans
+        abort_on_undefined (bool): raise on unset variables instead of inserting ''
+    """
+    for template, output, append in files:
+        text = render(get_plan(template, cache_dir), variables, template, abort_on_undefined)
+        with open(output, 'a' if append else 'w', errors='surrogateescape') as fout:
+            fout.write(text)
+
+def stdin_template():
+    """Filename redirected to stdin, None when stdin is not a regular file
+
+    Returns:
+        str: template filename
+    """
+    try:
+        template = os.readlink('/proc/self/fd/0')
+    except OSError:
+        return None
+    return template if os.path.isfile(template) else None
+
+def main():
+    """Render stdin to stdout like the atparse function of tests/atparse.bash
+
+    Usage: ufs_atparse.py [-u] [ var1=value1 [ var2=value2 [...] ] ] < input_file > output_file
+
+    Variables are taken from the environment and the command line; -u
+    aborts on undefined variables like atparse under set -u.
+    """
+    args = sys.argv[1:]
+    abort_on_undefined = '-u' in args
+    variables = dict(os.environ)
+    for arg in args:
+        if arg == '-u':
+            continue
+        match = VARIABLE_ARG.match(arg)
+        if match:
+            variables[match.group(1)] = match.group(2)
+        else:
+            print(f"ERROR: Ignoring invalid argument {arg}", file=sys.stderr)
+    template = stdin_template()
+    RUNDIR_ROOT = os.getenv('RUNDIR_ROOT')
+    cache_dir = RUNDIR_ROOT+'/'+ATPARSE_PLANS if RUNDIR_ROOT else None
+    try:
+        if template:
+            plan = get_plan(template, cache_dir)
+        else:
+            plan = compile_template(sys.stdin.buffer.read().decode(errors='surrogateescape'))
+        text = render(plan, variables, template or '-', abort_on_undefined)
+    except UndefinedVariableError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.buffer.write(text.encode(errors='surrogateescape'))
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ die() { echo "$@" >&2; exit 1; }
 usage() {
   set +x
   echo
-  echo "Usage: $0 -a <account> | -b <file> | -c | -d | -e | -h | -k | -l <file> | -m | -n <name> | -o | -r | -w | -s"
+  echo "Usage: $0 -a <account> | -b <file> | -c | -d | -e | -h | -k | -l <file> | -m | -n <name> | -o | -r | -w | -s | -x | -p <shards> | -g | -i | -f | -t | -q \"<tests> [<cases>]\" | -j <git ref> | -u <run dir> | -y"
   echo
   echo "  -a  <account> to use on for HPC queue"
   echo "  -b  create new baselines only for tests listed in <file>"
@@ -26,6 +26,17 @@ usage() {
   echo "  -r  use Rocoto workflow manager"
   echo "  -w  for weekly_test, skip comparing baseline results"
   echo "  -s  for use tests-dev, symlink sharable tests scripts"
+  echo "  -x  do not use the build cache, compile everything"
+  echo "  -p  split Rocoto workflow into <shards> workflows run concurrently, sharing the task throttle"
+  echo "  -g  do not pre-render run directories, tests render them in their jobs"
+  echo "  -i  link input data into run directories from a shared cache instead of copying it"
+  echo "  -f  pack small tests onto shared nodes, several tests run in one job"
+  echo "  -t  dry run, report tasks, nodes, runtimes and node-hours of the tests without running them"
+  echo "  -q  run operational requirement tests of comma-separated <tests> for comma-separated <cases>"
+  echo "      of std,thr,mpi,dcp,rst,bit,dbg,fhz (default all), i.e. -q \"control_p8,cpld_control_p8 thr,rst\""
+  echo "  -j  run only the compiles and tests impacted by the changes since <git ref>, i.e. -j origin/develop"
+  echo "  -u  reuse the executables of the earlier run in <run dir> when built from the same sources and options"
+  echo "  -y  run every test, do not reuse the passing results of earlier runs i.e. for nightly full runs"
   echo
   set -x
   exit 1
@@ -33,8 +44,19 @@ usage() {
 
 [[ $# -eq 0 ]] && usage
 
+rocoto_shards_kill() {
+  for shard_xml in "${PATHRT}"/rocoto_workflow_*.xml; do
+    [[ -f ${shard_xml} ]] || continue
+    ROCOTO_XML=${shard_xml} ROCOTO_DB=${shard_xml%.xml}.db rocoto_kill
+  done
+}
+
 rt_trap() {
-  [[ ${ROCOTO:-false} == true ]] && rocoto_kill
+  if [[ ${ROCOTO:-false} == true && ${ROCOTO_SHARDS:-1} -gt 1 ]]; then
+    rocoto_shards_kill
+  elif [[ ${ROCOTO:-false} == true ]]; then
+    rocoto_kill
+  fi
   [[ ${ECFLOW:-false} == true ]] && ecflow_kill
   cleanup
 }
@@ -86,8 +108,17 @@ ACCNR=${ACCNR:-""}
 UFS_TEST_YAML="ufs_test.yaml"
 export UFS_TEST_YAML
 LINK_TESTS=false
-
-while getopts ":a:b:cl:mn:dwkreohs" opt; do
+BUILD_CACHE=true
+RESULT_CACHE=true
+ROCOTO_SHARDS=1
+PRERENDER=true
+STAGE_INPUTS=false
+PACK_TESTS=false
+RESOURCE_REPORT=false
+IMPACT_REF=''
+RERUN_DIR=''
+
+while getopts ":a:b:cl:mn:dwkreohsxp:giq:ftj:u:y" opt; do
   case ${opt} in
     a)
 	ACCNR=${OPTARG}
@@ -154,9 +185,53 @@ while getopts ":a:b:cl:mn:dwkreohs" opt; do
 	ROCOTO=false
 	die "Work-in-progress to support for ECFLOW. Please, use the ROCOTO workflow manamegment option (-r)"
 	;;
+    p)
+	ROCOTO_SHARDS=${OPTARG}
+	[[ ${ROCOTO_SHARDS} =~ ^[1-9][0-9]*$ ]] || die "-p requires a positive number of shards"
+	;;
+    g)
+	PRERENDER=false
+	;;
+    i)
+	STAGE_INPUTS=true
+	;;
+    f)
+	PACK_TESTS=true
+	;;
+    t)
+	RESOURCE_REPORT=true
+	;;
+    j)
+	IMPACT_REF=${OPTARG}
+	;;
+    u)
+	RERUN_DIR=$(realpath "${OPTARG}")
+	[[ -f ${RERUN_DIR}/build_status.yaml ]] || die "${OPTARG} is not the run directory of an earlier run"
+	;;
+    q)
+	IFS=' ' read -r -a OPNREQ_OPTS <<< "${OPTARG}"
+
+	if [[ ${#OPNREQ_OPTS[@]} -lt 1 || ${#OPNREQ_OPTS[@]} -gt 2 ]]; then
+            die 'The -q option needs <tests> and optionally <cases> in quotes, i.e. -q "control_p8 thr,rst"'
+	fi
+
+	OPNREQ_TESTS="${OPNREQ_OPTS[0]}"
+	OPNREQ_TEST_CASES="${OPNREQ_OPTS[1]:-}"
+	export OPNREQ_TESTS
+	export OPNREQ_TEST_CASES
+	python -c "import opnreq_cases; opnreq_cases.update_testyaml_q()"
+	UFS_TEST_YAML="ufs_test_temp.yaml"
+	export UFS_TEST_YAML
+	;;
     s)
 	LINK_TESTS=true
 	;;
+    x)
+	BUILD_CACHE=false
+	;;
+    y)
+	RESULT_CACHE=false
+	;;
     h)
 	usage
 	;;
@@ -221,6 +296,24 @@ shift $((OPTIND-1))
 TEST_START_TIME="$(date '+%Y%m%d %T')"
 export TEST_START_TIME
 
+# If -j; select the tests impacted by the changes, the test variables need MACHINE_ID
+if [[ -n ${IMPACT_REF} ]]; then
+  export IMPACT_REF MACHINE_ID
+  python -c "import change_impact; change_impact.update_testyaml_j()" || die "change impact selection failed"
+  if [[ ! -f ufs_test_temp.yaml ]]; then
+    echo "Nothing to run"
+    exit 0
+  fi
+  UFS_TEST_YAML="ufs_test_temp.yaml"
+  export UFS_TEST_YAML
+fi
+
+if [[ ${RESOURCE_REPORT} == true ]]; then
+  export PATHRT MACHINE_ID CREATE_BASELINE COMPILE_ONLY ROCOTO_SHARDS
+  python -c "import resource_report; resource_report.resource_report()"
+  exit 0
+fi
+
 rm -f fail_test* fail_compile*
 
 if [[ ${ROCOTO} == true ]]; then
@@ -228,6 +321,7 @@ if [[ ${ROCOTO} == true ]]; then
   ROCOTO_STATE="${PATHRT}"/rocoto_workflow.state
   ROCOTO_DB="${PATHRT}"/rocoto_workflow.db
   rm -f "${ROCOTO_XML}" "${ROCOTO_DB}" "${ROCOTO_STATE}" ./*_lock.db*
+  rm -f "${PATHRT}"/rocoto_workflow_* "${PATHRT}"/rocoto_shards.yaml
 fi
 
 [[ -f ${TESTS_FILE} ]] || die "${TESTS_FILE} does not exist"
@@ -235,6 +329,8 @@ fi
 export ROCOTO_SCHEDULER
 export ACCNR
 export ROCOTO_XML
+export ROCOTO_DB
+export ROCOTO_STATE
 export PATHRT
 export ROCOTO
 export ECFLOW
@@ -250,6 +346,13 @@ export COMPILE_ONLY
 export delete_rundir
 export skip_check_results
 export KEEP_RUNDIR  
+export BUILD_CACHE
+export RESULT_CACHE
+export RERUN_DIR
+export ROCOTO_SHARDS
+export PRERENDER
+export STAGE_INPUTS
+export PACK_TESTS
 
 if ! python -c "import create_xml; create_xml.xml_loop()"
 then
@@ -260,8 +363,10 @@ fi
 ##
 ## run regression test workflow (currently Rocoto or ecFlow are supported)
 ##
-if [[ ${ROCOTO} == true ]]; then
-    rocoto_run
+if [[ ${ROCOTO} == true && ${ROCOTO_SHARDS} -gt 1 ]]; then
+    python -c "import rocoto_shards; rocoto_shards.run_shards()"
+elif [[ ${ROCOTO} == true ]]; then
+    python -c "import rocoto_driver; rocoto_driver.main()"
 fi
 
 # IF -c AND -b; LINK VERIFIED BASELINES TO NEW_BASELINE
@@ -1,10 +1,4 @@
 import os
-import sys
-import re
-import glob
-import yaml
-import shutil
-import subprocess
 
 def update_testyaml(input_list):
     """Generate temporary test yaml based on list of tests received
@@ -12,11 +6,12 @@ def update_testyaml(input_list):
     Args:
         input_list (list): list of tests to run
     """
+    import yaml
     UFS_TEST_YAML = "ufs_test.yaml" # default ufs_test.yaml
     new_yaml = {}
     yaml_item_count = None
     with open(UFS_TEST_YAML, 'r') as file_yaml:
-        rt_yaml = yaml.load(file_yaml)#, Loader=yaml.FullLoader)
+        rt_yaml = yaml.load(file_yaml, Loader=yaml.FullLoader)
         for apps, jobs in rt_yaml.items():
             app_temp    = None
             build_temp  = None            
@@ -192,6 +187,8 @@ def create_yaml():
 def sync_testscripts():
     """symlink sharable rt.sh test scripts
     """
+    import shutil
+    import subprocess
     dst= os.getcwd()
     src= os.path.split(os.getcwd())[0]+'/tests'    
     for name in os.listdir(src):
@@ -228,12 +225,93 @@ def machine_check_off(machine_id, val):
             pass_machine = False
     return pass_machine
 
+def normalize_make_opt(make_opt):
+    """Canonicalize compile options so equivalent builds compare equal
+
+    Args:
+        make_opt (str): compile options e.g. '-DAPP=ATM -DCCPP_SUITES=b,a'
+
+    Returns:
+        str: sorted options with sorted CCPP suites and ON/OFF switches
+    """
+    switches = {'on': 'ON', 'true': 'ON', 'yes': 'ON',
+                'off': 'OFF', 'false': 'OFF', 'no': 'OFF'}
+    flags = {}
+    others = []
+    for opt in make_opt.split():
+        if opt.startswith('-D') and '=' in opt:
+            name, value = opt.split('=', 1)
+            if name == '-DCCPP_SUITES':
+                value = ','.join(sorted(set(filter(None, value.split(',')))))
+            value = switches.get(value.lower(), value)
+            #--- later definitions override earlier ones, as in cmake ---
+            flags[name] = value
+        elif opt not in others:
+            others.append(opt)
+    opts = [name+'='+value for name, value in flags.items()] + others
+    return ' '.join(sorted(opts))
+
+def get_compile_aliases(rt_yaml, machine_id):
+    """Find compiles that build the same executable as an earlier compile
+
+    Args:
+        rt_yaml (dict): test yaml configuration
+        machine_id (str): local machine name
+
+    Returns:
+        dict: compile identifier mapped to the compile that builds it first
+    """
+    builds  = {}
+    aliases = {}
+    for apps, jobs in rt_yaml.items():
+        val = jobs['build']
+        if not machine_check_off(machine_id, val):
+            continue
+        build_key = (str(val['compiler']), normalize_make_opt(str(val['option'])))
+        if build_key in builds:
+            aliases[apps] = builds[build_key]
+        else:
+            builds[build_key] = apps
+    return aliases
+
+def get_logtimes(logfile):
+    """Retrieve compile and test times from a RegressionTests log
+
+    Args:
+        logfile (str): RegressionTests log filename
+
+    Returns:
+        dict, dict: compile and test identifiers mapped to the
+                    [total, run] times in seconds
+    """
+    compile_times = {}
+    test_times    = {}
+    if not os.path.isfile(logfile):
+        return compile_times, test_times
+    import re
+    #--- rt.sh quotes the compile and test names, ufs_test.sh does not ---
+    logtime = re.compile(r"^PASS -- (COMPILE|TEST) '?([^'\s]+)'? \[(\d+):(\d+), (\d+):(\d+)\]")
+    with open(logfile) as flog:
+        for line in flog:
+            found = logtime.match(line)
+            if found is None:
+                continue
+            job, name = found.group(1), found.group(2)
+            times = [int(found.group(3))*60 + int(found.group(4)),
+                     int(found.group(5))*60 + int(found.group(6))]
+            if job == 'COMPILE':
+                compile_times[name] = times
+            else:
+                test_times[name] = times
+    return compile_times, test_times
+
 def delete_files(deletefiles):
     """Remove specified filepath
 
     Args:
         deletefiles (str): filepath to remove e.g. tests/rocoto.*
     """
+    import glob
     fileList = glob.glob(deletefiles, recursive=True)    
     for filePath in fileList:
         try:
@@ -247,8 +325,10 @@ def link_new_baselines():
     USER = str(os.environ.get('USER'))
     MACHINE_ID = os.getenv('MACHINE_ID')        
     PATHRT     = os.getenv('PATHRT')
+    import yaml
+    import subprocess
     with open("baseline_setup.yaml", 'r') as f:
-        exp_config = yaml.load(f) #, Loader=yaml.FullLoader)
+        exp_config = yaml.load(f, Loader=yaml.FullLoader)
         base  = exp_config[MACHINE_ID]
         DISKNM= str(base['DISKNM'])
         STMP  = str(base['STMP'])
@@ -315,6 +395,7 @@ def write_logfile(logfile, openmod, output="", subproc=""):
     """
     with open(logfile, openmod) as rtlog:
         if (not subproc == "") :
+            import subprocess
             subprocess.call(subproc, shell=True, stdout=rtlog)
         if (not output == "") :
             rtlog.writelines(output)
@@ -326,6 +407,7 @@ def rrmdir(path):
     Args:
         path (str): File path to remove
     """
+    import shutil
     shutil.rmtree(path)
     #for entry in os.scandir(path):
     #    if entry.is_dir():
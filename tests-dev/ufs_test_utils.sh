@@ -5,6 +5,8 @@ function set_run_task() {
     source default_vars.sh
     source rt_utils.sh
     source "${PATHRT}"/tests/"${TEST_NAME}"
+    # Operational requirement runs override the test configuration
+    [[ -e ${RUNDIR_ROOT}/opnreq_test_${TEST_ID}.env ]] && source "${RUNDIR_ROOT}/opnreq_test_${TEST_ID}.env"
     compute_petbounds_and_tasks
 
     TPN=$(( TPN / THRD ))
@@ -21,7 +23,8 @@ function set_run_task() {
     export WLCLK
      
     python -c "import create_xml; create_xml.write_runtest_env()"
-    rocoto_create_run_task
+    # Tests packed onto a shared node are run by their pack task
+    [[ ${ROCOTO_PACKED:-false} == true ]] || rocoto_create_run_task
    
 }
 
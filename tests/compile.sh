@@ -103,6 +103,26 @@ if [[ "${MAKE_OPT}" == *"-DAPP=NG-GODAS"* ]]; then
     CMAKE_FLAGS+=" -DMOM6SOLO=ON"
 fi
 
+# Profile the compile and link commands when run_compile.sh asks for it
+if [[ -z ${COMPILE_PROFILE:-} ]] && [[ -f compile_profile.txt ]]; then
+    COMPILE_PROFILE=$(pwd)/compile_profile.txt
+fi
+if [[ -n ${COMPILE_PROFILE:-} ]]; then
+    echo "# BUILD_JOBS ${BUILD_JOBS}" > "${COMPILE_PROFILE}"
+    export COMPILE_PROFILE
+    for lang in Fortran C CXX; do
+      CMAKE_FLAGS+=" -DCMAKE_${lang}_COMPILER_LAUNCHER=${MYDIR}/compile_launcher.sh"
+    done
+    # linker launchers need CMake 3.21, older versions build without timing the link
+    cmake_version=$( cmake --version 2>/dev/null | head -n 1 | grep -o '[0-9][0-9.]*' || true )
+    if [[ $( printf '%s\n' 3.21 "${cmake_version:-0}" | sort -V | head -n 1 ) == 3.21 ]]; then
+      CMAKE_FLAGS+=" -DCMAKE_Fortran_LINKER_LAUNCHER=${MYDIR}/compile_launcher.sh"
+      echo "# LINK_PROFILED yes" >> "${COMPILE_PROFILE}"
+    else
+      echo "# LINK_PROFILED no" >> "${COMPILE_PROFILE}"
+    fi
+fi
+
 CMAKE_FLAGS=$(set -e; trim "${CMAKE_FLAGS}")
 echo "CMAKE_FLAGS = ${CMAKE_FLAGS}"
 
@@ -0,0 +1,29 @@
+#!/bin/bash
+# CMake compiler and linker launcher recording the time of every
+# compile and link command of a build into ${COMPILE_PROFILE}.
+# One line per command: start end exit-status source object
+
+start=${EPOCHREALTIME:-$(date +%s.%N)}
+rc=0
+"$@" || rc=$?
+end=${EPOCHREALTIME:-$(date +%s.%N)}
+
+source='-'
+object='-'
+next_is_object=false
+for arg in "$@"; do
+  if [[ ${next_is_object} == true ]]; then
+    object=${arg}
+    next_is_object=false
+    continue
+  fi
+  case ${arg} in
+    -o) next_is_object=true ;;
+    -*) ;;
+    *.f|*.F|*.f90|*.F90|*.f77|*.F77|*.for|*.FOR|*.ftn|*.c|*.cc|*.cpp|*.cxx|*.C) source=${arg} ;;
+  esac
+done
+
+# short appends to a file opened for appending do not interleave
+[[ -n ${COMPILE_PROFILE:-} ]] && echo "${start} ${end} ${rc} ${source} ${object}" >> "${COMPILE_PROFILE}"
+exit "${rc}"
@@ -344,7 +344,11 @@ EOF
 
 rocoto_create_run_task() {
   echo "rt_utils.sh: ${TEST_ID}: Creating ROCOTO run task."
-  if [[ ${DEP_RUN} != '' ]]; then
+  # COMPILE_CACHED=true: executable is already in place, no compile task to wait for
+  if [[ ${COMPILE_CACHED:-false} == true ]]; then
+    DEP_STRING=""
+    [[ ${DEP_RUN} != '' ]] && DEP_STRING="<taskdep task=\"${DEP_RUN}\"/>"
+  elif [[ ${DEP_RUN} != '' ]]; then
     DEP_STRING="<and> <taskdep task=\"compile_${COMPILE_ID}\"/> <taskdep task=\"${DEP_RUN}\"/> </and>"
   else
     DEP_STRING="<taskdep task=\"compile_${COMPILE_ID}\"/>"
@@ -359,7 +363,7 @@ rocoto_create_run_task() {
 
   cat << EOF >> "${ROCOTO_XML}"
     <task name="${TEST_ID}${RT_SUFFIX}" maxtries="${ROCOTO_TEST_MAXTRIES:-3}">
-      <dependency> ${DEP_STRING} </dependency>
+      ${DEP_STRING:+<dependency> ${DEP_STRING} </dependency>}
       <command>bash -c 'set -xe -o pipefail ; &PATHRT;/run_test.sh &PATHRT; &RUNDIR_ROOT; ${TEST_NAME} ${TEST_ID} ${COMPILE_ID} 2>&amp;1 | tee &LOG;/run_${TEST_ID}${RT_SUFFIX}.log' </command>
       <jobname>${TEST_ID}${RT_SUFFIX}</jobname>
       <account>${ACCNR}</account>
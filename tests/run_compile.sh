@@ -67,6 +67,9 @@ rm -rf "${RUNDIR}"
 mkdir -p "${RUNDIR}"
 cd "${RUNDIR}"
 
+# compile.sh profiles the build into this file, also when the job card does not pass the environment
+[[ -f ${PATHRT}/compile_profile.py ]] && touch compile_profile.txt
+
 if [[ ${SCHEDULER} = 'pbs' ]]; then
   if [[ -e ${PATHRT}/fv3_conf/compile_qsub.IN_${MACHINE_ID} ]]; then 
     atparse < "${PATHRT}/fv3_conf/compile_qsub.IN_${MACHINE_ID}" > job_card
@@ -98,6 +101,11 @@ fi
 cp "${RUNDIR}/${JBNME}_time.log" "${LOG_DIR}"
 cat "${RUNDIR}/job_timestamp.txt" >> "${LOG_DIR}/${JBNME}_timestamp.txt"
 
+if [[ -s ${RUNDIR}/compile_profile.txt ]]; then
+  cp "${RUNDIR}/compile_profile.txt" "${LOG_DIR}/${JBNME}_profile.txt"
+  python3 "${PATHRT}/compile_profile.py" record "${RUNDIR}/compile_profile.txt" "${COMPILE_ID}" || true
+fi
+
 remove_fail_test
 
 ################################################################################
@@ -5,7 +5,10 @@ set -o pipefail
 echo "PID=$$"
 SECONDS=0
 
-trap '[ "$?" -eq 0 ] || write_fail_test' EXIT
+# RT_PRERENDER=render only writes the configuration files of a test, on the
+# login node. A failure there is not a test failure, the test job then sets up
+# the run directory itself.
+[[ ${RT_PRERENDER:-false} == render ]] || trap '[ "$?" -eq 0 ] || write_fail_test' EXIT
 trap 'echo "run_test.sh interrupted PID=$$"; cleanup' INT
 trap 'echo "run_test.sh terminated PID=$$";  cleanup' TERM
 
@@ -56,6 +59,8 @@ unset UFS_CONFIGURE
 source default_vars.sh
 [[ -e ${RUNDIR_ROOT}/run_test_${TEST_ID}.env ]] && source "${RUNDIR_ROOT}/run_test_${TEST_ID}.env"
 source "tests/${TEST_NAME}"
+# Operational requirement runs of tests-dev override the test configuration
+[[ -e ${RUNDIR_ROOT}/opnreq_test_${TEST_ID}.env ]] && source "${RUNDIR_ROOT}/opnreq_test_${TEST_ID}.env"
 
 rm -f "${PATHRT}/fail_test_${TEST_ID}"
 
@@ -68,10 +73,24 @@ export INPUT_DIR=${CNTL_DIR}
 export RUNDIR=${RUNDIR_ROOT}/${TEST_ID}${RT_SUFFIX}
 export CNTL_DIR=${CNTL_DIR}${BL_SUFFIX}
 
+# Configuration files written before submission by RT_PRERENDER=render
+PRERENDER_DIR=${RUNDIR_ROOT}/prerender/${TEST_ID}${RT_SUFFIX}
+PRERENDERED=false
+if [[ ${RT_PRERENDER:-false} != render && -f ${PRERENDER_DIR}/prerender.done ]]; then
+  PRERENDERED=true
+fi
+
 JBNME="run_${TEST_ID}"
 export JBNME
 date_s=$( date +%s )
-echo -n "${TEST_ID}, ${date_s}," > "${LOG_DIR}/${JBNME}_timestamp.txt"
+if [[ ${RT_PRERENDER:-false} != render ]]; then
+  echo -n "${TEST_ID}, ${date_s}," > "${LOG_DIR}/${JBNME}_timestamp.txt"
+fi
+# tests-dev/job_phases.py: a new try keeps only the submit time rocoto_driver.py recorded
+if [[ ${RT_PRERENDER:-false} != render && -f ${PATHRT}/job_phases.py ]]; then
+  submit=$( grep -s '^submit ' "${LOG_DIR}/${JBNME}_phases.txt" | tail -n 1 || true )
+  echo "${submit}" > "${LOG_DIR}/${JBNME}_phases.txt"
+fi
 
 export RT_LOG=${LOG_DIR}/rt_${TEST_ID}${RT_SUFFIX}.log
 echo "Test ${TEST_ID} ${TEST_DESCR}"
@@ -79,170 +98,280 @@ echo "Test ${TEST_ID} ${TEST_DESCR}"
 source rt_utils.sh
 source atparse.bash
 
-rm -rf "${RUNDIR}"
-mkdir -p "${RUNDIR}"
-cd "${RUNDIR}"
+if [[ ${RT_PRERENDER:-false} == render ]]; then
+  rm -rf "${PRERENDER_DIR}"
+  mkdir -p "${PRERENDER_DIR}"
+  cd "${PRERENDER_DIR}"
+else
+  rm -rf "${RUNDIR}"
+  mkdir -p "${RUNDIR}"
+  cd "${RUNDIR}"
+fi
 
 ###############################################################################
 # Make configure and run files
 ###############################################################################
 
-# FV3 executable:
-cp "${PATHRT}/fv3_${COMPILE_ID}.exe" "fv3.exe"
+# Executable and modules of the test job, not needed to render its files
+copy_model() {
+  # FV3 executable:
+  cp "${PATHRT}/fv3_${COMPILE_ID}.exe" "fv3.exe"
 
-# modulefile for FV3 prerequisites:
-mkdir -p modulefiles
-if [[ ${MACHINE_ID} == linux ]]; then
-  cp "${PATHRT}/modules.fv3_${COMPILE_ID}" "./modulefiles/modules.fv3"
-else
-  cp "${PATHRT}/modules.fv3_${COMPILE_ID}.lua" "./modulefiles/modules.fv3.lua"
-fi
-cp "${PATHTR}/modulefiles/ufs_common.lua" "./modulefiles/."
-
-# Get the shell file that loads the "module" command and purges modules:
-cp "${PATHRT}/module-setup.sh" "module-setup.sh"
-
-case ${MACHINE_ID} in
-  wcoss2|acorn)
-    module load intel/19.1.3.304 netcdf/4.7.4
-    module load nccmp
-    ;;
-  s4)
-    module use /data/prod/jedi/spack-stack/spack-stack-1.4.1/envs/ufs-pio-2.5.10/install/modulefiles/Core
-    module load stack-intel/2021.5.0 stack-intel-oneapi-mpi/2021.5.0
-    module load miniconda/3.9.12
-    module load nccmp/1.9.0.1
-    ;;
-  stampede|expanse|noaacloud)
-    echo "No special nccmp load necessary"
-    ;;
-  gaea)
-    module use modulefiles
-    module load modules.fv3
-    module load gcc/12.2.0
-    ;;
-  derecho)
-    module load nccmp
-    ;;
-  *)
-    module use modulefiles
-    module load modules.fv3
-    ;;
-esac
-
-# FV3_RUN could have multiple entry seperated by space
-if [[ -n "${FV3_RUN}" ]]; then
-  for i in ${FV3_RUN}
-  do
-    atparse < "${PATHRT}/fv3_conf/${i}" >> fv3_run
-  done
-else
-  echo "No FV3_RUN set in test file"
-  exit 1
-fi
+  # modulefile for FV3 prerequisites:
+  mkdir -p modulefiles
+  if [[ ${MACHINE_ID} == linux ]]; then
+    cp "${PATHRT}/modules.fv3_${COMPILE_ID}" "./modulefiles/modules.fv3"
+  else
+    cp "${PATHRT}/modules.fv3_${COMPILE_ID}.lua" "./modulefiles/modules.fv3.lua"
+  fi
+  cp "${PATHTR}/modulefiles/ufs_common.lua" "./modulefiles/."
+
+  # Get the shell file that loads the "module" command and purges modules:
+  cp "${PATHRT}/module-setup.sh" "module-setup.sh"
+
+  case ${MACHINE_ID} in
+    wcoss2|acorn)
+      module load intel/19.1.3.304 netcdf/4.7.4
+      module load nccmp
+      ;;
+    s4)
+      module use /data/prod/jedi/spack-stack/spack-stack-1.4.1/envs/ufs-pio-2.5.10/install/modulefiles/Core
+      module load stack-intel/2021.5.0 stack-intel-oneapi-mpi/2021.5.0
+      module load miniconda/3.9.12
+      module load nccmp/1.9.0.1
+      ;;
+    stampede|expanse|noaacloud)
+      echo "No special nccmp load necessary"
+      ;;
+    gaea)
+      module use modulefiles
+      module load modules.fv3
+      module load gcc/12.2.0
+      ;;
+    derecho)
+      module load nccmp
+      ;;
+    *)
+      module use modulefiles
+      module load modules.fv3
+      ;;
+  esac
+}
 
-# Magic to handle namelist versions of &cires_ugwp_nml
-if [[ ${DO_UGWP_V1:-.false.} == .true. ]] ; then
-  export HIDE_UGWPV0='!'
-  export HIDE_UGWPV1=' '
-else
-  export HIDE_UGWPV0=' '
-  export HIDE_UGWPV1='!'
-fi
+# Run script and configuration files read when fv3_run stages the inputs
+render_run_files() {
+  # FV3_RUN could have multiple entry seperated by space
+  if [[ -n "${FV3_RUN}" ]]; then
+    for i in ${FV3_RUN}
+    do
+      atparse < "${PATHRT}/fv3_conf/${i}" >> fv3_run
+    done
+  else
+    echo "No FV3_RUN set in test file"
+    exit 1
+  fi
 
-if [[ ${DATM_CDEPS} = 'true' ]] || [[ ${FV3} = 'true' ]] || [[ ${S2S} = 'true' ]]; then
-  if [[ ${HAFS} = 'false' ]] || [[ ${FV3} = 'true' && ${HAFS} = 'true' ]]; then
-    atparse < "${PATHRT}/parm/${INPUT_NML:-input.nml.IN}" > input.nml
+  # Magic to handle namelist versions of &cires_ugwp_nml
+  if [[ ${DO_UGWP_V1:-.false.} == .true. ]] ; then
+    export HIDE_UGWPV0='!'
+    export HIDE_UGWPV1=' '
+  else
+    export HIDE_UGWPV0=' '
+    export HIDE_UGWPV1='!'
   fi
-fi
 
-if [[ -f ${PATHRT}/parm/${MODEL_CONFIGURE} ]]; then
-  atparse < "${PATHRT}/parm/${MODEL_CONFIGURE}" > model_configure
-else
-  echo "Cannot find file ${MODEL_CONFIGURE} set by variable MODEL_CONFIGURE"
-  exit 1
-fi
+  if [[ ${DATM_CDEPS} = 'true' ]] || [[ ${FV3} = 'true' ]] || [[ ${S2S} = 'true' ]]; then
+    if [[ ${HAFS} = 'false' ]] || [[ ${FV3} = 'true' && ${HAFS} = 'true' ]]; then
+      atparse < "${PATHRT}/parm/${INPUT_NML:-input.nml.IN}" > input.nml
+    fi
+  fi
 
-compute_petbounds_and_tasks
+  if [[ -f ${PATHRT}/parm/${MODEL_CONFIGURE} ]]; then
+    atparse < "${PATHRT}/parm/${MODEL_CONFIGURE}" > model_configure
+  else
+    echo "Cannot find file ${MODEL_CONFIGURE} set by variable MODEL_CONFIGURE"
+    exit 1
+  fi
 
-if [[ -f ${PATHRT}/parm/${UFS_CONFIGURE} ]]; then
-  atparse < "${PATHRT}/parm/${UFS_CONFIGURE}" > ufs.configure
-else
-  echo "Cannot find file ${UFS_CONFIGURE} set by variable UFS_CONFIGURE"
-  exit 1
-fi
+  compute_petbounds_and_tasks
 
-if [[ "Q${INPUT_NEST02_NML:-}" != Q ]]; then
-    export INPES_NEST=${INPES_NEST02:-}
-    export JNPES_NEST=${JNPES_NEST02:-}
-    export NPX_NEST=${NPX_NEST02:-}
-    export NPY_NEST=${NPY_NEST02:-}
-    export K_SPLIT_NEST=${K_SPLIT_NEST02:-}
-    export N_SPLIT_NEST=${N_SPLIT_NEST02:-}
-    atparse < "${PATHRT}/parm/${INPUT_NEST02_NML}" > input_nest02.nml
-else
-    sed -i -e "/<output_grid_02>/,/<\/output_grid_02>/d" model_configure
-fi
+  if [[ -f ${PATHRT}/parm/${UFS_CONFIGURE} ]]; then
+    atparse < "${PATHRT}/parm/${UFS_CONFIGURE}" > ufs.configure
+  else
+    echo "Cannot find file ${UFS_CONFIGURE} set by variable UFS_CONFIGURE"
+    exit 1
+  fi
 
-if [[ "Q${INPUT_NEST03_NML:-}" != Q ]]; then
-    export INPES_NEST=${INPES_NEST03:-}
-    export JNPES_NEST=${JNPES_NEST03:-}
-    export NPX_NEST=${NPX_NEST03:-}
-    export NPY_NEST=${NPY_NEST03:-}
-    export K_SPLIT_NEST=${K_SPLIT_NEST03:-}
-    export N_SPLIT_NEST=${N_SPLIT_NEST03:-}
-    atparse < "${PATHRT}/parm/${INPUT_NEST03_NML}" > input_nest03.nml
-else
-    sed -i -e "/<output_grid_03>/,/<\/output_grid_03>/d" model_configure
-fi
+  if [[ "Q${INPUT_NEST02_NML:-}" != Q ]]; then
+      export INPES_NEST=${INPES_NEST02:-}
+      export JNPES_NEST=${JNPES_NEST02:-}
+      export NPX_NEST=${NPX_NEST02:-}
+      export NPY_NEST=${NPY_NEST02:-}
+      export K_SPLIT_NEST=${K_SPLIT_NEST02:-}
+      export N_SPLIT_NEST=${N_SPLIT_NEST02:-}
+      atparse < "${PATHRT}/parm/${INPUT_NEST02_NML}" > input_nest02.nml
+  else
+      sed -i -e "/<output_grid_02>/,/<\/output_grid_02>/d" model_configure
+  fi
 
-if [[ "Q${INPUT_NEST04_NML:-}" != Q ]]; then
-    export INPES_NEST=${INPES_NEST04:-}
-    export JNPES_NEST=${JNPES_NEST04:-}
-    export NPX_NEST=${NPX_NEST04:-}
-    export NPY_NEST=${NPY_NEST04:-}
-    export K_SPLIT_NEST=${K_SPLIT_NEST04:-}
-    export N_SPLIT_NEST=${N_SPLIT_NEST04:-}
-    atparse < "${PATHRT}/parm/${INPUT_NEST04_NML}" > input_nest04.nml
-else
-    sed -i -e "/<output_grid_04>/,/<\/output_grid_04>/d" model_configure
-fi
+  if [[ "Q${INPUT_NEST03_NML:-}" != Q ]]; then
+      export INPES_NEST=${INPES_NEST03:-}
+      export JNPES_NEST=${JNPES_NEST03:-}
+      export NPX_NEST=${NPX_NEST03:-}
+      export NPY_NEST=${NPY_NEST03:-}
+      export K_SPLIT_NEST=${K_SPLIT_NEST03:-}
+      export N_SPLIT_NEST=${N_SPLIT_NEST03:-}
+      atparse < "${PATHRT}/parm/${INPUT_NEST03_NML}" > input_nest03.nml
+  else
+      sed -i -e "/<output_grid_03>/,/<\/output_grid_03>/d" model_configure
+  fi
 
-if [[ "Q${INPUT_NEST05_NML:-}" != Q ]]; then
-    export INPES_NEST=${INPES_NEST05:-}
-    export JNPES_NEST=${JNPES_NEST05:-}
-    export NPX_NEST=${NPX_NEST05:-}
-    export NPY_NEST=${NPY_NEST05:-}
-    export K_SPLIT_NEST=${K_SPLIT_NEST05:-}
-    export N_SPLIT_NEST=${N_SPLIT_NEST05:-}
-    atparse < "${PATHRT}/parm/${INPUT_NEST05_NML}" > input_nest05.nml
-else
-    sed -i -e "/<output_grid_05>/,/<\/output_grid_05>/d" model_configure
+  if [[ "Q${INPUT_NEST04_NML:-}" != Q ]]; then
+      export INPES_NEST=${INPES_NEST04:-}
+      export JNPES_NEST=${JNPES_NEST04:-}
+      export NPX_NEST=${NPX_NEST04:-}
+      export NPY_NEST=${NPY_NEST04:-}
+      export K_SPLIT_NEST=${K_SPLIT_NEST04:-}
+      export N_SPLIT_NEST=${N_SPLIT_NEST04:-}
+      atparse < "${PATHRT}/parm/${INPUT_NEST04_NML}" > input_nest04.nml
+  else
+      sed -i -e "/<output_grid_04>/,/<\/output_grid_04>/d" model_configure
+  fi
+
+  if [[ "Q${INPUT_NEST05_NML:-}" != Q ]]; then
+      export INPES_NEST=${INPES_NEST05:-}
+      export JNPES_NEST=${JNPES_NEST05:-}
+      export NPX_NEST=${NPX_NEST05:-}
+      export NPY_NEST=${NPY_NEST05:-}
+      export K_SPLIT_NEST=${K_SPLIT_NEST05:-}
+      export N_SPLIT_NEST=${N_SPLIT_NEST05:-}
+      atparse < "${PATHRT}/parm/${INPUT_NEST05_NML}" > input_nest05.nml
+  else
+      sed -i -e "/<output_grid_05>/,/<\/output_grid_05>/d" model_configure
+  fi
+
+  if [[ "Q${INPUT_NEST06_NML:-}" != Q ]]; then
+      export INPES_NEST=${INPES_NEST06:-}
+      export JNPES_NEST=${JNPES_NEST06:-}
+      export NPX_NEST=${NPX_NEST06:-}
+      export NPY_NEST=${NPY_NEST06:-}
+      export K_SPLIT_NEST=${K_SPLIT_NEST06:-}
+      export N_SPLIT_NEST=${N_SPLIT_NEST06:-}
+      atparse < "${PATHRT}/parm/${INPUT_NEST06_NML}" > input_nest06.nml
+  else
+      sed -i -e "/<output_grid_06>/,/<\/output_grid_06>/d" model_configure
+  fi
+
+  # diag table
+  if [[ "Q${DIAG_TABLE:-}" != Q ]]; then
+    atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE}" > diag_table
+  fi
+  # Field table
+  if [[ "Q${FIELD_TABLE:-}" != Q ]]; then
+    cp "${PATHRT}/parm/field_table/${FIELD_TABLE}" field_table
+  fi
+}
+
+# Configuration files written over the inputs staged by fv3_run
+render_config_files() {
+  if [[ ${CPLWAV} == .true. ]]; then
+    if [[ ${WW3_MULTIGRID} = 'true' ]]; then
+      atparse < "${PATHRT}/parm/ww3_multi.inp.IN" > ww3_multi.inp
+    else
+      atparse < "${PATHRT}/parm/ww3_shel.nml.IN" > ww3_shel.nml
+      cp "${PATHRT}/parm/ww3_points.list" .
+    fi
+  fi
+
+  if [[ ${CPLCHM} == .true. ]]; then
+    cp "${PATHRT}"/parm/gocart/*.rc .
+    atparse < "${PATHRT}/parm/gocart/AERO_HISTORY.rc.IN" > AERO_HISTORY.rc
+  fi
+
+  #TODO: this logic needs to be cleaned up for datm applications w/o
+  #ocean or ice
+  if [[ ${DATM_CDEPS} = 'true' ]] || [[ ${S2S} = 'true' ]]; then
+    if [[ ${HAFS} = 'false' ]]; then
+      atparse < "${PATHRT}/parm/ice_in.IN" > ice_in
+      atparse < "${PATHRT}/parm/${MOM6_INPUT:-MOM_input_${OCNRES}.IN}" > INPUT/MOM_input
+      atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE:-diag_table_template}" > diag_table
+      atparse < "${PATHRT}/parm/MOM6_data_table.IN" > data_table
+    fi
+  fi
+
+  if [[ ${HAFS} = 'true' ]] && [[ ${DATM_CDEPS} = 'false' ]]; then
+    atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE:-diag_table_template}" > diag_table
+  fi
+
+  if [[ "${DIAG_TABLE_ADDITIONAL:-}Q" != Q ]]; then
+    # Append diagnostic outputs, to support tests that vary from others
+    # only by adding diagnostics.
+    atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE_ADDITIONAL:-}" >> diag_table
+  fi
+
+  # ATMAERO
+  if [[ ${CPLCHM} == .true. ]] && [[ ${S2S} = 'false' ]]; then
+    atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE:-diag_table_template}" > diag_table
+  fi
+
+  if [[ ${DATM_CDEPS} = 'true' ]]; then
+    atparse < "${PATHRT}/parm/${DATM_IN_CONFIGURE:-datm_in.IN}" > datm_in
+    atparse < "${PATHRT}/parm/${DATM_STREAM_CONFIGURE:-datm.streams.IN}" > datm.streams
+  fi
+
+  if [[ ${DOCN_CDEPS} = 'true' ]]; then
+    atparse < "${PATHRT}/parm/${DOCN_IN_CONFIGURE:-docn_in.IN}" > docn_in
+    atparse < "${PATHRT}/parm/${DOCN_STREAM_CONFIGURE:-docn.streams.IN}" > docn.streams
+  fi
+
+  if [[ ${DICE_CDEPS} = 'true' ]]; then
+    atparse < "${PATHRT}/parm/${DICE_IN_CONFIGURE:-dice_in.IN}" > dice_in
+    atparse < "${PATHRT}/parm/${DICE_STREAM_CONFIGURE:-dice.streams.IN}" > dice.streams
+  fi
+
+  if [[ ${CICE_PRESCRIBED} = 'true' ]]; then
+    atparse < "${PATHRT}"/parm/ice_in.IN > ice_in
+  fi
+
+  if [[ ${CDEPS_INLINE} = 'true' ]]; then
+    atparse < "${PATHRT}/parm/${CDEPS_INLINE_CONFIGURE:-stream.config.IN}" > stream.config
+  fi
+
+  if [[ ${FIRE_BEHAVIOR} = 'true' ]]; then
+    atparse < "${PATHRT}/parm/${FIRE_NML:-namelist.fire.IN}" > namelist.fire
+  fi
+}
+
+# Configuration files pre-rendered on the login node, copied when this test wrote them
+copy_prerendered() {
+  local pattern file
+  for pattern in "$@"; do
+    for file in "${PRERENDER_DIR}"/${pattern}; do
+      if [[ -f ${file} ]]; then
+        cp "${file}" "${file#"${PRERENDER_DIR}"/}"
+      fi
+    done
+  done
+}
+
+if [[ ${RT_PRERENDER:-false} != render ]]; then
+  copy_model
 fi
 
-if [[ "Q${INPUT_NEST06_NML:-}" != Q ]]; then
-    export INPES_NEST=${INPES_NEST06:-}
-    export JNPES_NEST=${JNPES_NEST06:-}
-    export NPX_NEST=${NPX_NEST06:-}
-    export NPY_NEST=${NPY_NEST06:-}
-    export K_SPLIT_NEST=${K_SPLIT_NEST06:-}
-    export N_SPLIT_NEST=${N_SPLIT_NEST06:-}
-    atparse < "${PATHRT}/parm/${INPUT_NEST06_NML}" > input_nest06.nml
+if [[ ${PRERENDERED} == true ]]; then
+  cp "${PRERENDER_DIR}/fv3_run" fv3_run
+  copy_prerendered input.nml model_configure ufs.configure 'input_nest0*.nml' diag_table field_table
 else
-    sed -i -e "/<output_grid_06>/,/<\/output_grid_06>/d" model_configure
+  render_run_files
 fi
 
-# diag table
-if [[ "Q${DIAG_TABLE:-}" != Q ]]; then
-  atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE}" > diag_table
-fi
-# Field table
-if [[ "Q${FIELD_TABLE:-}" != Q ]]; then
-  cp "${PATHRT}/parm/field_table/${FIELD_TABLE}" field_table
+# STAGE_INPUTS=true: link input data from a cache shared by all tests in RUNDIR_ROOT
+if [[ ${STAGE_INPUTS:-false} == true && ${RT_PRERENDER:-false} != render && -f ${PATHRT}/stage_inputs.sh ]]; then
+  source "${PATHRT}/stage_inputs.sh"
 fi
 
 # fix files
-if [[ ${FV3} == true ]]; then
+if [[ ${FV3} == true && ${RT_PRERENDER:-false} != render ]]; then
   cp "${INPUTDATA_ROOT}"/FV3_fix/*.txt .
   cp "${INPUTDATA_ROOT}"/FV3_fix/*.f77 .
   cp "${INPUTDATA_ROOT}"/FV3_fix/*.dat .
@@ -265,73 +394,28 @@ fi
 cp "${PATHRT}/parm/fd_ufs.yaml" fd_ufs.yaml
 
 # Set up the run directory
-source ./fv3_run
-
-if [[ ${CPLWAV} == .true. ]]; then
-  if [[ ${WW3_MULTIGRID} = 'true' ]]; then
-    atparse < "${PATHRT}/parm/ww3_multi.inp.IN" > ww3_multi.inp
-  else
-    atparse < "${PATHRT}/parm/ww3_shel.nml.IN" > ww3_shel.nml
-    cp "${PATHRT}/parm/ww3_points.list" .
-  fi
-fi
-
-if [[ ${CPLCHM} == .true. ]]; then
-  cp "${PATHRT}"/parm/gocart/*.rc .
-  atparse < "${PATHRT}/parm/gocart/AERO_HISTORY.rc.IN" > AERO_HISTORY.rc
-fi
-
-#TODO: this logic needs to be cleaned up for datm applications w/o
-#ocean or ice
-if [[ ${DATM_CDEPS} = 'true' ]] || [[ ${S2S} = 'true' ]]; then
-  if [[ ${HAFS} = 'false' ]]; then
-    atparse < "${PATHRT}/parm/ice_in.IN" > ice_in
-    atparse < "${PATHRT}/parm/${MOM6_INPUT:-MOM_input_${OCNRES}.IN}" > INPUT/MOM_input
-    atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE:-diag_table_template}" > diag_table
-    atparse < "${PATHRT}/parm/MOM6_data_table.IN" > data_table
+if [[ ${RT_PRERENDER:-false} == render ]]; then
+  mkdir -p INPUT
+else
+  source ./fv3_run
+  if declare -F stage_inputs_end >/dev/null; then
+    stage_inputs_end
   fi
 fi
 
-if [[ ${HAFS} = 'true' ]] && [[ ${DATM_CDEPS} = 'false' ]]; then
-  atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE:-diag_table_template}" > diag_table
-fi
-
-if [[ "${DIAG_TABLE_ADDITIONAL:-}Q" != Q ]]; then
-  # Append diagnostic outputs, to support tests that vary from others
-  # only by adding diagnostics.
-  atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE_ADDITIONAL:-}" >> diag_table
-fi
-
-# ATMAERO
-if [[ ${CPLCHM} == .true. ]] && [[ ${S2S} = 'false' ]]; then
-  atparse < "${PATHRT}/parm/diag_table/${DIAG_TABLE:-diag_table_template}" > diag_table
-fi
-
-if [[ ${DATM_CDEPS} = 'true' ]]; then
-  atparse < "${PATHRT}/parm/${DATM_IN_CONFIGURE:-datm_in.IN}" > datm_in
-  atparse < "${PATHRT}/parm/${DATM_STREAM_CONFIGURE:-datm.streams.IN}" > datm.streams
-fi
-
-if [[ ${DOCN_CDEPS} = 'true' ]]; then
-  atparse < "${PATHRT}/parm/${DOCN_IN_CONFIGURE:-docn_in.IN}" > docn_in
-  atparse < "${PATHRT}/parm/${DOCN_STREAM_CONFIGURE:-docn.streams.IN}" > docn.streams
-fi
-
-if [[ ${DICE_CDEPS} = 'true' ]]; then
-  atparse < "${PATHRT}/parm/${DICE_IN_CONFIGURE:-dice_in.IN}" > dice_in
-  atparse < "${PATHRT}/parm/${DICE_STREAM_CONFIGURE:-dice.streams.IN}" > dice.streams
-fi
-
-if [[ ${CICE_PRESCRIBED} = 'true' ]]; then
-  atparse < "${PATHRT}"/parm/ice_in.IN > ice_in
-fi
-
-if [[ ${CDEPS_INLINE} = 'true' ]]; then
-  atparse < "${PATHRT}/parm/${CDEPS_INLINE_CONFIGURE:-stream.config.IN}" > stream.config
+if [[ ${PRERENDERED} == true ]]; then
+  copy_prerendered ww3_multi.inp ww3_shel.nml ww3_points.list '*.rc' ice_in INPUT/MOM_input diag_table \
+    data_table datm_in datm.streams docn_in docn.streams dice_in dice.streams stream.config namelist.fire
+  source "${PRERENDER_DIR}/prerender.env"
+else
+  render_config_files
 fi
 
-if [[ ${FIRE_BEHAVIOR} = 'true' ]]; then
-  atparse < "${PATHRT}/parm/${FIRE_NML:-namelist.fire.IN}" > namelist.fire
+if [[ ${RT_PRERENDER:-false} == render ]]; then
+  # task count of compute_petbounds_and_tasks, the job card is written by the job
+  declare -p TASKS > prerender.env
+  touch prerender.done
+  exit 0
 fi
 
 TPN=$(( TPN / THRD ))
@@ -399,7 +483,23 @@ else
     submit_and_wait job_card
   else
     chmod u+x job_card
-    redirect_out_err ./job_card
+    if [[ ${OPNREQ_WATCH:-false} != false ]]; then
+      # opnReqTest variants are compared against their baseline while the
+      # model runs, and stopped at the first divergent forecast hour
+      redirect_out_err ./job_card &
+      job_pid=$!
+      python3 "${PATHRT}/opnreq_compare.py" "${job_pid}" "${RTPWD}/${CNTL_DIR}_${RT_COMPILER}" > opnreq_compare.log 2>&1 &
+      watch_pid=$!
+      job_rc=0
+      wait "${job_pid}" || job_rc=$?
+      kill "${watch_pid}" 2> /dev/null || true
+      wait "${watch_pid}" || true
+      if [[ ${job_rc} != 0 && ! -f opnreq_divergence.txt ]]; then
+        exit "${job_rc}"
+      fi
+    else
+      redirect_out_err ./job_card
+    fi
   fi
 
 fi
@@ -418,11 +518,16 @@ if [[ ${skip_check_results} == false ]]; then
   echo "baseline dir = ${RTPWD}/${CNTL_DIR}_${RT_COMPILER}"
   echo "working dir  = ${RUNDIR}"
   echo "Checking test ${TEST_ID} results ...."
+  if [[ -f ${RUNDIR}/opnreq_divergence.txt ]]; then
+    cat "${RUNDIR}/opnreq_divergence.txt" >> "${RT_LOG}"
+    cat "${RUNDIR}/opnreq_divergence.txt"
+  fi
 
   if [[ ${CREATE_BASELINE} = false ]]; then
     #
     # --- regression test comparison
     #
+    diff_files=()
     for i in ${LIST_FILES} ; do
       printf %s " Comparing ${i} ....." >> "${RT_LOG}"
       printf %s " Comparing ${i} ....."
@@ -471,6 +576,7 @@ if [[ ${skip_check_results} == false ]]; then
           echo "....NOT IDENTICAL" >> "${RT_LOG}"
           echo "....NOT IDENTICAL"
           test_status='FAIL'
+          [[ ${d} -eq 1 ]] && diff_files+=("${i}")
         else
           echo "....OK" >> "${RT_LOG}"
           echo "....OK"
@@ -480,6 +586,11 @@ if [[ ${skip_check_results} == false ]]; then
 
     done
 
+    # --- which NetCDF variables, levels and tiles and which GRIB records differ
+    if [[ ${#diff_files[@]} -gt 0 && -f ${PATHRT}/nc_diff.py ]]; then
+      python3 "${PATHRT}/nc_diff.py" "${RTPWD}/${CNTL_DIR}_${RT_COMPILER}" "${diff_files[@]}" >> "${RT_LOG}" 2>&1 || true
+    fi
+
   else
     #
     # --- create baselines
@@ -531,6 +642,10 @@ else
   echo;echo;echo
   } >> "${RT_LOG}"
 fi
+# end of the result check for the phase breakdown of tests-dev/job_phases.py
+if [[ -f ${PATHRT}/job_phases.py ]]; then
+  echo "check_end $( date +%s )" >> "${LOG_DIR}/${JBNME}_phases.txt"
+fi
 
 if [[ ${SCHEDULER} != 'none' ]]; then
   cat "${RUNDIR}/job_timestamp.txt" >> "${LOG_DIR}/${JBNME}_timestamp.txt"